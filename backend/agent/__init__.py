@@ -1,4 +1,34 @@
 from .analyze_style import get_analyze_style_agent,save_analysis_result_async
-from .copy_cat import get_copycat_agent
+from .analyze_style import (
+    get_batch_analyze_style_agent,
+    build_analysis_task,
+    build_batch_analysis_task,
+    split_notes_by_token_budget,
+    parse_batch_analysis_result,
+    extract_note_body,
+    count_note_words,
+)
+from .copy_cat import get_copycat_agent, build_copycat_prompt, parse_copycat_variants, stream_copycat_arguments, record_stream_ttft, get_stream_stats
+from .variant_scorer import score_variants
+from .tool_stream_parser import ToolArgumentStreamParser
+from .tool_call_decoder import (
+    ToolCallDecodeError,
+    StyleAnalysisArguments,
+    CopycatArguments,
+    decode_tool_arguments,
+    decode_tool_call,
+)
+from .agent_factory import agent_factory, warm_up_agents
+from .llm_executor import llm_executor, run_agent_async, get_agent_usage
+from .single_flight import SingleFlight, llm_single_flight
+from .model_router import model_router, run_routed_agent_async
+from .llm_scheduler import llm_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from .example_index import example_index, load_example_index
 
-__all__ = ['get_analyze_style_agent','save_analysis_result_async',  'get_copycat_agent']
\ No newline at end of file
+__all__ = ['get_analyze_style_agent','save_analysis_result_async', 'get_batch_analyze_style_agent',
+           'build_analysis_task', 'build_batch_analysis_task', 'split_notes_by_token_budget',
+           'parse_batch_analysis_result', 'extract_note_body', 'count_note_words', 'get_copycat_agent', 'build_copycat_prompt', 'parse_copycat_variants', 'stream_copycat_arguments',
+           'record_stream_ttft', 'get_stream_stats', 'score_variants', 'ToolArgumentStreamParser', 'ToolCallDecodeError', 'StyleAnalysisArguments',
+           'CopycatArguments', 'decode_tool_arguments', 'decode_tool_call', 'agent_factory', 'warm_up_agents', 'llm_executor', 'run_agent_async', 'get_agent_usage',
+           'SingleFlight', 'llm_single_flight', 'model_router', 'run_routed_agent_async',
+           'llm_scheduler', 'PRIORITY_INTERACTIVE', 'PRIORITY_BULK', 'example_index', 'load_example_index']
\ No newline at end of file
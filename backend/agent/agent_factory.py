@@ -0,0 +1,269 @@
+"""
+Agent工厂模块
+缓存解析后的提示词模板，按请求构造全新的Agent实例
+"""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import yaml
+from swarms.structs.agent import Agent
+from swarms.utils.agent_loader_markdown import MarkdownAgentLoader
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.utils.logger import info, debug
+from backend.agent.fake_llm import fake_llm_backend, is_fake_model, resolve_model_name
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 是否开启服务商侧的提示词缓存（swarms只对Anthropic系模型注入cache_control，其余服务商自动缓存）
+PROMPT_CACHING_ENABLED = os.getenv('PROMPT_CACHING_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# swarms Agent内部的LLM调用次数。swarms和litellm出错后都会立即重试，不理会Retry-After；
+# 默认只调用一次且关闭litellm重试，限流由调度器按Retry-After重新排队，其余错误由模型路由回退到下一个候选
+AGENT_RETRY_ATTEMPTS = int(os.getenv('AGENT_RETRY_ATTEMPTS', '1'))
+
+# 提示词文件目录
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt")
+
+# 与swarms的AgentLoader保持一致的字段映射
+FIELD_MAPPING = {
+    "name": "agent_name",
+    "description": "agent_description",
+    "mcp_url": "mcp_url",
+}
+
+
+_FRONT_MATTER_PATTERN = re.compile(r'^---\s*\n(.*?)\n---', re.DOTALL)
+
+
+class PromptTemplate:
+    """
+    解析后的提示词模板
+    """
+
+    def __init__(self, file_path: str, mtime_ns: int, size: int, content_hash: str, agent_fields: Dict[str, Any],
+                 models: Optional[List[Dict[str, Any]]] = None):
+        self.file_path = file_path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content_hash = content_hash
+        self.agent_fields = agent_fields
+        # 按优先级排列的候选模型，每项包含model_name，可选api_base和api_key_env
+        self.models = models or [{"model_name": agent_fields.get("model_name")}]
+
+
+def parse_model_candidates(file_path: str) -> List[Dict[str, Any]]:
+    """
+    读取提示词front matter中的models候选列表
+
+    列表项可以是模型名称字符串，也可以是包含model_name、api_base、api_key_env的字典；
+    fake/开头的模型可以通过fake字段单独配置模拟后端的延迟、错误率等参数
+
+    Args:
+        file_path: 提示词markdown文件路径
+
+    Returns:
+        List[Dict[str, Any]]: 候选模型列表，未声明models时返回空列表
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        match = _FRONT_MATTER_PATTERN.match(f.read())
+    if not match:
+        return []
+    front_matter = yaml.safe_load(match.group(1)) or {}
+    candidates = []
+    for item in front_matter.get("models") or []:
+        if isinstance(item, str):
+            candidates.append({"model_name": item})
+        elif isinstance(item, dict) and item.get("model_name"):
+            candidates.append({
+                key: item[key] for key in ("model_name", "api_base", "api_key_env", "fake") if item.get(key)
+            })
+    return candidates
+
+
+class AgentFactory:
+    """
+    带缓存的Agent工厂
+
+    每个提示词文件只解析一次，文件的修改时间或内容哈希变化时自动失效；
+    每次请求都基于缓存模板构造新的Agent，保证会话状态不会在请求间泄漏
+    """
+
+    def __init__(self):
+        self._markdown_loader = MarkdownAgentLoader()
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "template_hits": 0,
+            "template_misses": 0,
+            "agents_created": 0,
+            "total_build_seconds": 0.0,
+            "last_build_seconds": 0.0,
+        }
+
+    def _parse_template(self, file_path: str, stat: os.stat_result, content_hash: str) -> PromptTemplate:
+        """
+        解析提示词文件并生成模板
+        """
+        config = self._markdown_loader.parse_markdown_file(file_path)
+        agent_fields = {}
+        for config_key, config_value in config.model_dump().items():
+            agent_fields[FIELD_MAPPING.get(config_key, config_key)] = config_value
+        agent_fields["model_name"] = resolve_model_name(agent_fields.get("model_name"))
+        models = [
+            {**model, "model_name": resolve_model_name(model["model_name"])}
+            for model in parse_model_candidates(file_path)
+        ]
+        for model in models:
+            if is_fake_model(model["model_name"]):
+                fake_llm_backend.configure(model["model_name"], model.get("fake"))
+        info(f"已解析提示词模板: {file_path}，候选模型: {[model['model_name'] for model in models] or agent_fields.get('model_name')}")
+        return PromptTemplate(file_path, stat.st_mtime_ns, stat.st_size, content_hash, agent_fields, models)
+
+    def get_template(self, file_path: str) -> PromptTemplate:
+        """
+        获取提示词模板，文件未变化时直接返回缓存
+
+        Args:
+            file_path: 提示词markdown文件路径
+
+        Returns:
+            PromptTemplate: 解析后的模板
+        """
+        stat = os.stat(file_path)
+        with self._lock:
+            template = self._templates.get(file_path)
+            if template and template.mtime_ns == stat.st_mtime_ns and template.size == stat.st_size:
+                self._stats["template_hits"] += 1
+                return template
+
+            # 修改时间变化时再比较内容哈希，内容未变则只更新修改时间
+            with open(file_path, "rb") as f:
+                content_hash = hashlib.sha256(f.read()).hexdigest()
+            if template and template.content_hash == content_hash:
+                template.mtime_ns = stat.st_mtime_ns
+                template.size = stat.st_size
+                self._stats["template_hits"] += 1
+                return template
+
+            self._stats["template_misses"] += 1
+            template = self._parse_template(file_path, stat, content_hash)
+            self._templates[file_path] = template
+            return template
+
+    def create_agent(self, file_path: str, tools: Optional[List[dict]] = None,
+                     model: Optional[Dict[str, Any]] = None, **kwargs) -> Agent:
+        """
+        基于缓存模板构造一个全新的Agent实例
+
+        Args:
+            file_path: 提示词markdown文件路径
+            tools: 工具定义列表
+            model: 使用的候选模型，None表示使用模板的model_name
+            **kwargs: 覆盖模板中的Agent参数
+
+        Returns:
+            Agent: 新构造的Agent实例
+        """
+        start_time = time.perf_counter()
+        template = self.get_template(file_path)
+        agent_fields = dict(template.agent_fields)
+        agent_fields.setdefault("prompt_caching", PROMPT_CACHING_ENABLED)
+        # MarkdownAgentLoader总会给出默认的retry_attempts=3，这里统一覆盖；
+        # swarms会把retry_attempts同时设为litellm的全局重试次数，通过llm_args单独关闭
+        agent_fields["retry_attempts"] = AGENT_RETRY_ATTEMPTS
+        agent_fields.setdefault("llm_args", {"retries": 0})
+        if model:
+            agent_fields["model_name"] = model["model_name"]
+            if model.get("api_base"):
+                agent_fields["llm_base_url"] = model["api_base"]
+            if model.get("api_key_env"):
+                agent_fields["llm_api_key"] = os.getenv(model["api_key_env"])
+        agent_fields.update(kwargs)
+        if tools is not None:
+            agent_fields["tools_list_dictionary"] = tools
+        agent = Agent(**agent_fields)
+
+        build_seconds = time.perf_counter() - start_time
+        with self._lock:
+            self._stats["agents_created"] += 1
+            self._stats["total_build_seconds"] += build_seconds
+            self._stats["last_build_seconds"] = build_seconds
+        debug(f"构造Agent {agent_fields.get('agent_name')} 耗时: {build_seconds * 1000:.2f}ms")
+        return agent
+
+    def warm_up(self, file_paths: List[str]):
+        """
+        启动时预先解析提示词模板
+
+        Args:
+            file_paths: 提示词markdown文件路径列表
+        """
+        for file_path in file_paths:
+            self.get_template(file_path)
+        info(f"Agent模板预热完成，共{len(file_paths)}个")
+
+    def invalidate(self, file_path: Optional[str] = None):
+        """
+        使缓存的模板失效
+
+        Args:
+            file_path: 指定文件路径，None表示清空全部缓存
+        """
+        with self._lock:
+            if file_path is None:
+                self._templates.clear()
+            else:
+                self._templates.pop(file_path, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取Agent构造统计信息
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_templates"] = len(self._templates)
+        created = stats["agents_created"]
+        stats["avg_build_seconds"] = stats["total_build_seconds"] / created if created else 0.0
+        return stats
+
+
+def supports_cache_control(model_name: Optional[str]) -> bool:
+    """
+    模型是否需要显式的cache_control标记（Anthropic系模型），与swarms的判断保持一致
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        bool: 是否需要添加cache_control
+    """
+    name = (model_name or "").lower()
+    return PROMPT_CACHING_ENABLED and ("claude" in name or "anthropic" in name)
+
+
+# 创建全局Agent工厂实例
+agent_factory = AgentFactory()
+
+
+def warm_up_agents():
+    """
+    预热prompt目录下的全部提示词模板，在应用启动时调用
+    """
+    file_paths = [
+        os.path.join(PROMPT_DIR, name)
+        for name in sorted(os.listdir(PROMPT_DIR))
+        if name.endswith(".md")
+    ]
+    agent_factory.warm_up(file_paths)
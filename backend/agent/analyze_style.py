@@ -1,10 +1,10 @@
 import json
 import os.path
 # from swarms_memory import ChromaDB
-from swarms.structs import AgentLoader
 from dotenv import load_dotenv
 import litellm
 import sys
+from typing import Any, Dict, List, Optional, Tuple
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -12,6 +12,9 @@ if project_root not in sys.path:
     sys.path.append(project_root)
 
 from backend.db import style_analysis_service
+from backend.agent.agent_factory import agent_factory
+from backend.agent.token_counter import estimate_tokens
+from backend.agent.tool_call_decoder import decode_tool_call, StyleAnalysisArguments
 from backend.utils.logger import info, error
 
 load_dotenv()
@@ -54,7 +57,51 @@ tools = [
     }
 ]
 
-loader = AgentLoader()
+# 批量分析工具定义，一次调用返回多篇笔记的分析结果
+batch_tools = [
+    {
+        "type": "function",
+        "function": {
+            "name": "analyze_styles",
+            "description": "批量写作风格分析专家，为每篇笔记分别返回一项分析结果",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "results": {
+                        "type": "array",
+                        "description": "每篇笔记的分析结果，每篇笔记对应且只对应一项",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "note_index": {
+                                    "type": "integer",
+                                    "description": "笔记编号，与输入中的笔记编号一致"
+                                },
+                                "style_name": {
+                                    "type": "string",
+                                    "description": "风格名称"
+                                },
+                                "feature_desc": {
+                                    "type": "string",
+                                    "description": "一句话说明文案特征"
+                                },
+                                "category": {
+                                    "type": "string",
+                                    "description": "推荐类别，使用-号分割"
+                                }
+                            },
+                            "required": [
+                                "note_index", "style_name", "feature_desc", "category",
+                            ]
+                        }
+                    }
+                },
+                "required": ["results"]
+            }
+        }
+    }
+]
+
 root_dir = os.path.dirname(__file__)
 agent_md = os.path.join(root_dir,"prompt", "style_analyzer.md")
 # Initialize ChromaDB memory
@@ -63,22 +110,182 @@ agent_md = os.path.join(root_dir,"prompt", "style_analyzer.md")
 #     output_dir="finance_agent_rag",
 # )
 
-def get_analyze_style_agent():
+def get_analyze_style_agent(model: Optional[Dict[str, Any]] = None):
     """
     获取分析风格的Agent实例
     
+    Args:
+        model: 模型路由选出的候选模型，None表示使用模板的model_name
+
     Returns:
         Agent: 分析风格的Agent实例
     """
-    # 创建Agent实例
-    analyze_style_agent = loader.load_agent_from_markdown(
-        file_path=agent_md,
-        tools_list_dictionary=tools,
-    )
+    # 基于缓存的提示词模板创建全新的Agent实例
+    analyze_style_agent = agent_factory.create_agent(agent_md, tools=tools, model=model)
     return analyze_style_agent
 
 
-async def save_analysis_result_async(arguments_dict: dict, sample_title: str, sample_content: str):
+def get_batch_analyze_style_agent(model: Optional[Dict[str, Any]] = None):
+    """
+    获取批量分析风格的Agent实例
+
+    Args:
+        model: 模型路由选出的候选模型，None表示使用模板的model_name
+
+    Returns:
+        Agent: 使用批量工具定义的分析风格Agent实例
+    """
+    return agent_factory.create_agent(agent_md, tools=batch_tools, model=model)
+
+
+def build_analysis_task(title: str, content: str) -> str:
+    """
+    构造单篇笔记的分析任务描述
+
+    Args:
+        title: 文案标题
+        content: 文案内容
+
+    Returns:
+        str: 任务描述
+    """
+    return f"""
+**文案标题**
+
+{title}
+
+**文案内容**
+
+{content}
+"""
+
+
+def extract_note_body(sample_content: str) -> str:
+    """
+    从保存的分析任务描述中取出笔记正文
+
+    sample_content保存的是build_analysis_task生成的完整任务描述，正文位于"文案内容"标题之后；
+    早期数据或手工录入的数据没有该标题时返回原文
+
+    Args:
+        sample_content: 风格分析记录中的示例内容
+
+    Returns:
+        str: 笔记正文
+    """
+    if not sample_content:
+        return ''
+    marker = '**文案内容**'
+    if marker in sample_content:
+        return sample_content.split(marker, 1)[1].strip()
+    return sample_content.strip()
+
+
+def count_note_words(body: str) -> int:
+    """
+    统计笔记正文的字数，不计空白字符
+
+    Args:
+        body: 笔记正文
+
+    Returns:
+        int: 字数
+    """
+    return sum(1 for char in body if not char.isspace())
+
+
+def build_batch_analysis_task(indexed_notes: List[Tuple[int, dict]]) -> str:
+    """
+    构造批量分析任务描述，每篇笔记带有编号
+
+    Args:
+        indexed_notes: (笔记编号, 笔记内容字典) 列表
+
+    Returns:
+        str: 任务描述
+    """
+    sections = [
+        f"以下共有{len(indexed_notes)}篇笔记，请逐篇独立分析写作风格，"
+        f"调用analyze_styles工具，在results中为每篇笔记返回一项，note_index必须与笔记编号一致，不得合并或遗漏。"
+    ]
+    for index, note in indexed_notes:
+        sections.append(f"## 笔记编号 {index}\n{build_analysis_task(note['title'], note['content'])}")
+    return "\n".join(sections)
+
+
+def split_notes_by_token_budget(indexed_notes: List[Tuple[int, dict]], token_budget: int, max_batch_size: int) -> List[List[Tuple[int, dict]]]:
+    """
+    按token预算和最大篇数将笔记拆分为多个批次
+
+    超出预算的单篇笔记单独成批
+
+    Args:
+        indexed_notes: (笔记编号, 笔记内容字典) 列表
+        token_budget: 每批输入的token预算
+        max_batch_size: 每批最多包含的笔记数
+
+    Returns:
+        List[List[Tuple[int, dict]]]: 每批的 (笔记编号, 笔记内容字典) 列表
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for index, note in indexed_notes:
+        note_tokens = estimate_tokens(build_analysis_task(note['title'], note['content']))
+        if current and (current_tokens + note_tokens > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append((index, note))
+        current_tokens += note_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_analysis_result(arguments_dict: dict, expected_indices: List[int]) -> Dict[int, dict]:
+    """
+    将批量分析结果映射回笔记编号
+
+    缺少字段、编号不在本批内或重复出现的结果都会被丢弃，
+    对应的笔记需要单独重新分析
+
+    Args:
+        arguments_dict: analyze_styles工具调用的参数
+        expected_indices: 本批包含的笔记编号
+
+    Returns:
+        Dict[int, dict]: 笔记编号到单篇分析结果的映射
+    """
+    expected = set(expected_indices)
+    seen = {}
+    duplicated = set()
+    for item in arguments_dict.get('results') or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get('note_index'))
+        except (TypeError, ValueError):
+            continue
+        if index not in expected:
+            continue
+        if not all(isinstance(item.get(key), str) and item.get(key) for key in ('style_name', 'feature_desc', 'category')):
+            continue
+        if index in seen:
+            duplicated.add(index)
+            continue
+        seen[index] = {
+            'style_name': item['style_name'],
+            'feature_desc': item['feature_desc'],
+            'category': item['category'],
+        }
+    for index in duplicated:
+        seen.pop(index, None)
+    return seen
+
+
+async def save_analysis_result_async(arguments_dict: dict, sample_title: str, sample_content: str,
+                                     content_hash: str = None):
     """
     保存分析结果到数据库
     
@@ -86,16 +293,27 @@ async def save_analysis_result_async(arguments_dict: dict, sample_title: str, sa
         arguments_dict: 包含style_name, feature_desc, category的字典
         sample_title: 样本文案标题
         sample_content: 样本文案内容
+        content_hash: 归一化样本内容的哈希，提供时按哈希创建或更新记录
     """
     try:
         # 保存到数据库
-        style_analysis = style_analysis_service.create_style_analysis(
-            style_name=arguments_dict['style_name'],
-            feature_desc=arguments_dict['feature_desc'],
-            category=arguments_dict['category'],
-            sample_title=sample_title,
-            sample_content=sample_content
-        )
+        if content_hash:
+            style_analysis = style_analysis_service.save_style_analysis_by_content_hash(
+                content_hash=content_hash,
+                style_name=arguments_dict['style_name'],
+                feature_desc=arguments_dict['feature_desc'],
+                category=arguments_dict['category'],
+                sample_title=sample_title,
+                sample_content=sample_content
+            )
+        else:
+            style_analysis = style_analysis_service.create_style_analysis(
+                style_name=arguments_dict['style_name'],
+                feature_desc=arguments_dict['feature_desc'],
+                category=arguments_dict['category'],
+                sample_title=sample_title,
+                sample_content=sample_content
+            )
         info(f"分析结果已保存到数据库，ID: {style_analysis.id}")
         return style_analysis
     except Exception as e:
@@ -128,17 +346,10 @@ def analyze_sample_content(title: str, content: str):
     agent = get_analyze_style_agent()
     
     result = agent.run(task)
-    result = result.split("StyleAnalyzer: ")[1]
-
-    import ast
 
     try:
-        # 将单引号替换为双引号
-        data = ast.literal_eval(result)
-
-        # 解析arguments中的JSON字符串
-        arguments_str = data[0]['function']['arguments']
-        arguments_dict = json.loads(arguments_str)
+        # 解析工具调用参数
+        arguments_dict = decode_tool_call(result, StyleAnalysisArguments, 'analyze_style', agent=agent).model_dump()
 
         info("\n=== 风格分析结果 ===")
         info(f"风格名称: {arguments_dict['style_name']}")
@@ -0,0 +1,214 @@
+"""
+LLM调用记录模块
+记录每次模型调用的token用量、服务商延迟和估算费用，
+请求处理完成后关联到产出的风格分析或重写记录并写入llm_call_logs表
+"""
+
+import contextvars
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import litellm
+from dotenv import load_dotenv
+
+from backend.agent.fake_llm import is_fake_model
+from backend.db import llm_call_log_service
+from backend.utils.logger import debug, warning
+
+load_dotenv()
+
+# 是否记录LLM调用
+LLM_CALL_LOG_ENABLED = os.getenv('LLM_CALL_LOG_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# 自定义模型单价（美元/百万token），JSON格式：{"模型名称": {"input": 0.3, "output": 0.6, "cached": 0.15}}，
+# 未配置的模型使用litellm内置价格表
+try:
+    LLM_PRICING: Dict[str, Dict[str, float]] = json.loads(os.getenv('LLM_PRICING', '') or '{}')
+except ValueError:
+    warning("LLM_PRICING不是合法的JSON，忽略自定义单价")
+    LLM_PRICING = {}
+
+# 保护调用字典的写入与补记用量，避免工作线程补记时记录正在写入数据库
+_call_lock = threading.Lock()
+
+# 当前请求处理中使用的调用收集器
+_current_collector: contextvars.ContextVar[Optional["LLMCallCollector"]] = contextvars.ContextVar(
+    'llm_call_collector', default=None
+)
+
+
+def get_provider(model_name: str) -> str:
+    """
+    获取模型所属的服务商名称
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        str: 服务商名称，无法识别时返回模型名称的前缀
+    """
+    if is_fake_model(model_name):
+        return "fake"
+    try:
+        return litellm.get_llm_provider(model_name)[1]
+    except Exception:
+        return model_name.split('/', 1)[0] if '/' in model_name else "unknown"
+
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    估算一次调用的费用（美元）
+
+    优先使用LLM_PRICING中的自定义单价，其次使用litellm价格表；模拟后端和未知模型的费用为0
+
+    Args:
+        model_name: 模型名称
+        prompt_tokens: 输入token数（含缓存命中部分）
+        completion_tokens: 输出token数
+        cached_tokens: 输入中命中服务商提示词缓存的token数
+
+    Returns:
+        float: 估算费用
+    """
+    if is_fake_model(model_name) or not (prompt_tokens or completion_tokens):
+        return 0.0
+    pricing = LLM_PRICING.get(model_name)
+    if pricing:
+        input_price = pricing.get("input", 0.0)
+        cached_price = pricing.get("cached", input_price)
+        return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+                + completion_tokens * pricing.get("output", 0.0)) / 1_000_000
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cache_read_input_tokens=cached_tokens,
+        )
+        return prompt_cost + completion_cost
+    except Exception:
+        debug(f"litellm价格表中没有模型 {model_name}，费用记为0")
+        return 0.0
+
+
+class LLMCallCollector:
+    """
+    收集一次请求处理中产生的LLM调用
+
+    在with块内执行的agent调用（包括对冲和回退产生的调用）都会记录到当前收集器；
+    合并请求中复用他人结果的请求不产生调用，因此不会重复计费
+    """
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self._tokens: List[contextvars.Token] = []
+
+    def __enter__(self):
+        self._tokens.append(_current_collector.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_collector.reset(self._tokens.pop())
+        return False
+
+    def add(self, call: Dict[str, Any]):
+        self.calls.append(call)
+
+    def save(self, record_type: str, record_id: Optional[int] = None, style_id: Optional[int] = None,
+             style_ids: Optional[List[int]] = None) -> int:
+        """
+        关联产出的记录并写入数据库，写入后清空已收集的调用
+
+        Args:
+            record_type: 记录类型，style_analysis、style_analysis_batch或rewrite
+            record_id: 产出的记录ID，请求失败时为None
+            style_id: 关联的风格ID
+            style_ids: 批量调用产出的多个风格ID，调用的用量和费用平均分摊到这些风格
+
+        Returns:
+            int: 写入的调用数
+        """
+        calls, self.calls = self.calls, []
+        if not calls or not LLM_CALL_LOG_ENABLED:
+            return 0
+        for call in calls:
+            call.update(record_type=record_type, record_id=record_id, style_id=style_id)
+        try:
+            with _call_lock:
+                return llm_call_log_service.create_call_logs(calls, style_ids)
+        except Exception as e:
+            # 调用记录写入失败不影响主流程
+            warning(f"保存LLM调用记录失败: {str(e)}")
+            return 0
+
+
+def _usage_fields(model_name: str, usage: Dict[str, int]) -> Dict[str, Any]:
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+    cached_tokens = usage.get("cached_tokens", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "cost": estimate_cost(model_name, prompt_tokens, completion_tokens, cached_tokens),
+    }
+
+
+def record_llm_call(agent_name: Optional[str], model_name: str, usage: Dict[str, int], latency: float,
+                    queue_seconds: float = 0.0, success: bool = True, error_message: Optional[str] = None,
+                    collector: Optional[LLMCallCollector] = None) -> Optional[Dict[str, Any]]:
+    """
+    记录一次LLM调用到收集器，没有收集器时忽略
+
+    Args:
+        agent_name: agent名称
+        model_name: 实际调用的模型名称
+        usage: 包含input_tokens、output_tokens和cached_tokens的用量字典
+        latency: 服务商调用耗时（秒）
+        queue_seconds: 调度器与线程池的排队耗时（秒）
+        success: 是否成功
+        error_message: 失败原因
+        collector: 指定的收集器，默认使用当前上下文中的收集器
+
+    Returns:
+        Optional[Dict[str, Any]]: 加入收集器的调用字典，可用于之后补记用量；未记录时为None
+    """
+    if collector is None:
+        collector = _current_collector.get()
+    if collector is None or not LLM_CALL_LOG_ENABLED:
+        return None
+    call = {
+        "agent_name": agent_name,
+        "model": model_name or "unknown",
+        "provider": get_provider(model_name or "unknown"),
+        **_usage_fields(model_name or "unknown", usage),
+        "latency_seconds": round(latency, 4),
+        "queue_seconds": round(queue_seconds, 4),
+        "success": success,
+        "error": error_message[:1000] if error_message else None,
+    }
+    collector.add(call)
+    return call
+
+
+def settle_call_usage(call: Dict[str, Any], usage: Dict[str, int]):
+    """
+    补记等待方已超时或取消的调用在工作线程结束后的实际用量
+
+    调用记录尚未写入数据库时更新待写入的调用字典，已写入时更新数据库中的记录
+
+    Args:
+        call: record_llm_call返回的调用字典
+        usage: 包含input_tokens、output_tokens和cached_tokens的用量字典
+    """
+    fields = _usage_fields(call["model"], usage)
+    with _call_lock:
+        call.update(fields)
+        call_log_id = call.get("id")
+        if call_log_id is None:
+            return
+        try:
+            llm_call_log_service.update_call_usage(call_log_id, fields)
+        except Exception as e:
+            warning(f"补记LLM调用用量失败: {str(e)}")
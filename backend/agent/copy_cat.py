@@ -1,16 +1,36 @@
-import json
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
 
 import litellm
-from swarms.structs import AgentLoader
 from dotenv import load_dotenv
 import os
 
 # 添加项目根目录到Python路径
 
 from backend.utils import info, error
+from backend.agent.agent_factory import agent_factory, supports_cache_control
+from backend.agent.llm_executor import extract_usage
+from backend.agent.model_router import model_router
+from backend.agent.llm_scheduler import llm_scheduler, extract_retry_after, PRIORITY_INTERACTIVE, LLM_RATE_LIMIT_RETRIES
+from backend.agent.call_log import LLMCallCollector, record_llm_call
+from backend.agent.tool_call_decoder import decode_tool_call, CopycatArguments
+from backend.agent.token_counter import count_tokens, truncate_to_token_budget
 
 load_dotenv()
 
+# 重写提示词（系统提示词+任务描述）的token预算，以及风格示例至少保留的token数
+REWRITE_PROMPT_TOKEN_BUDGET = int(os.getenv('REWRITE_PROMPT_TOKEN_BUDGET', '4000'))
+REWRITE_EXAMPLE_MIN_TOKENS = int(os.getenv('REWRITE_EXAMPLE_MIN_TOKENS', '200'))
+# 为每次请求不同的用户消息预留的token数，风格示例的截断位置因此与具体请求无关
+REWRITE_TASK_RESERVE_TOKENS = int(os.getenv('REWRITE_TASK_RESERVE_TOKENS', '300'))
+# 检索到的few-shot范文的token预算，范文放在用户消息中，在REWRITE_PROMPT_TOKEN_BUDGET之外单独计算
+REWRITE_FEW_SHOT_TOKEN_BUDGET = int(os.getenv('REWRITE_FEW_SHOT_TOKEN_BUDGET', '800'))
+# 范文剩余预算低于该值时不再截断放入
+_FEW_SHOT_MIN_TOKENS = 100
+
 # 设置代理
 litellm.proxy_list = [
     {
@@ -48,67 +68,336 @@ tools = [
         }
     }
 ]
+# 多候选生成使用的工具，在一次调用中返回多篇候选文案
+variant_tools = [
+    {
+        "type": "function",
+        "function": {
+            "name": "copy_cat_variants",
+            "description": "一次生成多篇不同的小红书爆款风格种草文案候选",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "variants": {
+                        "type": "array",
+                        "description": "候选文案列表，各篇在标题、切入角度和结构上应有明显差异",
+                        "items": tools[0]["function"]["parameters"]
+                    }
+                },
+                "required": ["variants"]
+            }
+        }
+    }
+]
 # 加载CopycatAgent
-loader = AgentLoader()
 current_dir = os.path.dirname(__file__)
 agent_md = os.path.join(current_dir,"prompt", "copy_cat.md")
 
 
-def get_copycat_agent():
+def get_copycat_agent(system_prompt: Optional[str] = None, variants: int = 1, model: Optional[Dict[str, Any]] = None):
     """
     创建并返回copycat_agent实例
     
+    Args:
+        system_prompt (str, optional): 覆盖模板的系统提示词，用于带入风格信息的稳定前缀
+        variants (int): 候选数量，大于1时使用copy_cat_variants工具
+        model (dict, optional): 模型路由选出的候选模型，None表示使用模板的model_name
     Returns:
         Agent: copycat_agent实例
     """
-    # 创建Agent实例
-    copycat_agent = loader.load_agent_from_markdown(
-        file_path=agent_md,
-        tools_list_dictionary=tools,
-    )
-    
+    # 基于缓存的提示词模板创建全新的Agent实例
+    overrides = {"system_prompt": system_prompt} if system_prompt else {}
+    agent_tools = variant_tools if variants > 1 else tools
+    copycat_agent = agent_factory.create_agent(agent_md, tools=agent_tools, model=model, **overrides)
+
     return copycat_agent
 
 
-def run_copycat_agent(style_info, user_task):
+def _render_style_block(style_info, example_content):
     """
-    运行CopycatAgent来生成文案
-    
-    Args:
-        style_info (dict): 已分析的风格信息
-        user_task
-    Returns:
-        str: 生成的文案内容
+    渲染风格信息块，只包含同一风格下固定不变的内容
     """
-    # 构造完整的任务描述，包含风格信息和用户需求
-    full_task = f"""
-参照这个文案书写风格，输出小红书爆款文案：
+    return f"""
+
 # 风格信息
 
 风格名称：{style_info.get('style_name')}
 特征描述：{style_info.get('feature_desc')}
-字数：{style_info.get('word_count')}
 
 ## 风格示例文稿
 
-{style_info.get('example_content')}
+{example_content}
+"""
+
 
+def _render_few_shot_block(examples):
+    """
+    渲染检索到的参考范文
+    """
+    if not examples:
+        return ''
+    sections = [
+        f"### 参考范文{index}\n标题：{example.get('title') or '无'}\n{example['content']}"
+        for index, example in enumerate(examples, 1)
+    ]
+    return "\n## 与本次需求相关的参考范文（仅参考写法，不要照抄）\n\n" + "\n\n".join(sections) + "\n"
+
+
+def _render_copycat_task(style_info, user_task, variants=1, examples=None):
+    """
+    渲染每次请求不同的任务描述
+    """
+    if variants > 1:
+        output_requirement = f"请根据以上风格信息和用户其余需求，生成{variants}篇符合该风格、彼此差异明显的全新原创小红书种草文案，通过copy_cat_variants一次性返回。"
+    else:
+        output_requirement = "请根据以上风格信息和用户其余需求，生成符合该风格的全新原创小红书种草文案。"
+    return f"""
+参照系统提示词中的风格信息，输出小红书爆款文案：
+字数：{style_info.get('word_count')}
+{_render_few_shot_block(examples)}
 # 其余要求：
 
 {user_task}
     
-请根据以上风格信息和用户其余需求，生成符合该风格的全新原创小红书种草文案。
+{output_requirement}
 """
 
+
+def _fit_few_shot_examples(examples, token_budget: int, model_name: Optional[str]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    按得分顺序放入参考范文，超出预算的范文截断，剩余预算过少时停止
+    """
+    fitted = []
+    used_tokens = 0
+    for example in examples or []:
+        remaining = token_budget - used_tokens
+        if remaining < _FEW_SHOT_MIN_TOKENS:
+            break
+        content = truncate_to_token_budget(example['content'], remaining, model_name)
+        tokens = count_tokens(content, model_name)
+        fitted.append({**example, 'content': content})
+        used_tokens += tokens
+    return fitted, used_tokens
+
+
+def build_copycat_prompt(style_info, user_task, token_budget: int = REWRITE_PROMPT_TOKEN_BUDGET,
+                         variants: int = 1, examples: Optional[List[Dict[str, Any]]] = None,
+                         few_shot_token_budget: int = REWRITE_FEW_SHOT_TOKEN_BUDGET) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    在token预算内构造CopycatAgent的提示词
+    
+    系统提示词与风格信息块拼接为系统消息，同一风格的请求逐字节相同，便于服务商缓存前缀；
+    字数、检索到的参考范文和用户需求放在其后的用户消息中。
+    风格示例的预算只由固定部分决定（扣除REWRITE_TASK_RESERVE_TOKENS预留给用户消息），
+    超出时在段落或句子边界处截断，且至少保留REWRITE_EXAMPLE_MIN_TOKENS；
+    参考范文按得分顺序放入，总量不超过few_shot_token_budget
+    
+    Args:
+        style_info (dict): 已分析的风格信息
+        user_task (str): 用户需求
+        token_budget (int): 提示词的token预算
+        variants (int): 候选数量
+        examples (list, optional): 范文索引检索到的参考范文，按得分从高到低排列
+        few_shot_token_budget (int): 参考范文的token预算
+    Returns:
+        Tuple[str, str, Dict[str, Any]]: 系统提示词、任务描述，
+            以及prompt_tokens、prefix_tokens、example_tokens、example_truncated、few_shot_count、few_shot_tokens统计
+    """
+    agent_fields = agent_factory.get_template(agent_md).agent_fields
+    model_name = agent_fields.get("model_name")
+    base_system_prompt = agent_fields.get("system_prompt") or ''
+    example_content = style_info.get('example_content') or ''
+    
+    frame_tokens = count_tokens(base_system_prompt + _render_style_block(style_info, ''), model_name)
+    example_budget = max(token_budget - frame_tokens - REWRITE_TASK_RESERVE_TOKENS, REWRITE_EXAMPLE_MIN_TOKENS)
+    
+    trimmed_example = truncate_to_token_budget(example_content, example_budget, model_name)
+    example_tokens = count_tokens(trimmed_example, model_name)
+    system_prompt = base_system_prompt + _render_style_block(style_info, trimmed_example)
+    few_shot_examples, few_shot_tokens = _fit_few_shot_examples(examples, few_shot_token_budget, model_name)
+    task = _render_copycat_task(style_info, user_task, variants, few_shot_examples)
+    prefix_tokens = frame_tokens + example_tokens
+    
+    return system_prompt, task, {
+        "prompt_tokens": prefix_tokens + count_tokens(task, model_name),
+        "prefix_tokens": prefix_tokens,
+        "example_tokens": example_tokens,
+        "example_truncated": trimmed_example != example_content,
+        "few_shot_count": len(few_shot_examples),
+        "few_shot_tokens": few_shot_tokens,
+    }
+
+
+def parse_copycat_variants(arguments_dict: Dict[str, Any], max_variants: int) -> List[Dict[str, Any]]:
+    """
+    解析copy_cat_variants工具的参数，丢弃缺少字段的候选
+    
+    Args:
+        arguments_dict (dict): 工具参数
+        max_variants (int): 最多保留的候选数量
+    Returns:
+        List[Dict[str, Any]]: 候选列表，每项包含index, title, content, tags
+    """
+    variants = []
+    for item in arguments_dict.get('variants') or []:
+        try:
+            candidate = CopycatArguments.model_validate(item)
+        except Exception as e:
+            error(f"丢弃格式不正确的候选文案: {str(e)}")
+            continue
+        variants.append({"index": len(variants), **candidate.model_dump()})
+        if len(variants) >= max_variants:
+            break
+    return variants
+
+
+def run_copycat_agent(style_info, user_task):
+    """
+    运行CopycatAgent来生成文案
+    
+    Args:
+        style_info (dict): 已分析的风格信息
+        user_task
+    Returns:
+        dict: 生成的文案，包含title, content, tags
+    """
+    # 风格信息放在系统提示词中，用户需求作为任务描述
+    system_prompt, full_task, _ = build_copycat_prompt(style_info, user_task)
+
     # 获取agent实例
-    agent = get_copycat_agent()
+    agent = get_copycat_agent(system_prompt)
     
     # 运行Agent
     result = agent.run(full_task)
 
-    result = result.split("CopycatAgent: ")[1]
+    return decode_tool_call(result, CopycatArguments, 'copy_cat', agent=agent).model_dump()
+
+
+# 流式生成的首token耗时统计，保留最近的样本
+_stream_stats_lock = threading.Lock()
+_stream_stats = {
+    "streams": 0,
+    "failed": 0,
+    "ttft_samples": deque(maxlen=256),
+}
+
+
+def record_stream_ttft(ttft: Optional[float]):
+    """
+    记录一次流式生成的首token耗时
+
+    Args:
+        ttft: 首token耗时（秒），None表示流式生成失败
+    """
+    with _stream_stats_lock:
+        _stream_stats["streams"] += 1
+        if ttft is None:
+            _stream_stats["failed"] += 1
+        else:
+            _stream_stats["ttft_samples"].append(ttft)
+
+
+def get_stream_stats():
+    """
+    获取流式生成统计信息，包括首token耗时的均值与分位数
+    """
+    with _stream_stats_lock:
+        samples = sorted(_stream_stats["ttft_samples"])
+        stats = {"streams": _stream_stats["streams"], "failed": _stream_stats["failed"]}
+    if samples:
+        stats["ttft_avg_seconds"] = sum(samples) / len(samples)
+        stats["ttft_p50_seconds"] = samples[len(samples) // 2]
+        stats["ttft_p95_seconds"] = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return stats
 
-    return result
+
+async def stream_copycat_arguments(full_task, system_prompt: Optional[str] = None, usage: Optional[Dict[str, int]] = None,
+                                   calls: Optional[LLMCallCollector] = None):
+    """
+    以流式方式调用CopycatAgent的模型，逐段产出copy_cat工具调用的参数文本
+    
+    直接使用litellm的流式接口，系统提示词和模型参数来自copy_cat.md的缓存模板，
+    模型为模型路由当前排在首位的候选；Anthropic系模型在系统消息和工具定义上添加cache_control标记
+    
+    Args:
+        full_task (str): 任务描述
+        system_prompt (str, optional): 覆盖模板的系统提示词
+        usage (dict, optional): 流结束后写入input_tokens、output_tokens和cached_tokens
+        calls (LLMCallCollector, optional): 记录每次流式调用的收集器
+    Yields:
+        str: 工具调用参数片段
+    """
+    template = agent_factory.get_template(agent_md)
+    agent_fields = template.agent_fields
+    model = model_router.rank(template.models)[0]
+    model_name = model["model_name"]
+    system_content = system_prompt or agent_fields["system_prompt"]
+    request_tools = tools
+    if supports_cache_control(model_name):
+        system_content = [{"type": "text", "text": system_content, "cache_control": {"type": "ephemeral"}}]
+        request_tools = [dict(tool) for tool in tools]
+        request_tools[-1]["cache_control"] = {"type": "ephemeral"}
+    # 流式调用同样经过调度器排队，按交互优先级派发；尚未产出内容时遇到限流按Retry-After重新排队
+    estimated_tokens = count_tokens(system_prompt or agent_fields["system_prompt"], model_name) + count_tokens(full_task, model_name)
+    attempt = 0
+    while True:
+        enqueued_at = time.perf_counter()
+        await llm_scheduler.acquire(PRIORITY_INTERACTIVE, estimated_tokens)
+        started_at = time.perf_counter()
+        yielded = False
+        attempt_usage: Dict[str, int] = {}
+        try:
+            response = await litellm.acompletion(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": system_content},
+                    {"role": "user", "content": full_task},
+                ],
+                temperature=agent_fields.get("temperature"),
+                tools=request_tools,
+                tool_choice={"type": "function", "function": {"name": "copy_cat"}},
+                stream=True,
+                stream_options={"include_usage": True},
+                api_base=model.get("api_base"),
+                api_key=os.getenv(model["api_key_env"]) if model.get("api_key_env") else None,
+            )
+            async for chunk in response:
+                chunk_usage = getattr(chunk, "usage", None)
+                if chunk_usage:
+                    attempt_usage = extract_usage(chunk_usage)
+                if not chunk.choices:
+                    continue
+                tool_calls = getattr(chunk.choices[0].delta, "tool_calls", None) or []
+                for tool_call in tool_calls:
+                    function = getattr(tool_call, "function", None)
+                    if function is not None and function.arguments:
+                        yielded = True
+                        yield function.arguments
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开时已经产生的调用同样计入调用记录
+            record_llm_call('CopycatAgent', model_name, attempt_usage, time.perf_counter() - started_at,
+                            started_at - enqueued_at, False, "调用被取消", collector=calls)
+            raise
+        except Exception as e:
+            latency = time.perf_counter() - started_at
+            model_router.record(model_name, latency, False)
+            record_llm_call('CopycatAgent', model_name, attempt_usage, latency,
+                            started_at - enqueued_at, False, str(e) or type(e).__name__, collector=calls)
+            retry_after = extract_retry_after(e)
+            if retry_after is None:
+                raise
+            llm_scheduler.defer(retry_after)
+            attempt += 1
+            if yielded or attempt > LLM_RATE_LIMIT_RETRIES:
+                raise
+            continue
+        latency = time.perf_counter() - started_at
+        model_router.record(model_name, latency, True)
+        record_llm_call('CopycatAgent', model_name, attempt_usage, latency, started_at - enqueued_at, collector=calls)
+        llm_scheduler.settle(estimated_tokens, attempt_usage.get("input_tokens", 0))
+        if usage is not None:
+            usage.update(attempt_usage)
+        return
 
 
 if __name__ == "__main__":
@@ -130,20 +419,8 @@ if __name__ == "__main__":
 要求：突出课程的专业性和实用性，吸引对中医感兴趣的用户报名
 """
 
-    result = run_copycat_agent(example_style_info, example_user_task)
-    info("=== 生成的文案 ===")
-    info(result)
-
-    import ast
-
-    # print(json.loads(result))
     try:
-        # 将单引号替换为双引号
-        data = ast.literal_eval(result)
-
-        # 解析arguments中的JSON字符串
-        arguments_str = data[0]['function']['arguments']
-        arguments_dict = json.loads(arguments_str)
+        arguments_dict = run_copycat_agent(example_style_info, example_user_task)
 
         info("\n=== 爆款文案 ===")
         info(f"文案标题: {arguments_dict['title']}")
@@ -154,4 +431,4 @@ if __name__ == "__main__":
         error(f"解析过程中出错: {e}")
         import traceback
 
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
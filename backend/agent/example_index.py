@@ -0,0 +1,401 @@
+"""
+范文向量索引模块
+在本地用NumPy维护风格样本和历史重写结果的向量索引，重写时检索与用户需求最相关的范文作为few-shot示例
+
+向量为归一化文本的字符二元组、三元组经特征哈希得到的定长向量，不依赖外部服务；
+新记录插入时增量写入索引并追加到日志文件，日志达到一定条数后整体快照为.npy文件
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from backend.agent.analyze_style import extract_note_body
+from backend.db.db_models import StyleAnalysis, RewriteRecord, get_session, get_database_path
+from backend.utils.text_vector import embed_text, DEFAULT_VECTOR_DIM
+from backend.utils.logger import info, warning
+
+load_dotenv()
+
+# 是否为重写检索few-shot范文
+REWRITE_FEW_SHOT_ENABLED = os.getenv('REWRITE_FEW_SHOT_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# 每次重写最多检索的范文数与最低相似度
+REWRITE_FEW_SHOT_TOP_K = int(os.getenv('REWRITE_FEW_SHOT_TOP_K', '2'))
+REWRITE_FEW_SHOT_MIN_SCORE = float(os.getenv('REWRITE_FEW_SHOT_MIN_SCORE', '0.05'))
+# 与所选风格相同的范文在相似度上的加分
+REWRITE_FEW_SHOT_STYLE_BONUS = float(os.getenv('REWRITE_FEW_SHOT_STYLE_BONUS', '0.1'))
+# 向量维度、索引目录（默认与数据库文件同目录）以及日志条数达到多少时写入快照
+EXAMPLE_INDEX_DIM = int(os.getenv('EXAMPLE_INDEX_DIM', str(DEFAULT_VECTOR_DIM)))
+EXAMPLE_INDEX_DIR = os.getenv('EXAMPLE_INDEX_DIR', '')
+EXAMPLE_INDEX_SNAPSHOT_EVERY = int(os.getenv('EXAMPLE_INDEX_SNAPSHOT_EVERY', '100'))
+
+# 相似度超过该值的两篇范文视为重复，只保留一篇
+_DUPLICATE_SIMILARITY = 0.9
+
+
+class ExampleIndex:
+    """
+    风格样本与历史重写结果的本地向量索引
+
+    每条范文以"style:风格ID"或"rewrite:记录ID"为键，相同键再次写入时覆盖原有向量；
+    检索时只在同一风格或同一分类的范文中查找
+    """
+
+    def __init__(self, dim: int = EXAMPLE_INDEX_DIM, index_dir: Optional[str] = None):
+        self.dim = dim
+        self.index_dir = index_dir
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._style_ids = np.zeros(0, dtype=np.int64)
+        self._category_codes = np.zeros(0, dtype=np.int32)
+        self._size = 0
+        self._entries: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._categories: Dict[str, int] = {}
+        self._journal_lines = 0
+        # 自上次快照以来是否有变更
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._stats = {
+            "searches": 0,
+            "examples_returned": 0,
+            "inserts": 0,
+            "snapshots": 0,
+        }
+
+    def _get_index_dir(self) -> str:
+        return self.index_dir or EXAMPLE_INDEX_DIR or os.path.join(
+            os.path.dirname(os.path.abspath(get_database_path())), 'example_index'
+        )
+
+    def _paths(self):
+        index_dir = self._get_index_dir()
+        return (
+            os.path.join(index_dir, 'vectors.npy'),
+            os.path.join(index_dir, 'entries.json'),
+            os.path.join(index_dir, 'journal.jsonl'),
+        )
+
+    def _category_code(self, category: Optional[str]) -> int:
+        if not category:
+            return -1
+        return self._categories.setdefault(category, len(self._categories))
+
+    def _ensure_capacity(self, size: int):
+        capacity = self._vectors.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 64)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        style_ids = np.full(new_capacity, -1, dtype=np.int64)
+        style_ids[:self._size] = self._style_ids[:self._size]
+        category_codes = np.full(new_capacity, -1, dtype=np.int32)
+        category_codes[:self._size] = self._category_codes[:self._size]
+        self._vectors, self._style_ids, self._category_codes = vectors, style_ids, category_codes
+
+    def _put(self, entry: Dict[str, Any], vector: Optional[np.ndarray] = None):
+        """
+        写入或覆盖一条范文，不写日志
+        """
+        if vector is None:
+            vector = embed_text(f"{entry.get('title') or ''}\n{entry['content']}", self.dim)
+        position = self._positions.get(entry['key'])
+        if position is None:
+            position = self._size
+            self._ensure_capacity(position + 1)
+            self._size += 1
+            self._entries.append(entry)
+            self._positions[entry['key']] = position
+        else:
+            self._entries[position] = entry
+        self._vectors[position] = vector
+        self._dirty = True
+        self._style_ids[position] = entry.get('style_id') or -1
+        self._category_codes[position] = self._category_code(entry.get('category'))
+
+    def _remove(self, keys: set):
+        """
+        删除一批范文并重新排列数组
+        """
+        keep = [position for position, entry in enumerate(self._entries) if entry['key'] not in keys]
+        self._vectors = self._vectors[keep].copy()
+        self._style_ids = self._style_ids[keep].copy()
+        self._category_codes = self._category_codes[keep].copy()
+        self._entries = [self._entries[position] for position in keep]
+        self._positions = {entry['key']: position for position, entry in enumerate(self._entries)}
+        self._size = len(self._entries)
+        self._dirty = True
+
+    def add(self, key: str, content: str, title: Optional[str] = None, style_id: Optional[int] = None,
+            category: Optional[str] = None, style_name: Optional[str] = None):
+        """
+        增量写入一条范文并追加到日志文件
+
+        Args:
+            key: 范文键，如"style:1"或"rewrite:1"
+            content: 正文
+            title: 标题
+            style_id: 所属风格ID
+            category: 所属分类
+            style_name: 所属风格名称
+        """
+        if not content or not REWRITE_FEW_SHOT_ENABLED:
+            return
+        entry = {
+            'key': key,
+            'title': title or '',
+            'content': content,
+            'style_id': style_id,
+            'category': category,
+            'style_name': style_name,
+        }
+        with self._lock:
+            self._put(entry)
+            self._stats["inserts"] += 1
+            try:
+                self._append_journal(entry)
+            except OSError as e:
+                warning(f"写入范文索引日志失败: {str(e)}")
+
+    def add_style(self, style_analysis):
+        """
+        将风格分析记录的样本笔记写入索引
+
+        Args:
+            style_analysis: StyleAnalysis对象
+        """
+        if style_analysis is None:
+            return
+        self.add(
+            f"style:{style_analysis.id}",
+            extract_note_body(style_analysis.sample_content),
+            title=style_analysis.sample_title,
+            style_id=style_analysis.id,
+            category=style_analysis.category,
+            style_name=style_analysis.style_name,
+        )
+
+    def add_rewrite(self, record_id: int, style_info: Dict[str, Any], title: str, content: str):
+        """
+        将一次重写生成的文案写入索引
+
+        Args:
+            record_id: 重写执行记录ID
+            style_info: 重写使用的风格信息，包含style_id、category、style_name
+            title: 生成的标题
+            content: 生成的正文
+        """
+        self.add(
+            f"rewrite:{record_id}",
+            content,
+            title=title,
+            style_id=style_info.get('style_id'),
+            category=style_info.get('category'),
+            style_name=style_info.get('style_name'),
+        )
+
+    def search(self, query: str, style_id: Optional[int] = None, category: Optional[str] = None,
+               top_k: int = REWRITE_FEW_SHOT_TOP_K, min_score: float = REWRITE_FEW_SHOT_MIN_SCORE,
+               exclude_keys: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        检索与查询文本最相关的范文
+
+        只在同一风格或同一分类的范文中查找，同一风格的范文获得REWRITE_FEW_SHOT_STYLE_BONUS加分，
+        彼此高度相似的范文只保留得分最高的一篇
+
+        Args:
+            query: 查询文本，通常为用户需求
+            style_id: 所选风格ID
+            category: 所选风格的分类
+            top_k: 最多返回的范文数
+            min_score: 最低得分
+            exclude_keys: 需要排除的范文键，如已放入系统提示词的风格样本
+
+        Returns:
+            List[Dict[str, Any]]: 按得分从高到低排列的范文，包含key、title、content、style_id、score等
+        """
+        query_vector = embed_text(query, self.dim)
+        with self._lock:
+            self._stats["searches"] += 1
+            if not self._size or top_k <= 0 or not query_vector.any():
+                return []
+            vectors = self._vectors[:self._size]
+            same_style = self._style_ids[:self._size] == (style_id if style_id is not None else -2)
+            category_code = self._categories.get(category, -2) if category else -2
+            eligible = same_style | (self._category_codes[:self._size] == category_code)
+            scores = vectors @ query_vector + REWRITE_FEW_SHOT_STYLE_BONUS * same_style
+            scores[~eligible] = -np.inf
+            for key in exclude_keys or []:
+                position = self._positions.get(key)
+                if position is not None:
+                    scores[position] = -np.inf
+
+            results = []
+            selected_vectors = []
+            for position in np.argsort(-scores):
+                score = float(scores[position])
+                if score < min_score or len(results) >= top_k:
+                    break
+                vector = vectors[position]
+                if any(float(vector @ selected) > _DUPLICATE_SIMILARITY for selected in selected_vectors):
+                    continue
+                selected_vectors.append(vector)
+                results.append({**self._entries[position], 'score': round(score, 4)})
+            self._stats["examples_returned"] += len(results)
+        return results
+
+    def _append_journal(self, entry: Dict[str, Any]):
+        _, _, journal_path = self._paths()
+        os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._journal_lines += 1
+        if EXAMPLE_INDEX_SNAPSHOT_EVERY and self._journal_lines >= EXAMPLE_INDEX_SNAPSHOT_EVERY:
+            self.save()
+
+    def save(self):
+        """
+        将索引整体写入快照文件并清空日志，没有变更时跳过
+        """
+        vectors_path, entries_path, journal_path = self._paths()
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(vectors_path), exist_ok=True)
+            # 先写临时文件再替换，避免进程中断时留下不完整的快照
+            with open(vectors_path + '.tmp', 'wb') as f:
+                np.save(f, self._vectors[:self._size])
+            with open(entries_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(vectors_path + '.tmp', vectors_path)
+            os.replace(entries_path + '.tmp', entries_path)
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+            self._journal_lines = 0
+            self._dirty = False
+            self._stats["snapshots"] += 1
+
+    def load(self) -> bool:
+        """
+        从快照和日志恢复索引，向量维度与配置不一致时放弃快照
+
+        Returns:
+            bool: 是否读取到已有的索引数据
+        """
+        vectors_path, entries_path, journal_path = self._paths()
+        loaded = False
+        with self._lock:
+            if os.path.exists(vectors_path) and os.path.exists(entries_path):
+                try:
+                    vectors = np.load(vectors_path)
+                    with open(entries_path, encoding='utf-8') as f:
+                        entries = json.load(f)
+                    if vectors.ndim == 2 and vectors.shape == (len(entries), self.dim):
+                        for entry, vector in zip(entries, vectors):
+                            self._put(entry, vector)
+                        loaded = True
+                    else:
+                        warning("范文索引快照的向量维度与配置不一致，重新构建索引")
+                except (OSError, ValueError) as e:
+                    warning(f"读取范文索引快照失败，重新构建索引: {str(e)}")
+            if os.path.exists(journal_path):
+                with open(journal_path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            self._put(json.loads(line))
+                        except (ValueError, KeyError):
+                            # 进程中断时最后一行可能不完整
+                            continue
+                        self._journal_lines += 1
+                        loaded = True
+            # 刚从快照恢复的内容无需再次写入快照，日志中的内容仍需合并
+            self._dirty = self._journal_lines > 0
+        return loaded
+
+    def sync_with_database(self):
+        """
+        与数据库对齐：补充其他途径写入、尚未进入索引的记录，移除数据库中已删除的记录
+
+        重写执行记录只保存风格名称，按风格名称映射回风格ID；命中重写缓存的记录不重复写入
+        """
+        session = get_session()
+        try:
+            styles = session.query(
+                StyleAnalysis.id, StyleAnalysis.style_name, StyleAnalysis.category,
+                StyleAnalysis.sample_title, StyleAnalysis.sample_content
+            ).all()
+            rewrites = session.query(
+                RewriteRecord.id, RewriteRecord.style_name, RewriteRecord.generated_title, RewriteRecord.generated_content
+            ).filter(RewriteRecord.cache_hit.isnot(True)).all()
+        finally:
+            session.close()
+
+        styles_by_name = {}
+        for style in styles:
+            styles_by_name.setdefault(style.style_name, style)
+        expected = {f"style:{style.id}" for style in styles} | {f"rewrite:{record.id}" for record in rewrites}
+
+        with self._lock:
+            stale = set(self._positions) - expected
+            if stale:
+                self._remove(stale)
+            added = 0
+            for style in styles:
+                if f"style:{style.id}" not in self._positions:
+                    self._put({
+                        'key': f"style:{style.id}",
+                        'title': style.sample_title or '',
+                        'content': extract_note_body(style.sample_content),
+                        'style_id': style.id,
+                        'category': style.category,
+                        'style_name': style.style_name,
+                    })
+                    added += 1
+            for record in rewrites:
+                if f"rewrite:{record.id}" not in self._positions and record.generated_content:
+                    style = styles_by_name.get(record.style_name)
+                    self._put({
+                        'key': f"rewrite:{record.id}",
+                        'title': record.generated_title or '',
+                        'content': record.generated_content,
+                        'style_id': style.id if style else None,
+                        'category': style.category if style else None,
+                        'style_name': record.style_name,
+                    })
+                    added += 1
+            if added or stale:
+                self.save()
+        info(f"范文索引共{self._size}条，新增{added}条，移除{len(stale)}条")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取索引统计信息
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["journal_entries"] = self._journal_lines
+        stats["dim"] = self.dim
+        stats["enabled"] = REWRITE_FEW_SHOT_ENABLED
+        return stats
+
+
+# 创建全局范文索引实例
+example_index = ExampleIndex()
+
+
+def load_example_index():
+    """
+    加载范文索引并与数据库对齐，在应用启动时调用
+    """
+    if not REWRITE_FEW_SHOT_ENABLED:
+        return
+    try:
+        example_index.load()
+        example_index.sync_with_database()
+    except Exception as e:
+        warning(f"加载范文索引失败，本次运行不检索范文: {str(e)}")
@@ -0,0 +1,378 @@
+"""
+离线模拟模型后端
+注册为litellm的fake服务商，按工具定义返回格式正确的analyze_style、analyze_styles、copy_cat、copy_cat_variants工具调用，
+延迟、错误率和输出长度可配置，用于在没有网络、不消耗token的情况下压测完整的FastAPI服务
+
+启用方式：
+- 环境变量LLM_BACKEND=fake，所有模型名称自动加上fake/前缀
+- 或在提示词front matter中直接使用fake/开头的模型名称，models候选项可通过fake字段单独配置参数
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import litellm
+from dotenv import load_dotenv
+from litellm import CustomLLM
+from litellm.types.utils import ChatCompletionMessageToolCall, Choices, Function, Message, Usage
+
+from backend.agent.token_counter import estimate_tokens
+
+load_dotenv()
+
+FAKE_PROVIDER = "fake"
+# 模型后端：litellm使用真实服务商，fake使用本模块的模拟后端
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'litellm').strip().lower()
+
+# 默认模拟参数，分布格式见parse_distribution
+FAKE_LLM_DEFAULTS = {
+    "latency": os.getenv('FAKE_LLM_LATENCY', 'lognormal:1.5,0.4'),
+    "output_chars": os.getenv('FAKE_LLM_OUTPUT_CHARS', 'normal:300,80'),
+    "error_rate": float(os.getenv('FAKE_LLM_ERROR_RATE', '0')),
+    "rate_limit_rate": float(os.getenv('FAKE_LLM_RATE_LIMIT_RATE', '0')),
+    "retry_after": float(os.getenv('FAKE_LLM_RETRY_AFTER', '1')),
+    # 首token时间占总延迟的比例，仅用于流式调用
+    "ttft_ratio": float(os.getenv('FAKE_LLM_TTFT_RATIO', '0.3')),
+}
+
+_NOTE_INDEX_PATTERN = re.compile(r'## 笔记编号 (\d+)')
+_VARIANT_COUNT_PATTERN = re.compile(r'生成(\d+)篇')
+_FILLER = "今天和大家分享一个超实用的小发现，用了一段时间真的很惊喜，细节满满值得收藏。"
+_STYLE_NAMES = ["亲切分享风", "干货清单风", "种草安利风", "故事叙述风", "测评对比风"]
+
+
+def is_fake_model(model_name: Optional[str]) -> bool:
+    """
+    判断模型是否由模拟后端处理
+    """
+    return bool(model_name) and model_name.startswith(f"{FAKE_PROVIDER}/")
+
+
+def resolve_model_name(model_name: str) -> str:
+    """
+    LLM_BACKEND=fake时将模型名称映射到模拟后端，保留原名称以便区分各候选模型的统计
+
+    Args:
+        model_name: 提示词中声明的模型名称
+
+    Returns:
+        str: 实际使用的模型名称
+    """
+    if LLM_BACKEND == FAKE_PROVIDER and not is_fake_model(model_name):
+        return f"{FAKE_PROVIDER}/{model_name}"
+    return model_name
+
+
+def parse_distribution(spec: Any):
+    """
+    解析分布配置，返回采样函数
+
+    支持 fixed:值、uniform:下限,上限、normal:均值,标准差、lognormal:中位数,sigma、exponential:均值，
+    也可以直接给出数字表示固定值；采样结果不小于0
+
+    Args:
+        spec: 分布配置
+
+    Returns:
+        Callable[[random.Random], float]: 采样函数
+    """
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, params = str(spec).partition(':')
+    kind = kind.strip().lower()
+    values = [float(value) for value in params.split(',') if value.strip()]
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if kind == 'exponential':
+        return lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    return lambda rng: float(kind)
+
+
+class FakeLLMBackend(CustomLLM):
+    """
+    litellm自定义服务商实现，按模型名称读取模拟参数
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        seed = os.getenv('FAKE_LLM_SEED')
+        self._rng = random.Random(int(seed)) if seed else random.Random()
+        self._stats = {"calls": 0, "errors": 0, "rate_limited": 0, "timeouts": 0}
+
+    def configure(self, model_name: str, overrides: Optional[Dict[str, Any]]):
+        """
+        为指定模型设置模拟参数，未设置的项使用FAKE_LLM_*默认值
+
+        Args:
+            model_name: 模型名称（含fake/前缀）
+            overrides: latency、output_chars、error_rate、rate_limit_rate、retry_after、ttft_ratio
+        """
+        with self._lock:
+            self._profiles[model_name] = dict(overrides or {})
+
+    def _profile(self, model_name: str) -> Dict[str, Any]:
+        with self._lock:
+            profile = dict(FAKE_LLM_DEFAULTS)
+            profile.update(self._profiles.get(f"{FAKE_PROVIDER}/{model_name}", {}))
+            return profile
+
+    def _sample(self, spec: Any) -> float:
+        with self._lock:
+            return parse_distribution(spec)(self._rng)
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _plan(self, model: str, messages: List[dict], optional_params: dict) -> Dict[str, Any]:
+        """
+        决定本次调用的延迟、是否出错以及返回的工具调用
+        """
+        profile = self._profile(model)
+        with self._lock:
+            self._stats["calls"] += 1
+        roll = self._roll()
+        failure = None
+        if roll < profile["rate_limit_rate"]:
+            failure = "rate_limit"
+        elif roll < profile["rate_limit_rate"] + profile["error_rate"]:
+            failure = "error"
+        prompt = "\n".join(_message_text(message) for message in messages)
+        tool = _select_tool(optional_params)
+        arguments = None
+        if tool is not None:
+            arguments = json.dumps(
+                _build_arguments(tool, _last_user_text(messages), lambda: int(self._sample(profile["output_chars"]))),
+                ensure_ascii=False
+            )
+        return {
+            "latency": self._sample(profile["latency"]),
+            "ttft_ratio": profile["ttft_ratio"],
+            "failure": failure,
+            "retry_after": profile["retry_after"],
+            "tool_name": tool["function"]["name"] if tool else None,
+            "arguments": arguments,
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(arguments or _FILLER),
+        }
+
+    def _raise(self, model: str, plan: Dict[str, Any]):
+        request = httpx.Request("POST", f"http://{FAKE_PROVIDER}/chat/completions")
+        if plan["failure"] == "rate_limit":
+            with self._lock:
+                self._stats["rate_limited"] += 1
+            response = httpx.Response(429, headers={"retry-after": str(plan["retry_after"])}, request=request)
+            raise litellm.RateLimitError(
+                message="模拟服务商限流", llm_provider=FAKE_PROVIDER, model=model, response=response
+            )
+        with self._lock:
+            self._stats["errors"] += 1
+        raise litellm.ServiceUnavailableError(
+            message="模拟服务商错误", llm_provider=FAKE_PROVIDER, model=model,
+            response=httpx.Response(503, request=request)
+        )
+
+    def _raise_timeout(self, model: str, timeout: float):
+        with self._lock:
+            self._stats["timeouts"] += 1
+        raise litellm.Timeout(message=f"模拟服务商超时（{timeout:.1f}秒）", model=model, llm_provider=FAKE_PROVIDER)
+
+    def _fill_response(self, model_response, plan: Dict[str, Any]):
+        if plan["arguments"] is not None:
+            message = Message(role="assistant", content=None, tool_calls=[ChatCompletionMessageToolCall(
+                id="call_fake", type="function",
+                function=Function(name=plan["tool_name"], arguments=plan["arguments"])
+            )])
+            finish_reason = "tool_calls"
+        else:
+            message = Message(role="assistant", content=_FILLER)
+            finish_reason = "stop"
+        model_response.choices = [Choices(index=0, finish_reason=finish_reason, message=message)]
+        model_response.usage = Usage(
+            prompt_tokens=plan["prompt_tokens"],
+            completion_tokens=plan["completion_tokens"],
+            total_tokens=plan["prompt_tokens"] + plan["completion_tokens"],
+        )
+        return model_response
+
+    def completion(self, model, messages, api_base, custom_prompt_dict, model_response, print_verbose, encoding,
+                   api_key, logging_obj, optional_params, *args, **kwargs):
+        plan = self._plan(model, messages, optional_params)
+        timeout = _timeout_seconds(kwargs.get("timeout"))
+        if timeout is not None and plan["latency"] > timeout:
+            # 与真实服务商的HTTP客户端一样，超过调用方给出的超时时间即放弃
+            time.sleep(timeout)
+            self._raise_timeout(model, timeout)
+        time.sleep(plan["latency"])
+        if plan["failure"]:
+            self._raise(model, plan)
+        return self._fill_response(model_response, plan)
+
+    async def acompletion(self, model, messages, api_base, custom_prompt_dict, model_response, print_verbose, encoding,
+                          api_key, logging_obj, optional_params, *args, **kwargs):
+        plan = self._plan(model, messages, optional_params)
+        timeout = _timeout_seconds(kwargs.get("timeout"))
+        if timeout is not None and plan["latency"] > timeout:
+            await asyncio.sleep(timeout)
+            self._raise_timeout(model, timeout)
+        await asyncio.sleep(plan["latency"])
+        if plan["failure"]:
+            self._raise(model, plan)
+        return self._fill_response(model_response, plan)
+
+    def astreaming(self, model, messages, api_base, custom_prompt_dict, model_response, print_verbose, encoding,
+                   api_key, logging_obj, optional_params, *args, **kwargs):
+        # 与真实服务商一样，限流和服务错误在建立流之前返回；litellm会吞掉流内抛出的异常
+        plan = self._plan(model, messages, optional_params)
+        if plan["failure"]:
+            self._raise(model, plan)
+        return self._stream(plan)
+
+    async def _stream(self, plan: Dict[str, Any]):
+        await asyncio.sleep(plan["latency"] * plan["ttft_ratio"])
+        text = plan["arguments"] if plan["arguments"] is not None else _FILLER
+        pieces = [text[i:i + 16] for i in range(0, len(text), 16)] or [""]
+        interval = plan["latency"] * (1 - plan["ttft_ratio"]) / len(pieces)
+        for position, piece in enumerate(pieces):
+            last = position == len(pieces) - 1
+            chunk = {
+                "text": "" if plan["arguments"] is not None else piece,
+                "tool_use": {
+                    "id": "call_fake", "type": "function", "index": 0,
+                    "function": {"name": plan["tool_name"], "arguments": piece},
+                } if plan["arguments"] is not None else None,
+                "is_finished": last,
+                "finish_reason": ("tool_calls" if plan["arguments"] is not None else "stop") if last else "",
+                "usage": {
+                    "prompt_tokens": plan["prompt_tokens"],
+                    "completion_tokens": plan["completion_tokens"],
+                    "total_tokens": plan["prompt_tokens"] + plan["completion_tokens"],
+                } if last else None,
+                "index": 0,
+            }
+            yield chunk
+            if not last:
+                await asyncio.sleep(interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取模拟后端统计信息
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["profiles"] = {name: dict(profile) for name, profile in self._profiles.items()}
+        stats["backend"] = LLM_BACKEND
+        stats["defaults"] = dict(FAKE_LLM_DEFAULTS)
+        return stats
+
+
+def _timeout_seconds(timeout: Any) -> Optional[float]:
+    """
+    将litellm传入的timeout（秒数或httpx.Timeout）转换为秒数
+    """
+    if isinstance(timeout, (int, float)):
+        return float(timeout)
+    if isinstance(timeout, httpx.Timeout):
+        return timeout.read
+    return None
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") if isinstance(message, dict) else None
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _last_user_text(messages: List[dict]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, dict) and message.get("role") == "user":
+            return _message_text(message)
+    return ""
+
+
+def _select_tool(optional_params: dict) -> Optional[dict]:
+    """
+    按tool_choice选择要返回的工具，未指定时使用第一个工具
+    """
+    tools = optional_params.get("tools") or []
+    if not tools:
+        return None
+    tool_choice = optional_params.get("tool_choice")
+    if isinstance(tool_choice, dict):
+        name = (tool_choice.get("function") or {}).get("name")
+        for tool in tools:
+            if tool.get("function", {}).get("name") == name:
+                return tool
+    return tools[0]
+
+
+def _pick(options: List[str], seed_text: str, salt: int = 0) -> str:
+    digest = hashlib.md5(f"{salt}:{seed_text}".encode("utf-8")).digest()
+    return options[digest[0] % len(options)]
+
+
+def _copycat_arguments(task: str, content_chars: int, salt: int = 0) -> Dict[str, str]:
+    body = (_FILLER * (content_chars // len(_FILLER) + 1))[:max(content_chars, 1)]
+    return {
+        "title": f"{_pick(['宝藏', '亲测', '私藏', '必看'], task, salt)}｜这份好物清单请收好",
+        "content": body,
+        "tags": "#好物分享 #种草 #生活小技巧",
+    }
+
+
+def _build_arguments(tool: dict, task: str, sample_chars) -> Dict[str, Any]:
+    """
+    按工具名称构造格式正确的工具调用参数，未知工具按参数定义填充字符串字段
+    """
+    function = tool.get("function", {})
+    name = function.get("name")
+    if name == "analyze_style":
+        return {
+            "style_name": _pick(_STYLE_NAMES, task),
+            "feature_desc": "以第一人称分享真实体验，语气亲切，善用列表和表情",
+            "category": "生活-好物分享",
+        }
+    if name == "analyze_styles":
+        return {"results": [
+            {
+                "note_index": int(index),
+                "style_name": _pick(_STYLE_NAMES, task, int(index)),
+                "feature_desc": "以第一人称分享真实体验，语气亲切，善用列表和表情",
+                "category": "生活-好物分享",
+            }
+            for index in _NOTE_INDEX_PATTERN.findall(task)
+        ]}
+    if name == "copy_cat":
+        return _copycat_arguments(task, sample_chars())
+    if name == "copy_cat_variants":
+        match = _VARIANT_COUNT_PATTERN.search(task)
+        count = int(match.group(1)) if match else 2
+        return {"variants": [_copycat_arguments(task, sample_chars(), salt) for salt in range(count)]}
+    properties = function.get("parameters", {}).get("properties", {})
+    return {key: _FILLER for key, value in properties.items() if value.get("type") == "string"}
+
+
+# 创建全局模拟后端实例并注册到litellm
+fake_llm_backend = FakeLLMBackend()
+litellm.custom_provider_map = [
+    provider for provider in litellm.custom_provider_map if provider.get("provider") != FAKE_PROVIDER
+] + [{"provider": FAKE_PROVIDER, "custom_handler": fake_llm_backend}]
@@ -0,0 +1,360 @@
+"""
+LLM异步执行模块
+在独立的有界线程池中运行同步的agent调用，避免阻塞事件循环
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.utils.logger import debug
+from backend.agent.llm_scheduler import (
+    llm_scheduler,
+    extract_retry_after,
+    PRIORITY_INTERACTIVE,
+    LLM_RATE_LIMIT_RETRIES,
+)
+from backend.agent.token_counter import estimate_tokens
+from backend.agent.call_log import record_llm_call, settle_call_usage
+
+load_dotenv()
+
+# 同时执行的LLM调用上限与单次调用超时时间（秒）
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', '8'))
+LLM_CALL_TIMEOUT = float(os.getenv('LLM_CALL_TIMEOUT', '180'))
+
+
+class LLMExecutor:
+    """
+    有界的LLM调用执行器
+
+    所有StyleAnalyzer与CopycatAgent调用都提交到同一个专用线程池，
+    超出并发上限的调用在队列中等待，不占用事件循环和默认线程池。
+    超时时间同时传给服务商调用，等待方超时放弃后工作线程也会随之结束，不会长期占用线程池；
+    放弃时调用记录中的用量尚不完整，由工作线程结束后补记
+    """
+
+    def __init__(self, max_workers: int = LLM_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "in_flight": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            # 等待方已超时或取消但工作线程仍在执行的调用：累计次数与当前数量
+            "abandoned": 0,
+            "abandoned_running": 0,
+            "total_wait_seconds": 0.0,
+            "total_run_seconds": 0.0,
+            "input_tokens": 0,
+            "cached_tokens": 0,
+        }
+        # 按agent名称汇总的输入token与缓存命中token
+        self._usage_by_agent: Dict[str, Dict[str, int]] = {}
+
+    def _call(self, agent, task: str, submitted_at: float, timing: Dict[str, Any], deadline: Optional[float]):
+        """
+        在工作线程中执行agent调用并记录排队与执行耗时，开始执行的时间写入timing；
+        服务商调用的超时时间为距deadline的剩余时间
+        """
+        started_at = time.perf_counter()
+        with self._lock:
+            timing["started_at"] = started_at
+            self._stats["queued"] -= 1
+            self._stats["in_flight"] += 1
+            self._stats["total_wait_seconds"] += started_at - submitted_at
+        usage_before = get_agent_usage(agent)
+        try:
+            if deadline is not None:
+                remaining = deadline - started_at
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("LLM调用在开始执行前已超时")
+                set_provider_timeout(agent, remaining)
+            result = agent.run(task)
+            with self._lock:
+                self._stats["completed"] += 1
+            usage_after = get_agent_usage(agent)
+            self.record_usage(getattr(agent, 'agent_name', None), {
+                key: usage_after[key] - usage_before[key] for key in usage_after
+            })
+            return result
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        finally:
+            run_seconds = time.perf_counter() - started_at
+            usage_after = get_agent_usage(agent)
+            late_usage = {key: usage_after[key] - usage_before[key] for key in usage_after}
+            call = None
+            with self._lock:
+                self._stats["in_flight"] -= 1
+                self._stats["total_run_seconds"] += run_seconds
+                timing["finished"] = True
+                if timing.get("abandoned"):
+                    self._stats["abandoned_running"] -= 1
+                    # 等待方尚未写入调用记录时留给它补记
+                    timing["late_usage"] = late_usage
+                    call = timing.get("call")
+            if call is not None:
+                settle_call_usage(call, late_usage)
+            debug(f"LLM调用耗时: {run_seconds:.2f}秒，排队: {started_at - submitted_at:.2f}秒")
+
+    async def run(self, agent, task: str, timeout: Optional[float] = LLM_CALL_TIMEOUT,
+                  priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """
+        异步执行agent调用
+
+        调用先经过调度器按优先级和限额排队，排队时间计入超时；
+        服务商限流时按Retry-After暂停派发并重新排队
+
+        Args:
+            agent: swarms Agent实例
+            task: 任务描述
+            timeout: 超时时间（秒），None表示不限制
+            priority: 调度优先级，PRIORITY_INTERACTIVE或PRIORITY_BULK
+
+        Returns:
+            Any: agent.run的返回结果
+        """
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        try:
+            return await asyncio.wait_for(self._run_scheduled(agent, task, priority, deadline), timeout=timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise
+
+    async def _run_scheduled(self, agent, task: str, priority: int, deadline: Optional[float] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        estimated_tokens = estimate_tokens(getattr(agent, 'system_prompt', None) or '') + estimate_tokens(task)
+        attempt = 0
+        while True:
+            enqueued_at = time.perf_counter()
+            await llm_scheduler.acquire(priority, estimated_tokens)
+            with self._lock:
+                self._stats["queued"] += 1
+            usage_before = get_agent_usage(agent)
+            timing: Dict[str, Any] = {}
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, self._call, agent, task, time.perf_counter(), timing, deadline
+                )
+            except asyncio.CancelledError as e:
+                abandoned = self._mark_abandoned(timing)
+                self._record_call(agent, usage_before, enqueued_at, timing, e)
+                if abandoned:
+                    self._attach_abandoned_call(timing)
+                raise
+            except BaseException as e:
+                # 失败、限流和被取消（超时或对冲落败）的调用同样计入调用记录
+                self._record_call(agent, usage_before, enqueued_at, timing, e)
+                if not isinstance(e, Exception):
+                    raise
+                retry_after = extract_retry_after(e)
+                if retry_after is None:
+                    raise
+                llm_scheduler.defer(retry_after)
+                attempt += 1
+                if attempt > LLM_RATE_LIMIT_RETRIES:
+                    raise
+                continue
+            usage = self._record_call(agent, usage_before, enqueued_at, timing)
+            llm_scheduler.settle(estimated_tokens, usage["input_tokens"])
+            return result
+
+    def _mark_abandoned(self, timing: Dict[str, Any]) -> bool:
+        """
+        等待方被取消时，已开始且尚未结束的调用计为放弃仍在执行，工作线程结束时扣减
+
+        Returns:
+            bool: 调用是否仍在执行
+        """
+        with self._lock:
+            if "started_at" in timing and not timing.get("finished"):
+                timing["abandoned"] = True
+                self._stats["abandoned"] += 1
+                self._stats["abandoned_running"] += 1
+                return True
+        return False
+
+    def _attach_abandoned_call(self, timing: Dict[str, Any]):
+        """
+        将放弃的调用的记录交给工作线程补记用量，工作线程已结束时直接补记
+        """
+        call = timing.get("record")
+        if call is None:
+            return
+        with self._lock:
+            timing["call"] = call
+            late_usage = timing.get("late_usage")
+        if late_usage is not None:
+            settle_call_usage(call, late_usage)
+
+    @staticmethod
+    def _record_call(agent, usage_before: Dict[str, int], enqueued_at: float, timing: Dict[str, Any],
+                     exc: Optional[BaseException] = None) -> Dict[str, int]:
+        """
+        将一次调用的用量、服务商耗时和排队耗时写入当前的调用收集器，写入的调用字典保存在timing["record"]
+
+        Returns:
+            Dict[str, int]: 本次调用的token用量
+        """
+        now = time.perf_counter()
+        started_at = timing.get("started_at", now)
+        usage_after = get_agent_usage(agent)
+        usage = {key: usage_after[key] - usage_before[key] for key in usage_after}
+        error_message = None
+        if isinstance(exc, Exception):
+            error_message = str(exc) or type(exc).__name__
+        elif exc is not None:
+            error_message = "调用被取消"
+        timing["record"] = record_llm_call(
+            getattr(agent, 'agent_name', None),
+            getattr(agent, 'model_name', None),
+            usage,
+            latency=now - started_at,
+            queue_seconds=started_at - enqueued_at,
+            success=exc is None,
+            error_message=error_message,
+        )
+        return usage
+
+    def record_usage(self, agent_name: Optional[str], usage: Dict[str, int]):
+        """
+        记录一次调用的token用量
+
+        Args:
+            agent_name: agent名称
+            usage: 包含input_tokens和cached_tokens的用量字典
+        """
+        input_tokens = usage.get("input_tokens", 0)
+        cached_tokens = usage.get("cached_tokens", 0)
+        if not input_tokens and not cached_tokens:
+            return
+        with self._lock:
+            self._stats["input_tokens"] += input_tokens
+            self._stats["cached_tokens"] += cached_tokens
+            agent_usage = self._usage_by_agent.setdefault(
+                agent_name or "unknown", {"calls": 0, "input_tokens": 0, "cached_tokens": 0}
+            )
+            agent_usage["calls"] += 1
+            agent_usage["input_tokens"] += input_tokens
+            agent_usage["cached_tokens"] += cached_tokens
+        debug(f"{agent_name} 输入token: {input_tokens}，缓存命中token: {cached_tokens}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取执行器统计信息
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            usage_by_agent = {name: dict(usage) for name, usage in self._usage_by_agent.items()}
+        stats["max_workers"] = self.max_workers
+        stats["cached_token_ratio"] = stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0
+        stats["usage_by_agent"] = usage_by_agent
+        return stats
+
+    def shutdown(self):
+        """
+        关闭线程池，不等待仍在执行的调用
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_usage(usage: Any) -> Dict[str, int]:
+    """
+    从litellm响应的usage中提取输入、输出token与缓存命中token
+
+    兼容OpenAI格式的prompt_tokens_details.cached_tokens和Anthropic格式的cache_read_input_tokens
+
+    Args:
+        usage: litellm响应中的usage对象或字典
+
+    Returns:
+        Dict[str, int]: 包含input_tokens、output_tokens和cached_tokens的字典
+    """
+    def field(obj, name):
+        if obj is None:
+            return None
+        return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+    details = field(usage, "prompt_tokens_details")
+    cached_tokens = field(details, "cached_tokens") or field(usage, "cache_read_input_tokens") or 0
+    return {
+        "input_tokens": int(field(usage, "prompt_tokens") or 0),
+        "output_tokens": int(field(usage, "completion_tokens") or 0),
+        "cached_tokens": int(cached_tokens),
+    }
+
+
+def set_provider_timeout(agent, seconds: float):
+    """
+    设置agent发起的服务商调用的超时时间，传给litellm的timeout参数
+
+    Args:
+        agent: swarms Agent实例
+        seconds: 超时时间（秒）
+    """
+    llm = getattr(agent, 'llm', None)
+    init_kwargs = getattr(llm, 'init_kwargs', None)
+    if isinstance(init_kwargs, dict):
+        init_kwargs["timeout"] = seconds
+
+
+def get_agent_usage(agent) -> Dict[str, int]:
+    """
+    读取agent累计的token用量，不支持用量统计的agent返回0
+
+    Args:
+        agent: swarms Agent实例
+
+    Returns:
+        Dict[str, int]: 包含input_tokens、output_tokens和cached_tokens的字典
+    """
+    try:
+        usage = getattr(agent, 'usage', None) or {}
+    except Exception:
+        usage = {}
+    if not isinstance(usage, dict):
+        usage = {}
+    return {
+        "input_tokens": int(usage.get("input_tokens") or 0),
+        "output_tokens": int(usage.get("output_tokens") or 0),
+        "cached_tokens": int(usage.get("cached_tokens") or 0),
+    }
+
+
+# 创建全局LLM执行器实例
+llm_executor = LLMExecutor()
+
+
+async def run_agent_async(agent, task: str, timeout: Optional[float] = LLM_CALL_TIMEOUT,
+                          priority: int = PRIORITY_INTERACTIVE) -> Any:
+    """
+    在专用线程池中异步运行agent
+
+    Args:
+        agent: swarms Agent实例
+        task: 任务描述
+        timeout: 超时时间（秒）
+        priority: 调度优先级
+
+    Returns:
+        Any: agent.run的返回结果
+    """
+    return await llm_executor.run(agent, task, timeout=timeout, priority=priority)
@@ -0,0 +1,266 @@
+"""
+LLM请求调度模块
+按优先级排队所有模型调用，使用令牌桶限制每分钟请求数和token数，
+遇到服务商限流时按Retry-After暂停派发，避免批量任务占满限额导致交互请求被限流
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from backend.utils.logger import debug, warning
+
+load_dotenv()
+
+# 优先级，数值越小越先派发
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BULK: "bulk",
+}
+
+# 每分钟请求数与token数上限，0表示不限制
+LLM_RATE_LIMIT_RPM = int(os.getenv('LLM_RATE_LIMIT_RPM', '0'))
+LLM_RATE_LIMIT_TPM = int(os.getenv('LLM_RATE_LIMIT_TPM', '0'))
+# 为交互请求保留的限额比例，批量请求只能使用超出该比例的部分
+LLM_INTERACTIVE_RESERVE = float(os.getenv('LLM_INTERACTIVE_RESERVE', '0.2'))
+# 服务商限流时的最大重试次数，以及没有Retry-After时的默认等待时间（秒）
+LLM_RATE_LIMIT_RETRIES = int(os.getenv('LLM_RATE_LIMIT_RETRIES', '2'))
+LLM_RATE_LIMIT_DEFAULT_WAIT = float(os.getenv('LLM_RATE_LIMIT_DEFAULT_WAIT', '10'))
+
+
+class TokenBucket:
+    """
+    令牌桶，容量为每分钟限额，按秒匀速补充
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def refill(self, now: float):
+        if self.enabled:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """
+        计算取出amount个令牌且保留reserve比例容量需要等待的时间（秒），0表示可以立即取出
+        """
+        if not self.enabled:
+            return 0.0
+        # 单次请求超过容量时按容量计算，避免永远无法派发
+        needed = min(amount, self.capacity) + self.capacity * reserve
+        needed = min(needed, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.enabled:
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """
+        按实际用量修正预估，amount为正时补扣，为负时返还
+        """
+        if self.enabled:
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class _Waiter:
+    def __init__(self, priority: int, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class LLMScheduler:
+    """
+    优先级感知的LLM请求调度器
+
+    请求按(优先级, 到达顺序)排队，队首请求在请求数和token数两个令牌桶都满足时才派发；
+    批量请求需要为交互请求留出LLM_INTERACTIVE_RESERVE比例的限额。
+    服务商返回Retry-After时暂停全部派发直到该时间。所有方法只在事件循环线程中调用，状态无需加锁
+    """
+
+    def __init__(self, rpm: int = LLM_RATE_LIMIT_RPM, tpm: int = LLM_RATE_LIMIT_TPM,
+                 interactive_reserve: float = LLM_INTERACTIVE_RESERVE):
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.interactive_reserve = interactive_reserve
+        self._queue = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {
+            name: {"queued": 0, "dispatched": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+        self._stats["rate_limited"] = 0
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """
+        等待派发许可
+
+        Args:
+            priority: 请求优先级，PRIORITY_INTERACTIVE或PRIORITY_BULK
+            tokens: 预估的输入token数
+        """
+        waiter = _Waiter(priority, tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+        self._stats[PRIORITY_NAMES[priority]]["queued"] += 1
+        self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.done() or waiter.future.cancelled():
+                # 尚未派发就被取消，从队列中移除
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+                self._stats[PRIORITY_NAMES[priority]]["queued"] -= 1
+                self._pump()
+            raise
+
+    def _pump(self):
+        """
+        派发队首满足限额的请求，不满足时在令牌补足后再次检查
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self.request_bucket.refill(now)
+        self.token_bucket.refill(now)
+        while self._queue:
+            priority, _, waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+            reserve = self.interactive_reserve if priority != PRIORITY_INTERACTIVE else 0.0
+            delay = max(
+                self._paused_until - now,
+                self.request_bucket.wait_time(1, reserve),
+                self.token_bucket.wait_time(waiter.tokens, reserve),
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            heapq.heappop(self._queue)
+            self.request_bucket.take(1)
+            self.token_bucket.take(waiter.tokens)
+            self._record_dispatch(waiter)
+            waiter.future.set_result(None)
+
+    def _record_dispatch(self, waiter: _Waiter):
+        wait_seconds = time.perf_counter() - waiter.enqueued_at
+        stats = self._stats[PRIORITY_NAMES[waiter.priority]]
+        stats["queued"] -= 1
+        stats["dispatched"] += 1
+        stats["total_wait_seconds"] += wait_seconds
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait_seconds)
+        if wait_seconds > 1:
+            debug(f"LLM请求排队 {wait_seconds:.2f}秒后派发，优先级: {PRIORITY_NAMES[waiter.priority]}")
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """
+        调用结束后按实际输入token修正token桶
+
+        Args:
+            estimated_tokens: 派发时预估的token数
+            actual_tokens: 实际输入token数，0表示未知，不做修正
+        """
+        if actual_tokens:
+            self.token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    def defer(self, seconds: float):
+        """
+        服务商限流时暂停派发
+
+        Args:
+            seconds: 暂停时长（秒）
+        """
+        self._stats["rate_limited"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        warning(f"服务商限流，暂停派发LLM请求 {seconds:.1f}秒")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取调度统计信息，包含各优先级的队列深度与排队耗时
+        """
+        stats = {}
+        for priority, name in PRIORITY_NAMES.items():
+            item = dict(self._stats[name])
+            item["avg_wait_seconds"] = item["total_wait_seconds"] / item["dispatched"] if item["dispatched"] else 0.0
+            stats[name] = item
+        stats["rate_limited"] = self._stats["rate_limited"]
+        stats["paused_seconds"] = max(0.0, self._paused_until - time.monotonic())
+        stats["rpm_limit"] = int(self.request_bucket.capacity)
+        stats["tpm_limit"] = int(self.token_bucket.capacity)
+        stats["available_requests"] = round(self.request_bucket.tokens, 2) if self.request_bucket.enabled else None
+        stats["available_tokens"] = round(self.token_bucket.tokens, 2) if self.token_bucket.enabled else None
+        return stats
+
+
+def extract_retry_after(exc: BaseException) -> Optional[float]:
+    """
+    从服务商限流异常中读取Retry-After等待时间
+
+    沿异常链查找429状态码，依次读取retry_after属性、响应头中的retry-after-ms和retry-after
+
+    Args:
+        exc: 模型调用抛出的异常
+
+    Returns:
+        Optional[float]: 等待时间（秒），不是限流异常时返回None
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        response = getattr(exc, "response", None)
+        status_code = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+        if status_code == 429 or type(exc).__name__ == "RateLimitError":
+            retry_after = getattr(exc, "retry_after", None)
+            if retry_after:
+                return float(retry_after)
+            headers = getattr(exc, "litellm_response_headers", None) or getattr(response, "headers", None) or {}
+            return _parse_retry_after(headers) or LLM_RATE_LIMIT_DEFAULT_WAIT
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+    except AttributeError:
+        return None
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# 创建全局LLM调度实例
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,282 @@
+"""
+模型路由模块
+按提示词front matter中声明的候选模型，根据滚动延迟和错误率选择当前最优的模型，
+超时或出错时回退到下一个候选，交互式重写可选开启延迟对冲
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from backend.agent.agent_factory import agent_factory
+from backend.agent.llm_executor import llm_executor, LLM_CALL_TIMEOUT
+from backend.agent.llm_scheduler import PRIORITY_INTERACTIVE
+from backend.utils.logger import info, warning
+
+load_dotenv()
+
+# 每个模型保留的最近样本数
+ROUTER_WINDOW = int(os.getenv('ROUTER_WINDOW', '50'))
+# 样本不足时假定的延迟（秒），用于和已有数据的模型比较
+ROUTER_DEFAULT_LATENCY = float(os.getenv('ROUTER_DEFAULT_LATENCY', '10'))
+# 还有后续候选时单次尝试的超时时间（秒），超时即回退
+ROUTER_ATTEMPT_TIMEOUT = float(os.getenv('ROUTER_ATTEMPT_TIMEOUT', '60'))
+# 连续失败达到该次数后，模型在冷却时间内排到最后
+ROUTER_FAILURE_THRESHOLD = int(os.getenv('ROUTER_FAILURE_THRESHOLD', '3'))
+ROUTER_COOLDOWN = float(os.getenv('ROUTER_COOLDOWN', '30'))
+# 对冲请求的等待时间（秒），没有延迟数据时使用；有数据时使用首选模型的p95
+ROUTER_HEDGE_DELAY = float(os.getenv('ROUTER_HEDGE_DELAY', '5'))
+# 交互式重写默认是否开启对冲
+ROUTER_HEDGE_REWRITES = os.getenv('ROUTER_HEDGE_REWRITES', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# 错误率对得分的放大系数
+_ERROR_PENALTY = 4.0
+# 计算分位数所需的最少样本数
+_MIN_SAMPLES = 3
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class _ModelStats:
+    """
+    单个模型的滚动统计
+    """
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_failure_at = 0.0
+
+
+class ModelRouter:
+    """
+    延迟感知的模型路由器
+
+    得分为p95延迟乘以(1 + 错误率 * 放大系数)，得分越低越优先；
+    样本不足的模型使用默认延迟参与比较，连续失败的模型在冷却期内排到最后
+    """
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self.window = window
+        self._models: Dict[str, _ModelStats] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "routed_calls": 0,
+            "fallbacks": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    def _get(self, model_name: str) -> _ModelStats:
+        stats = self._models.get(model_name)
+        if stats is None:
+            stats = self._models[model_name] = _ModelStats(self.window)
+        return stats
+
+    def _score(self, model_name: str, now: float) -> Tuple[int, float]:
+        stats = self._models.get(model_name)
+        if stats is None:
+            return 0, ROUTER_DEFAULT_LATENCY
+        cooling = (stats.consecutive_failures >= ROUTER_FAILURE_THRESHOLD
+                   and now - stats.last_failure_at < ROUTER_COOLDOWN)
+        latency = _percentile(list(stats.latencies), 95) if len(stats.latencies) >= _MIN_SAMPLES else ROUTER_DEFAULT_LATENCY
+        error_rate = (stats.outcomes.count(False) / len(stats.outcomes)) if stats.outcomes else 0.0
+        return (1 if cooling else 0), latency * (1 + error_rate * _ERROR_PENALTY)
+
+    def rank(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按当前得分对候选模型排序，得分相同时保持声明顺序
+
+        Args:
+            candidates: 候选模型列表
+
+        Returns:
+            List[Dict[str, Any]]: 排序后的候选模型
+        """
+        now = time.time()
+        with self._lock:
+            scores = {candidate["model_name"]: self._score(candidate["model_name"], now) for candidate in candidates}
+        return sorted(candidates, key=lambda candidate: scores[candidate["model_name"]])
+
+    def record(self, model_name: str, latency: float, success: bool):
+        """
+        记录一次调用结果
+
+        Args:
+            model_name: 模型名称
+            latency: 调用耗时（秒），失败时也会记录，超时的耗时即为超时时间
+            success: 是否成功
+        """
+        with self._lock:
+            stats = self._get(model_name)
+            stats.calls += 1
+            stats.outcomes.append(success)
+            if success:
+                stats.latencies.append(latency)
+                stats.consecutive_failures = 0
+            else:
+                stats.failures += 1
+                stats.consecutive_failures += 1
+                stats.last_failure_at = time.time()
+
+    def hedge_delay(self, model_name: str) -> float:
+        """
+        获取对冲请求的等待时间：首选模型的p95延迟，样本不足时使用ROUTER_HEDGE_DELAY
+        """
+        with self._lock:
+            stats = self._models.get(model_name)
+            if stats is None or len(stats.latencies) < _MIN_SAMPLES:
+                return ROUTER_HEDGE_DELAY
+            return _percentile(list(stats.latencies), 95)
+
+    def count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取路由统计信息，包含每个模型的滚动p50/p95延迟和错误率
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            models = {}
+            for model_name, model_stats in self._models.items():
+                latencies = list(model_stats.latencies)
+                outcomes = list(model_stats.outcomes)
+                models[model_name] = {
+                    "calls": model_stats.calls,
+                    "failures": model_stats.failures,
+                    "error_rate": outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+                    "p50_seconds": _percentile(latencies, 50) if latencies else None,
+                    "p95_seconds": _percentile(latencies, 95) if latencies else None,
+                    "consecutive_failures": model_stats.consecutive_failures,
+                }
+        stats["models"] = models
+        return stats
+
+
+# 创建全局模型路由实例
+model_router = ModelRouter()
+
+
+async def _attempt(build_agent: Callable[[Dict[str, Any]], Any], model: Dict[str, Any], task: str, timeout: float,
+                   priority: int = PRIORITY_INTERACTIVE):
+    """
+    使用指定模型执行一次调用并记录结果
+    """
+    agent = build_agent(model)
+    started_at = time.perf_counter()
+    try:
+        result = await llm_executor.run(agent, task, timeout=timeout, priority=priority)
+    except asyncio.CancelledError:
+        # 被对冲请求取消的调用不计入统计
+        raise
+    except Exception:
+        model_router.record(model["model_name"], time.perf_counter() - started_at, False)
+        raise
+    model_router.record(model["model_name"], time.perf_counter() - started_at, True)
+    return agent, result
+
+
+async def _hedged_attempt(build_agent, primary: Dict[str, Any], backup: Dict[str, Any], task: str, timeout: float,
+                          priority: int = PRIORITY_INTERACTIVE):
+    """
+    首选模型超过对冲等待时间仍未返回时，向备选模型发出重复请求，取先成功的结果；
+    首选模型在对冲等待时间内失败时立即改用备选模型，返回或抛出异常时两个候选都已尝试
+    """
+    primary_task = asyncio.ensure_future(_attempt(build_agent, primary, task, timeout, priority))
+    done, _ = await asyncio.wait({primary_task}, timeout=model_router.hedge_delay(primary["model_name"]))
+    if done:
+        if primary_task.exception() is None:
+            return primary_task.result()
+        warning(f"模型 {primary['model_name']} 调用失败: {str(primary_task.exception())}")
+        model_router.count("fallbacks")
+        info(f"回退到模型 {backup['model_name']}")
+        return await _attempt(build_agent, backup, task, timeout, priority)
+
+    model_router.count("hedges")
+    info(f"模型 {primary['model_name']} 响应较慢，向 {backup['model_name']} 发出对冲请求")
+    backup_task = asyncio.ensure_future(_attempt(build_agent, backup, task, timeout, priority))
+    pending = {primary_task, backup_task}
+    last_error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for finished in done:
+                if finished.exception() is None:
+                    if finished is backup_task:
+                        model_router.count("hedge_wins")
+                    return finished.result()
+                last_error = finished.exception()
+        raise last_error
+    finally:
+        for unfinished in pending:
+            unfinished.cancel()
+
+
+async def run_routed_agent_async(file_path: str, build_agent: Callable[[Dict[str, Any]], Any], task: str,
+                                 timeout: Optional[float] = LLM_CALL_TIMEOUT, hedge: bool = False,
+                                 priority: int = PRIORITY_INTERACTIVE) -> Tuple[Any, Any]:
+    """
+    按路由结果选择模型执行agent调用，失败或超时时回退到下一个候选
+
+    Args:
+        file_path: 提示词markdown文件路径，候选模型来自其front matter
+        build_agent: 根据候选模型构造agent实例的函数
+        task: 任务描述
+        timeout: 整体超时时间（秒）
+        hedge: 是否对首选模型开启延迟对冲
+        priority: 调度优先级，PRIORITY_INTERACTIVE或PRIORITY_BULK
+
+    Returns:
+        Tuple[Any, Any]: 实际完成调用的agent实例及agent.run的返回结果
+    """
+    candidates = model_router.rank(agent_factory.get_template(file_path).models)
+    model_router.count("routed_calls")
+    deadline = time.perf_counter() + timeout if timeout else None
+    last_error: Optional[BaseException] = None
+
+    position = 0
+    while position < len(candidates):
+        remaining = deadline - time.perf_counter() if deadline else None
+        if remaining is not None and remaining <= 0:
+            break
+        has_next = position + 1 < len(candidates)
+        # 还有后续候选时限制单次尝试的时间，给回退留出余量；最后一个候选使用剩余的全部时间
+        attempt_timeout = remaining
+        if has_next:
+            attempt_timeout = ROUTER_ATTEMPT_TIMEOUT if remaining is None else min(remaining, ROUTER_ATTEMPT_TIMEOUT)
+        model = candidates[position]
+        hedged = hedge and has_next
+        try:
+            if hedged:
+                return await _hedged_attempt(build_agent, model, candidates[position + 1], task, attempt_timeout,
+                                             priority)
+            return await _attempt(build_agent, model, task, attempt_timeout, priority)
+        except asyncio.TimeoutError as e:
+            warning(f"模型 {model['model_name']} 调用超时（{attempt_timeout:.0f}秒）")
+            last_error = e
+        except Exception as e:
+            warning(f"模型 {model['model_name']} 调用失败: {str(e)}")
+            last_error = e
+        # 对冲已经同时尝试了下一个候选
+        position += 2 if hedged else 1
+        if position < len(candidates):
+            model_router.count("fallbacks")
+            info(f"回退到模型 {candidates[position]['model_name']}")
+
+    if last_error is None:
+        raise asyncio.TimeoutError("模型调用超时")
+    raise last_error
@@ -0,0 +1,96 @@
+"""
+LLM请求合并模块
+相同的请求同时进行时只发起一次模型调用，所有等待方共享同一个结果
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from backend.utils.logger import debug
+
+
+class _InFlightCall:
+    """
+    正在进行的共享调用
+    """
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    按键合并同时进行的异步调用
+
+    第一个请求发起调用，调用结束前到达的相同请求直接等待该调用的结果；
+    单个等待方取消时不影响其他等待方，所有等待方都取消后才取消底层调用
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "cancelled_waiters": 0,
+            "cancelled_calls": 0,
+        }
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行或加入一次调用
+
+        Args:
+            key: 归一化后的请求键
+            func: 发起调用的协程函数，只有第一个请求会执行
+
+        Returns:
+            Tuple[Any, bool]: 调用结果，以及是否复用了其他请求发起的调用
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _InFlightCall(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task, key=key, call=call: self._forget(key, call))
+            self._stats["calls"] += 1
+        else:
+            self._stats["coalesced"] += 1
+            debug(f"合并进行中的LLM请求: {key[:16]}，当前等待数: {call.waiters + 1}")
+
+        call.waiters += 1
+        try:
+            # shield保证单个等待方被取消时不会取消共享的调用
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if not call.task.done():
+                self._stats["cancelled_waiters"] += 1
+                if call.waiters == 1:
+                    # 最后一个等待方也取消了，没有必要继续调用；立即移除，后续相同请求重新发起
+                    self._forget(key, call, consume=False)
+                    call.task.cancel()
+                    self._stats["cancelled_calls"] += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _InFlightCall, consume: bool = True):
+        """
+        调用结束后移除，并取走异常避免未获取异常的告警
+        """
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if consume and not call.task.cancelled():
+            call.task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取请求合并统计信息
+        """
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._calls)
+        return stats
+
+
+# 创建全局LLM请求合并实例
+llm_single_flight = SingleFlight()
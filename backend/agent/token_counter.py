@@ -0,0 +1,98 @@
+"""
+Token计数模块
+估算提示词的token数量，用于按token预算拆分和裁剪请求
+"""
+
+import os
+import re
+from typing import Optional
+
+import litellm
+from dotenv import load_dotenv
+
+from backend.utils.logger import debug
+
+load_dotenv()
+
+# 分词方式：local 使用本地估算，model 使用目标模型的分词器
+PROMPT_TOKENIZER = os.getenv('PROMPT_TOKENIZER', 'local').strip().lower()
+
+# 中日韩字符，大多数模型的分词器中约为一个token
+_CJK_PATTERN = re.compile(r'[　-〿぀-ヿ㐀-䶿一-鿿＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地估算文本的token数量
+
+    中日韩字符按每字一个token计算，其余字符按每4个字符一个token计算
+
+    Args:
+        text: 待估算的文本
+
+    Returns:
+        int: 估算的token数量
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """
+    统计文本的token数量
+
+    设置环境变量 PROMPT_TOKENIZER=model 时使用目标模型的分词器（通过litellm），
+    分词器不可用或未开启时使用本地估算
+
+    Args:
+        text: 待统计的文本
+        model_name: 目标模型名称
+
+    Returns:
+        int: token数量
+    """
+    if not text:
+        return 0
+    if PROMPT_TOKENIZER == 'model' and model_name:
+        try:
+            return litellm.token_counter(model=model_name, text=text)
+        except Exception as e:
+            debug(f"模型分词器不可用，使用本地估算: {str(e)}")
+    return estimate_tokens(text)
+
+
+def truncate_to_token_budget(text: str, token_budget: int, model_name: Optional[str] = None) -> str:
+    """
+    将文本截断到token预算以内，尽量在段落或句子边界处截断
+
+    Args:
+        text: 待截断的文本
+        token_budget: token预算
+        model_name: 目标模型名称
+
+    Returns:
+        str: 截断后的文本，发生截断时以省略号结尾
+    """
+    if count_tokens(text, model_name) <= token_budget:
+        return text
+    if token_budget <= 0:
+        return ''
+
+    # 二分查找预算内最长的前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle], model_name) < token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = text[:low]
+
+    # 回退到最近的段落或句子边界，回退距离不超过前缀的五分之一
+    boundary = max(prefix.rfind(mark) for mark in ('\n', '。', '！', '？', '!', '?', '.'))
+    if boundary >= len(prefix) * 4 // 5:
+        prefix = prefix[:boundary + 1]
+    return prefix.rstrip() + '……'
@@ -0,0 +1,268 @@
+"""
+工具调用结果解码模块
+从agent的会话记录或返回文本中提取工具调用参数，并解析为带类型的结果
+
+优先读取agent会话记录中已结构化的工具调用，无需再解析字符串；
+只有拿不到结构化结果时才解析返回文本，JSON解析失败时尝试修复常见的格式问题
+"""
+
+import ast
+import json
+import re
+from typing import Any, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+
+class ToolCallDecodeError(ValueError):
+    """
+    无法从agent结果中解析出工具调用参数
+    """
+
+
+class StyleAnalysisArguments(BaseModel):
+    """
+    analyze_style工具的参数
+    """
+    style_name: str
+    feature_desc: str
+    category: str
+
+
+class CopycatArguments(BaseModel):
+    """
+    copy_cat工具的参数
+    """
+    title: str
+    content: str
+    tags: str = ""
+
+
+ArgumentsModel = TypeVar("ArgumentsModel", bound=BaseModel)
+
+_CODE_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*|\s*```$')
+_TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+
+
+def _normalize_call(call: Any) -> Optional[Dict[str, Any]]:
+    """
+    将不同来源的工具调用统一为 {"name": ..., "arguments": ...}
+    """
+    if isinstance(call, BaseModel):
+        call = call.model_dump()
+    elif not isinstance(call, dict) and hasattr(call, 'function'):
+        # litellm / openai 的 ChatCompletionMessageToolCall 对象
+        function = call.function
+        return {"name": getattr(function, 'name', None), "arguments": getattr(function, 'arguments', None)}
+    if not isinstance(call, dict):
+        return None
+    function = call.get('function')
+    if isinstance(function, dict):
+        return {"name": function.get('name'), "arguments": function.get('arguments')}
+    if 'arguments' in call:
+        return {"name": call.get('name'), "arguments": call.get('arguments')}
+    return None
+
+
+def _calls_from_object(value: Any) -> List[Dict[str, Any]]:
+    """
+    从已结构化的对象中提取工具调用，支持工具调用列表、message对象和ModelResponse
+    """
+    if value is None or isinstance(value, str):
+        return []
+    choices = getattr(value, 'choices', None)
+    if choices:
+        value = choices[0].message
+    tool_calls = getattr(value, 'tool_calls', None)
+    if tool_calls is None and isinstance(value, dict):
+        tool_calls = value.get('tool_calls')
+    if tool_calls is not None:
+        value = tool_calls
+    if isinstance(value, (dict, BaseModel)) or hasattr(value, 'function'):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    calls = [_normalize_call(call) for call in value]
+    return [call for call in calls if call and call.get('arguments') is not None]
+
+
+def _calls_from_text(text: str) -> List[Dict[str, Any]]:
+    """
+    从agent返回的文本中提取工具调用
+
+    文本形如 "AgentName: [{'function': {...}}]"，先按JSON解析，
+    失败时再按Python字面量解析（swarms以repr格式输出）
+    """
+    start = min((index for index in (text.find('['), text.find('{')) if index >= 0), default=-1)
+    if start < 0:
+        return []
+    body = text[start:].strip()
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            calls = _calls_from_object(loader(body))
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+        if calls:
+            return calls
+    return []
+
+
+def _calls_from_agent(agent: Any) -> List[Dict[str, Any]]:
+    """
+    从agent的会话记录中读取最近一次的结构化工具调用
+    """
+    memory = getattr(agent, 'short_memory', None)
+    history = getattr(memory, 'conversation_history', None)
+    if not history:
+        return []
+    for message in reversed(history):
+        content = message.get('content') if isinstance(message, dict) else None
+        calls = _calls_from_object(content)
+        if calls:
+            return calls
+    return []
+
+
+def repair_json(text: str) -> Any:
+    """
+    修复并解析格式不规范的JSON
+
+    处理代码块包裹、首尾多余文本、尾随逗号、Python字面量以及被截断的字符串和括号
+
+    Args:
+        text: 待解析的文本
+
+    Returns:
+        Any: 解析结果
+
+    Raises:
+        ToolCallDecodeError: 修复后仍无法解析
+    """
+    candidate = _CODE_FENCE_PATTERN.sub('', text.strip())
+    start = candidate.find('{')
+    if start >= 0:
+        candidate = candidate[start:]
+    end = candidate.rfind('}')
+    try:
+        return json.loads(candidate[:end + 1] if end >= 0 else candidate)
+    except ValueError:
+        pass
+
+    # 补全被截断的字符串和括号
+    closers = []
+    in_string = False
+    escape = False
+    for char in candidate:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]' and closers:
+            closers.pop()
+    if in_string:
+        # 截断在转义符之后时去掉悬空的反斜杠
+        candidate = (candidate[:-1] if escape else candidate) + '"'
+    candidate = candidate.rstrip().rstrip(',') + ''.join(reversed(closers))
+    candidate = _TRAILING_COMMA_PATTERN.sub(r'\1', candidate)
+
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(candidate)
+    except (ValueError, SyntaxError):
+        pass
+    try:
+        python_style = re.sub(r'\btrue\b', 'True', re.sub(r'\bfalse\b', 'False', re.sub(r'\bnull\b', 'None', candidate)))
+        return ast.literal_eval(python_style)
+    except (ValueError, SyntaxError) as e:
+        raise ToolCallDecodeError(f"无法解析工具参数: {text[:200]}") from e
+
+
+def extract_tool_calls(result: Any, agent: Any = None) -> List[Dict[str, Any]]:
+    """
+    提取工具调用列表
+
+    Args:
+        result: agent.run的返回结果，可以是文本或结构化对象
+        agent: 产生结果的agent实例，提供时优先读取其会话记录
+
+    Returns:
+        List[Dict[str, Any]]: 工具调用列表，每项包含name和arguments
+    """
+    calls = _calls_from_agent(agent) if agent is not None else []
+    if not calls:
+        calls = _calls_from_object(result)
+    if not calls and isinstance(result, str):
+        calls = _calls_from_text(result)
+    return calls
+
+
+def decode_tool_arguments(result: Any, tool_name: Optional[str] = None, agent: Any = None) -> Dict[str, Any]:
+    """
+    解析工具调用参数
+
+    Args:
+        result: agent.run的返回结果
+        tool_name: 期望的工具名，为None时取第一个工具调用
+        agent: 产生结果的agent实例
+
+    Returns:
+        Dict[str, Any]: 工具参数
+
+    Raises:
+        ToolCallDecodeError: 结果中没有可用的工具调用
+    """
+    calls = extract_tool_calls(result, agent)
+    if tool_name is not None:
+        calls = [call for call in calls if call.get('name') in (tool_name, None)] or calls
+    if calls:
+        arguments = calls[0]['arguments']
+    elif isinstance(result, str) and '{' in result:
+        # 没有工具调用结构时，模型可能直接输出了参数JSON
+        arguments = result
+    else:
+        raise ToolCallDecodeError("agent结果中没有工具调用")
+
+    if isinstance(arguments, dict):
+        return arguments
+    if not isinstance(arguments, str):
+        raise ToolCallDecodeError(f"无法识别的工具参数类型: {type(arguments).__name__}")
+    try:
+        parsed = json.loads(arguments)
+    except ValueError:
+        parsed = repair_json(arguments)
+    if not isinstance(parsed, dict):
+        raise ToolCallDecodeError("工具参数不是JSON对象")
+    return parsed
+
+
+def decode_tool_call(result: Any, model: Type[ArgumentsModel], tool_name: Optional[str] = None, agent: Any = None) -> ArgumentsModel:
+    """
+    解析工具调用参数并校验为指定类型
+
+    Args:
+        result: agent.run的返回结果
+        model: 参数的Pydantic模型
+        tool_name: 期望的工具名
+        agent: 产生结果的agent实例
+
+    Returns:
+        ArgumentsModel: 校验后的参数
+
+    Raises:
+        ToolCallDecodeError: 无法解析或缺少必填字段
+    """
+    arguments = decode_tool_arguments(result, tool_name, agent)
+    try:
+        return model.model_validate(arguments)
+    except ValidationError as e:
+        raise ToolCallDecodeError(f"工具参数校验失败: {e.errors()}") from e
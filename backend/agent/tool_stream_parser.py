@@ -0,0 +1,184 @@
+"""
+工具调用参数增量解析模块
+在模型流式返回工具调用参数时，逐段解析JSON并产出顶层字符串字段的新增内容
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+_HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+
+class ToolArgumentStreamParser:
+    """
+    工具调用参数的增量JSON解析器
+
+    只关心顶层对象中的字符串字段，每次feed返回各字段新解析出的文本，
+    非字符串字段和嵌套结构会被跳过
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        """
+        初始化解析器
+
+        Args:
+            fields: 需要产出增量内容的字段名
+        """
+        self.fields = set(fields)
+        self.values: Dict[str, str] = {field: '' for field in self.fields}
+        self._state = 'start'
+        self._key = ''
+        self._current_field = None
+        self._escape = None
+        self._high_surrogate = None
+        self._skip_depth = 0
+        self._skip_in_string = False
+        self._skip_escape = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        输入一段参数文本
+
+        Args:
+            chunk: 新到达的参数片段
+
+        Returns:
+            List[Tuple[str, str]]: (字段名, 新增文本) 列表，同一字段的连续内容会合并
+        """
+        deltas: List[Tuple[str, str]] = []
+        for char in chunk:
+            text = self._consume(char)
+            if text and self._current_field in self.fields:
+                self.values[self._current_field] += text
+                if deltas and deltas[-1][0] == self._current_field:
+                    deltas[-1] = (self._current_field, deltas[-1][1] + text)
+                else:
+                    deltas.append((self._current_field, text))
+        return deltas
+
+    def _consume(self, char: str) -> str:
+        """
+        处理单个字符，返回当前字符串字段新增的文本
+        """
+        state = self._state
+        if state == 'start':
+            if char == '{':
+                self._state = 'seek_key'
+        elif state == 'seek_key':
+            if char == '"':
+                self._key = ''
+                self._state = 'in_key'
+            elif char == '}':
+                self._state = 'done'
+        elif state == 'in_key':
+            if self._escape is not None:
+                self._key += _ESCAPES.get(char, char)
+                self._escape = None
+            elif char == '\\':
+                self._escape = ''
+            elif char == '"':
+                self._state = 'after_key'
+            else:
+                self._key += char
+        elif state == 'after_key':
+            if char == ':':
+                self._state = 'seek_value'
+        elif state == 'seek_value':
+            if char == '"':
+                self._current_field = self._key
+                self._state = 'in_value'
+            elif not char.isspace():
+                self._current_field = None
+                self._skip_depth = 1 if char in '[{' else 0
+                self._skip_in_string = False
+                self._skip_escape = False
+                self._state = 'skip_value'
+        elif state == 'in_value':
+            return self._consume_string_char(char)
+        elif state == 'skip_value':
+            self._consume_skipped_char(char)
+        elif state == 'after_value':
+            if char == ',':
+                self._state = 'seek_key'
+            elif char == '}':
+                self._state = 'done'
+        return ''
+
+    def _consume_string_char(self, char: str) -> str:
+        """
+        处理字符串值中的字符，支持转义和\\u编码（含代理对）
+        """
+        if self._escape is not None:
+            if self._escape == '' and char != 'u':
+                self._escape = None
+                return _ESCAPES.get(char, char)
+            if char == 'u' and self._escape == '':
+                self._escape = 'u'
+                return ''
+            if char not in _HEX_DIGITS:
+                # 不合法的\u编码按原样输出，当前字符照常处理（可能是结束引号）
+                literal = '\\' + self._escape
+                self._escape = None
+                return literal + self._consume_string_char(char)
+            self._escape += char
+            if len(self._escape) < 5:
+                return ''
+            code_point = int(self._escape[1:], 16)
+            self._escape = None
+            if 0xD800 <= code_point <= 0xDBFF:
+                self._high_surrogate = code_point
+                return ''
+            if 0xDC00 <= code_point <= 0xDFFF and self._high_surrogate is not None:
+                code_point = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code_point - 0xDC00)
+                self._high_surrogate = None
+            return chr(code_point)
+        if char == '\\':
+            self._escape = ''
+            return ''
+        if char == '"':
+            self._state = 'after_value'
+            return ''
+        return char
+
+    def _consume_skipped_char(self, char: str):
+        """
+        跳过非字符串值（数字、布尔、数组、嵌套对象等）
+        """
+        if self._skip_in_string:
+            if self._skip_escape:
+                self._skip_escape = False
+            elif char == '\\':
+                self._skip_escape = True
+            elif char == '"':
+                self._skip_in_string = False
+            return
+        if char == '"':
+            self._skip_in_string = True
+        elif char in '[{':
+            self._skip_depth += 1
+        elif char in ']}':
+            if self._skip_depth == 0:
+                # 顶层对象结束
+                self._state = 'done'
+            else:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._state = 'after_value'
+        elif char == ',' and self._skip_depth == 0:
+            self._state = 'seek_key'
+
+    @property
+    def done(self) -> bool:
+        """
+        顶层对象是否已解析完毕
+        """
+        return self._state == 'done'
@@ -0,0 +1,130 @@
+"""
+候选文案打分模块
+在本地对多候选重写结果打分，从风格相似度、字数贴合度和标签格式三方面选出最佳候选
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from backend.agent.analyze_style import count_note_words
+from backend.utils.content_hash import normalize_note_text
+
+# 各项得分的权重
+SCORE_WEIGHTS = {
+    "style": 0.5,
+    "length": 0.3,
+    "tags": 0.2,
+}
+
+# 标签数量在此范围内时不扣分
+TAG_COUNT_RANGE = (3, 10)
+
+_TAG_PATTERN = re.compile(r'^#[^\s#]+$')
+_NUMBER_PATTERN = re.compile(r'\d+')
+
+
+def _bigrams(text: str) -> Counter:
+    """
+    统计归一化文本的字符二元组
+    """
+    normalized = normalize_note_text(text)
+    return Counter(normalized[i:i + 2] for i in range(len(normalized) - 1))
+
+
+def style_similarity(content: str, example_bigrams: Counter) -> float:
+    """
+    计算候选正文与风格示例的字符二元组余弦相似度
+
+    Args:
+        content: 候选正文
+        example_bigrams: 风格示例的字符二元组统计
+
+    Returns:
+        float: 0到1之间的相似度
+    """
+    content_bigrams = _bigrams(content)
+    if not content_bigrams or not example_bigrams:
+        return 0.0
+    dot = sum(count * example_bigrams.get(gram, 0) for gram, count in content_bigrams.items())
+    norm = math.sqrt(sum(v * v for v in content_bigrams.values())) * math.sqrt(sum(v * v for v in example_bigrams.values()))
+    return dot / norm if norm else 0.0
+
+
+def parse_word_count(word_count: Optional[str]) -> Optional[int]:
+    """
+    从字数要求中取出目标字数，如"300字左右"取300
+
+    Args:
+        word_count: 字数要求
+
+    Returns:
+        Optional[int]: 目标字数，无法识别时返回None
+    """
+    match = _NUMBER_PATTERN.search(str(word_count or ''))
+    return int(match.group()) if match and int(match.group()) > 0 else None
+
+
+def length_fit(content: str, target: Optional[int]) -> float:
+    """
+    计算候选正文字数与目标字数的贴合度
+
+    Args:
+        content: 候选正文
+        target: 目标字数，None表示不限制
+
+    Returns:
+        float: 0到1之间的贴合度
+    """
+    if not target:
+        return 1.0
+    return max(0.0, 1.0 - abs(count_note_words(content) - target) / target)
+
+
+def tag_format_score(tags: str) -> float:
+    """
+    检查标签是否为以#开头、空格分隔的格式，且数量适中
+
+    Args:
+        tags: 候选标签
+
+    Returns:
+        float: 0到1之间的得分
+    """
+    items = (tags or '').split()
+    if not items:
+        return 0.0
+    valid_ratio = sum(1 for item in items if _TAG_PATTERN.match(item)) / len(items)
+    low, high = TAG_COUNT_RANGE
+    count_factor = 1.0 if low <= len(items) <= high else 0.5
+    return valid_ratio * count_factor
+
+
+def score_variants(variants: List[Dict[str, Any]], example_content: str, word_count: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    为候选文案打分并按得分从高到低排序，得分最高的候选标记为selected
+
+    Args:
+        variants: 候选列表，每项包含index, title, content, tags
+        example_content: 风格示例正文
+        word_count: 字数要求
+
+    Returns:
+        List[Dict[str, Any]]: 增加了score、scores、selected字段的候选列表
+    """
+    example_bigrams = _bigrams(example_content or '')
+    target = parse_word_count(word_count)
+    scored = []
+    for variant in variants:
+        scores = {
+            "style": round(style_similarity(variant['content'], example_bigrams), 4),
+            "length": round(length_fit(variant['content'], target), 4),
+            "tags": round(tag_format_score(variant.get('tags', '')), 4),
+        }
+        score = round(sum(SCORE_WEIGHTS[name] * value for name, value in scores.items()), 4)
+        scored.append({**variant, "score": score, "scores": scores, "selected": False})
+    scored.sort(key=lambda variant: variant["score"], reverse=True)
+    if scored:
+        scored[0]["selected"] = True
+    return scored
@@ -0,0 +1,61 @@
+"""
+统计数据模型定义文件
+定义LLM调用记录与费用、延迟汇总相关的数据模型
+"""
+
+from pydantic import BaseModel
+from typing import Optional, List
+
+
+class LLMCallItem(BaseModel):
+    """单次LLM调用记录模型"""
+    id: int
+    agent_name: Optional[str] = None
+    model: str
+    provider: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latency_seconds: Optional[float] = None  # 服务商调用耗时
+    queue_seconds: Optional[float] = None  # 调度排队耗时
+    cost: float = 0.0  # 估算费用（美元）
+    success: bool = True
+    error: Optional[str] = None
+    record_type: Optional[str] = None  # style_analysis、style_analysis_batch或rewrite
+    record_id: Optional[int] = None
+    style_id: Optional[int] = None
+    share: float = 1.0  # 该记录分摊的比例，批量分析多篇笔记的调用按产出的风格数平均分摊
+    created_at: str
+
+
+class LLMCallListResponse(BaseModel):
+    """产出某条记录的调用列表响应模型"""
+    success: bool
+    data: List[LLMCallItem]
+    total_cost: float
+    total_tokens: int
+
+
+class LLMCallSummaryItem(BaseModel):
+    """按维度汇总的调用统计模型"""
+    key: str  # 风格ID、模型名称或日期
+    label: Optional[str] = None  # 风格名称、模型名称或日期
+    calls: int
+    failed_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    cost: float
+    latency_p50_seconds: Optional[float] = None
+    latency_p95_seconds: Optional[float] = None
+    latency_p99_seconds: Optional[float] = None
+    avg_queue_seconds: Optional[float] = None
+
+
+class LLMCallSummaryResponse(BaseModel):
+    """调用统计汇总响应模型"""
+    success: bool
+    group_by: str
+    data: List[LLMCallSummaryItem]
+    total_calls: int
+    total_cost: float
@@ -3,24 +3,38 @@
 定义了风格分析相关的数据模型
 """
 
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List
 
 
 class StyleAnalyzerRequest(BaseModel):
     """风格分析请求模型"""
+    title: str = ""  # 文案标题
     content: str
+    force_refresh: bool = False  # 为True时忽略已有分析结果，强制重新分析
     category: Optional[str] = None
     topic_level_1: Optional[str] = None
     topic_level_2: Optional[str] = None
     topic_level_3: Optional[str] = None
 
 
+class StyleAnalysisResult(BaseModel):
+    """风格分析结果模型"""
+    style_name: str
+    feature_desc: str
+    category: str
+    note_index: Optional[int] = None  # 对应笔记在notes中的序号
+    id: Optional[int] = None  # 保存到数据库后的风格ID
+    cached: bool = False  # 是否命中已有的分析结果
+
+
 class StyleAnalyzerResponse(BaseModel):
     """风格分析响应模型"""
     success: bool
-    result: Dict[str, Any]
+    analysis: StyleAnalysisResult
     execution_time: float
+    id: Optional[int] = None  # 保存到数据库后的风格ID
+    cached: bool = False  # 是否命中已有的分析结果
 
 
 class RewriteRequest(BaseModel):
@@ -28,15 +42,33 @@ class RewriteRequest(BaseModel):
     style_id: int  # 风格ID，用于从数据库查询风格信息
     user_task: str  # 用户需求
     word_count: Optional[str] = None  # 字数要求，可选
+    bypass_cache: bool = False  # 为True时不读也不写重写缓存
+    refresh_cache: bool = False  # 为True时忽略已有缓存，重新生成并更新缓存
+    variants: int = Field(1, ge=1, le=5, description="一次生成的候选文案数量，大于1时在本地打分选出最佳")
+    hedge: Optional[bool] = None  # 是否开启延迟对冲，None时使用ROUTER_HEDGE_REWRITES配置
+
+
+class RewriteVariant(BaseModel):
+    """候选文案模型"""
+    index: int  # 候选序号
+    title: str
+    content: str
+    tags: str
+    score: float  # 综合得分
+    scores: Dict[str, float]  # 各项得分：style、length、tags
+    selected: bool = False  # 是否为最佳候选
 
 
 class RewriteResponse(BaseModel):
     """内容重写响应模型"""
     success: bool
-    title: str  # 文案标题
+    title: str  # 文案标题，多候选时为得分最高的候选
     content: str  # 文案内容
     tags: str  # 文案标签
     execution_time: float
+    cached: bool = False  # 是否命中重写缓存
+    record_id: Optional[int] = None  # 执行记录ID
+    variants: Optional[List[RewriteVariant]] = None  # 全部候选，按得分从高到低排列
 
 
 class RewriteRecordItem(BaseModel):
@@ -49,9 +81,20 @@ class RewriteRecordItem(BaseModel):
     generated_content: str
     generated_tags: Optional[str]
     execution_time: Optional[str]
+    cache_hit: bool = False
+    prompt_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    variant_count: int = 1
     created_at: str
 
 
+class RewriteVariantListResponse(BaseModel):
+    """重写记录候选文案列表响应模型"""
+    success: bool
+    record_id: int
+    data: List[RewriteVariant]  # 按得分从高到低排列，单篇生成的记录为空列表
+
+
 class RewriteRecordListRequest(BaseModel):
     """重写记录列表请求模型"""
     page: int = 1  # 页码，默认为第1页
@@ -71,6 +114,7 @@ class RewriteRecordListResponse(BaseModel):
 class UrlAnalyzerRequest(BaseModel):
     """URL分析请求模型"""
     urls: str  # 小红书URL，多个URL用空格分隔
+    force_refresh: bool = False  # 为True时忽略已有分析结果，强制重新分析
 
 
 class NoteContent(BaseModel):
@@ -80,16 +124,48 @@ class NoteContent(BaseModel):
     content: str
 
 
-class StyleAnalysisResult(BaseModel):
-    """风格分析结果模型"""
-    style_name: str
-    feature_desc: str
-    category: str
-
-
 class UrlAnalyzerResponse(BaseModel):
     """URL分析响应模型"""
     success: bool
     notes: List[NoteContent]
     analyses: List[StyleAnalysisResult]
-    execution_time: float
\ No newline at end of file
+    execution_time: float
+
+class AnalysisJobSubmitResponse(BaseModel):
+    """URL分析后台任务提交响应模型"""
+    success: bool
+    job_id: int
+    status: str
+    total_notes: int
+
+
+class AnalysisJobStatusResponse(BaseModel):
+    """URL分析后台任务状态响应模型"""
+    success: bool
+    job_id: int
+    status: str  # pending、running、completed、failed
+    total_notes: int
+    progress: Dict[str, int]  # 各状态的笔记数：pending、extracted、completed、failed
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+
+class AnalysisJobNoteItem(BaseModel):
+    """后台任务中单篇笔记的状态模型"""
+    note_index: int  # 笔记URL在提交时的序号
+    url: str
+    status: str  # pending、extracted、completed、failed
+    title: Optional[str] = None
+    content: Optional[str] = None
+    error: Optional[str] = None
+
+
+class AnalysisJobResultResponse(BaseModel):
+    """URL分析后台任务结果响应模型，任务未结束时返回已完成的部分结果"""
+    success: bool
+    job_id: int
+    status: str
+    notes: List[AnalysisJobNoteItem]
+    analyses: List[StyleAnalysisResult]  # note_index对应notes中的笔记序号
\ No newline at end of file
@@ -57,8 +57,20 @@ class AssociateStyleRequest(BaseModel):
     """关联选题和风格请求模型"""
     topic_id: int
     style_id: int
+    canonical: bool = False  # 为True时关联该风格所属的规范风格（尚未聚类时关联自身，并在后台聚类）
 
 class AssociateStyleResponse(BaseModel):
     """关联选题和风格响应模型"""
     success: bool
     message: str
+
+class StyleDedupRequest(BaseModel):
+    """风格去重请求模型"""
+    rebuild: bool = False  # 为True时清空映射表后对全部风格重新聚类
+    threshold: Optional[float] = None  # 归入已有聚类的最低余弦相似度，默认使用STYLE_DEDUP_THRESHOLD
+
+class StyleDedupResponse(BaseModel):
+    """风格去重响应模型"""
+    success: bool
+    data: Optional[dict] = None
+    message: str
@@ -2,10 +2,15 @@
 API路由定义文件
 定义了风格分析相关的API路由
 """
-from typing import Optional
-
-from fastapi import APIRouter
-from .services.style_service import analyze_style, rewrite_content, analyze_url_styles, get_rewrite_records
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from .services.style_service import analyze_style, rewrite_content, rewrite_content_stream, analyze_url_styles, get_rewrite_records, get_rewrite_variants
+from .services.stats_service import get_llm_call_summary, get_llm_calls_by_record
+from .services.analysis_job_service import submit_analysis_job, get_analysis_job_status, get_analysis_job_results
 from .services.topic_service import (
     create_topic, 
     get_topic, 
@@ -15,7 +20,10 @@ from .services.topic_service import (
     get_topic_hierarchy,
     get_style_list,
     get_associated_styles,
-    associate_style
+    associate_style,
+    dedup_styles,
+    cluster_new_styles_in_background,
+    get_style_cluster_members
 )
 from .models.style_models import (
     StyleAnalyzerRequest, 
@@ -25,8 +33,13 @@ from .models.style_models import (
     UrlAnalyzerRequest,
     UrlAnalyzerResponse,
     RewriteRecordListRequest,
-    RewriteRecordListResponse
+    RewriteRecordListResponse,
+    RewriteVariantListResponse,
+    AnalysisJobSubmitResponse,
+    AnalysisJobStatusResponse,
+    AnalysisJobResultResponse
 )
+from .models.stats_models import LLMCallListResponse, LLMCallSummaryResponse
 from .models.topic_models import (
     TopicCreateRequest,
     TopicUpdateRequest,
@@ -36,7 +49,9 @@ from .models.topic_models import (
     StyleListResponse,
     AssociatedStyleResponse,
     AssociateStyleRequest,
-    AssociateStyleResponse
+    AssociateStyleResponse,
+    StyleDedupRequest,
+    StyleDedupResponse
 )
 
 style_router = APIRouter(prefix="/api/v1/style", tags=["风格分析"])
@@ -49,6 +64,27 @@ async def analyze_style_endpoint(request: StyleAnalyzerRequest):
 async def analyze_url_styles_endpoint(request: UrlAnalyzerRequest):
     return await analyze_url_styles(request)
 
+@style_router.post("/jobs/analyze-urls", response_model=AnalysisJobSubmitResponse)
+async def submit_analysis_job_endpoint(request: UrlAnalyzerRequest):
+    """
+    提交URL风格分析后台任务，立即返回任务ID
+    """
+    return submit_analysis_job(request)
+
+@style_router.get("/jobs/{job_id}", response_model=AnalysisJobStatusResponse)
+async def get_analysis_job_status_endpoint(job_id: int):
+    """
+    获取URL分析任务的状态与各状态笔记数
+    """
+    return get_analysis_job_status(job_id)
+
+@style_router.get("/jobs/{job_id}/results", response_model=AnalysisJobResultResponse)
+async def get_analysis_job_results_endpoint(job_id: int):
+    """
+    获取URL分析任务的笔记状态和已完成的分析结果，任务执行中返回部分结果
+    """
+    return get_analysis_job_results(job_id)
+
 
 rewrite_router = APIRouter(prefix="/api/v1/rewrite", tags=["内容仿写"])
 @rewrite_router.post("/style/rewrite", response_model=RewriteResponse)
@@ -59,6 +95,18 @@ async def rewrite_content_endpoint(request: RewriteRequest):
     """
     return await rewrite_content(request)
 
+@rewrite_router.post("/style/rewrite/stream")
+async def rewrite_content_stream_endpoint(request: RewriteRequest):
+    """
+    根据指定风格流式重写内容（SSE）
+    模型生成过程中依次推送title、content、tags的增量文本，结束后推送完整结果
+    """
+    return StreamingResponse(
+        rewrite_content_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @rewrite_router.post("/records", response_model=RewriteRecordListResponse)
 async def get_rewrite_records_endpoint(request: RewriteRecordListRequest):
     """
@@ -72,6 +120,13 @@ async def get_rewrite_records_endpoint(request: RewriteRecordListRequest):
     """
     return get_rewrite_records(page=request.page, page_size=request.page_size)
 
+@rewrite_router.get("/records/{record_id}/variants", response_model=RewriteVariantListResponse)
+async def get_rewrite_variants_endpoint(record_id: int):
+    """
+    获取多候选重写记录保存的全部候选文案，按得分从高到低排列
+    """
+    return get_rewrite_variants(record_id)
+
 
 # 添加选题管理路由
 topic_router = APIRouter(prefix="/api/v1/topic", tags=["风格选题管理"])
@@ -107,16 +162,49 @@ async def get_topic_hierarchy_endpoint(parent_id: Optional[int] = None):
     return  get_topic_hierarchy(parent_id=parent_id)
 
 @topic_router.get("/style/list", response_model=StyleListResponse)
-async def get_style_list_endpoint():
-    """获取所有风格列表"""
-    return  get_style_list()
+async def get_style_list_endpoint(background_tasks: BackgroundTasks, canonical: bool = False):
+    """获取所有风格列表，canonical为true时只返回去重后的规范风格，并在返回后于后台聚类新增风格"""
+    if canonical:
+        background_tasks.add_task(cluster_new_styles_in_background)
+    return  get_style_list(canonical=canonical)
 
 @topic_router.get("/style/associated/{topic_id}", response_model=AssociatedStyleResponse)
-async def get_associated_styles_endpoint(topic_id: int):
-    """获取某选题关联的风格列表"""
-    return  get_associated_styles(topic_id)
+async def get_associated_styles_endpoint(topic_id: int, canonical: bool = False):
+    """获取某选题关联的风格列表，canonical为true时按规范风格去重"""
+    return  get_associated_styles(topic_id, canonical=canonical)
+
+@topic_router.post("/style/dedup", response_model=StyleDedupResponse)
+async def dedup_styles_endpoint(request: StyleDedupRequest):
+    """对新增风格做增量去重聚类，rebuild为true时重建全部聚类，聚类在线程池中执行，不阻塞事件循环"""
+    return  await run_in_threadpool(dedup_styles, request)
+
+@topic_router.get("/style/cluster/{style_id}", response_model=StyleListResponse)
+async def get_style_cluster_members_endpoint(style_id: int):
+    """获取风格所在聚类的全部风格"""
+    return  get_style_cluster_members(style_id)
 
 @topic_router.post("/associate-style", response_model=AssociateStyleResponse)
-async def associate_style_endpoint(request: AssociateStyleRequest):
-    """关联选题和风格"""
+async def associate_style_endpoint(request: AssociateStyleRequest, background_tasks: BackgroundTasks):
+    """关联选题和风格，canonical为true时在返回后于后台聚类新增风格"""
+    if request.canonical:
+        background_tasks.add_task(cluster_new_styles_in_background)
     return  associate_style(request)
+
+
+# LLM调用费用与延迟统计路由
+stats_router = APIRouter(prefix="/api/v1/stats", tags=["调用统计"])
+
+@stats_router.get("/llm-calls/summary", response_model=LLMCallSummaryResponse)
+async def get_llm_call_summary_endpoint(group_by: Literal["style", "model", "day"] = "model",
+                                        start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    按风格、模型或日期汇总LLM调用的token用量、估算费用和延迟分位数
+    """
+    return get_llm_call_summary(group_by, start_date, end_date)
+
+@stats_router.get("/llm-calls/{record_type}/{record_id}", response_model=LLMCallListResponse)
+async def get_llm_calls_by_record_endpoint(record_type: Literal["style_analysis", "rewrite"], record_id: int):
+    """
+    获取产出某条风格分析或重写记录的全部LLM调用（含回退、对冲和失败的调用）
+    """
+    return get_llm_calls_by_record(record_type, record_id)
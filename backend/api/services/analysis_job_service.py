@@ -0,0 +1,317 @@
+"""
+URL风格分析后台任务服务
+提交任务后立即返回任务ID，由后台工作协程逐批提取笔记并分析风格，
+每篇笔记的进度写入数据库，服务重启后未结束的任务从已完成的进度继续执行
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from backend.db import analysis_job_service
+from backend.db.analysis_job_service import (
+    JOB_PENDING,
+    JOB_RUNNING,
+    JOB_COMPLETED,
+    JOB_FAILED,
+    NOTE_PENDING,
+    NOTE_EXTRACTED,
+    NOTE_COMPLETED,
+    NOTE_FAILED,
+)
+from backend.rpa import extract_note_content
+from backend.utils.logger import info, warning, error
+
+from .style_service import _analyze_notes, _find_cached_analysis, ANALYZE_CONCURRENCY, ANALYZE_NOTE_TIMEOUT
+from ..models.style_models import (
+    UrlAnalyzerRequest,
+    StyleAnalysisResult,
+    AnalysisJobSubmitResponse,
+    AnalysisJobStatusResponse,
+    AnalysisJobNoteItem,
+    AnalysisJobResultResponse,
+)
+
+load_dotenv()
+
+# 同时执行的任务数
+ANALYSIS_JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', '2'))
+# 每次浏览器提取的URL数，提取结果逐批保存
+ANALYSIS_JOB_EXTRACT_BATCH = int(os.getenv('ANALYSIS_JOB_EXTRACT_BATCH', '5'))
+
+
+class AnalysisJobQueue:
+    """
+    URL风格分析后台任务队列
+
+    任务ID放入内存队列，由固定数量的工作协程依次执行；任务和笔记状态保存在数据库中，
+    启动时重新排入未结束的任务。停止时正在执行的任务保持running状态，下次启动后继续
+    """
+
+    def __init__(self, workers: int = ANALYSIS_JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # 已排队或执行中的任务，避免同一任务重复排队
+        self._active: Set[int] = set()
+        self._stats = {"submitted": 0, "resumed": 0, "completed": 0, "failed": 0}
+
+    async def start(self):
+        """
+        启动工作协程并恢复未结束的任务
+        """
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        unfinished = analysis_job_service.get_unfinished_job_ids()
+        for job_id in unfinished:
+            self._enqueue(job_id)
+        self._stats["resumed"] += len(unfinished)
+        if unfinished:
+            info(f"恢复{len(unfinished)}个未完成的URL分析任务: {unfinished}")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        停止工作协程，执行中的任务在下次启动时继续
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._active.clear()
+
+    def submit(self, urls: List[str], force_refresh: bool = False) -> int:
+        """
+        创建任务并排队执行
+
+        Args:
+            urls: 笔记URL列表
+            force_refresh: 是否忽略已有分析结果
+
+        Returns:
+            int: 任务ID
+        """
+        if self._queue is None:
+            raise RuntimeError("URL分析任务队列未启动")
+        job = analysis_job_service.create_job(urls, force_refresh)
+        self._stats["submitted"] += 1
+        self._enqueue(job.id)
+        info(f"已提交URL分析任务{job.id}，共{len(urls)}个URL")
+        return job.id
+
+    def _enqueue(self, job_id: int):
+        if job_id not in self._active:
+            self._active.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error(f"URL分析任务{job_id}执行失败: {str(e)}")
+                self._stats["failed"] += 1
+                analysis_job_service.update_job(job_id, status=JOB_FAILED, error=str(e)[:1000],
+                                                finished_at=datetime.now())
+            finally:
+                self._active.discard(job_id)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: int):
+        """
+        执行任务：先逐批提取待提取的笔记，再分析已提取的笔记，已完成或失败的笔记不再处理
+        """
+        job = analysis_job_service.get_job(job_id)
+        if job is None or job.status not in (JOB_PENDING, JOB_RUNNING):
+            return
+        analysis_job_service.update_job(job_id, status=JOB_RUNNING, started_at=job.started_at or datetime.now())
+        info(f"开始执行URL分析任务{job_id}")
+
+        pending_notes = analysis_job_service.get_job_notes(job_id, [NOTE_PENDING])
+        for start in range(0, len(pending_notes), ANALYSIS_JOB_EXTRACT_BATCH):
+            await self._extract_notes(job_id, pending_notes[start:start + ANALYSIS_JOB_EXTRACT_BATCH])
+
+        indexed_notes = []
+        for note in analysis_job_service.get_job_notes(job_id, [NOTE_EXTRACTED]):
+            note_dict = {'url': note.url, 'title': note.title or '', 'content': note.content or ''}
+            existing = None if job.force_refresh else _find_cached_analysis(note.note_index, note_dict)
+            if existing:
+                analysis_job_service.update_notes(job_id, [note.note_index], status=NOTE_COMPLETED,
+                                                  style_id=existing.id, cached=True)
+            else:
+                indexed_notes.append((note.note_index, note_dict))
+
+        if indexed_notes:
+            await _analyze_notes(
+                indexed_notes, asyncio.Semaphore(ANALYZE_CONCURRENCY),
+                on_result=lambda index, result: self._save_note_result(job_id, index, result)
+            )
+
+        counts = analysis_job_service.get_note_counts(job_id)
+        if counts[NOTE_COMPLETED]:
+            analysis_job_service.update_job(job_id, status=JOB_COMPLETED, finished_at=datetime.now())
+            self._stats["completed"] += 1
+        else:
+            analysis_job_service.update_job(job_id, status=JOB_FAILED, error="没有笔记分析成功",
+                                            finished_at=datetime.now())
+            self._stats["failed"] += 1
+        info(f"URL分析任务{job_id}结束，成功{counts[NOTE_COMPLETED]}篇，失败{counts[NOTE_FAILED]}篇")
+
+    @staticmethod
+    async def _extract_notes(job_id: int, notes: List[Any]):
+        """
+        提取一批笔记的内容并保存，未能提取的笔记标记为失败
+        """
+        urls = [note.url for note in notes]
+        try:
+            extracted = await extract_note_content(' '.join(urls))
+        except Exception as e:
+            warning(f"任务{job_id}提取笔记失败: {str(e)}")
+            analysis_job_service.update_notes(job_id, [note.note_index for note in notes],
+                                              status=NOTE_FAILED, error=f"提取笔记失败: {str(e)}"[:1000])
+            return
+
+        by_url = {item['url']: item for item in extracted}
+        failed = []
+        for note in notes:
+            item = by_url.get(note.url)
+            if item is None:
+                failed.append(note.note_index)
+                continue
+            analysis_job_service.update_notes(job_id, [note.note_index], status=NOTE_EXTRACTED,
+                                              title=item['title'], content=item['content'])
+        analysis_job_service.update_notes(job_id, failed, status=NOTE_FAILED, error="无法提取笔记内容")
+
+    @staticmethod
+    def _save_note_result(job_id: int, index: int, result: Any):
+        if isinstance(result, StyleAnalysisResult) and result.id is not None:
+            analysis_job_service.update_notes(job_id, [index], status=NOTE_COMPLETED, style_id=result.id)
+            return
+        if isinstance(result, StyleAnalysisResult):
+            # 分析成功但结果未能写入数据库，没有可返回的风格记录
+            message = "分析结果保存失败"
+        elif isinstance(result, asyncio.TimeoutError):
+            message = f"分析超时（{ANALYZE_NOTE_TIMEOUT}秒）"
+        else:
+            message = f"分析失败: {str(result)}"
+        analysis_job_service.update_notes(job_id, [index], status=NOTE_FAILED, error=message[:1000])
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "active": len(self._active),
+            **self._stats,
+        }
+
+
+# 创建全局任务队列实例
+analysis_job_queue = AnalysisJobQueue()
+
+
+def submit_analysis_job(request: UrlAnalyzerRequest) -> AnalysisJobSubmitResponse:
+    """
+    提交URL风格分析后台任务
+
+    Args:
+        request (UrlAnalyzerRequest): URL风格分析请求
+
+    Returns:
+        AnalysisJobSubmitResponse: 包含任务ID的响应
+    """
+    try:
+        urls = request.urls.split()
+        if not urls:
+            raise Exception("未提供URL")
+        job_id = analysis_job_queue.submit(urls, request.force_refresh)
+        return AnalysisJobSubmitResponse(success=True, job_id=job_id, status=JOB_PENDING, total_notes=len(urls))
+    except Exception as e:
+        error(f"提交URL分析任务失败: {str(e)}")
+        raise Exception(f"提交URL分析任务失败: {str(e)}")
+
+
+def get_analysis_job_status(job_id: int) -> AnalysisJobStatusResponse:
+    """
+    获取URL分析任务的状态与进度
+
+    Args:
+        job_id (int): 任务ID
+
+    Returns:
+        AnalysisJobStatusResponse: 任务状态响应
+    """
+    try:
+        job = analysis_job_service.get_job(job_id)
+        if not job:
+            raise Exception(f"任务ID {job_id} 不存在")
+        job_dict = job.to_dict()
+        return AnalysisJobStatusResponse(
+            success=True,
+            job_id=job.id,
+            status=job.status,
+            total_notes=job_dict['total_notes'],
+            progress=analysis_job_service.get_note_counts(job_id),
+            error=job.error,
+            created_at=job_dict['created_at'],
+            started_at=job_dict['started_at'],
+            finished_at=job_dict['finished_at']
+        )
+    except Exception as e:
+        error(f"获取URL分析任务状态失败: {str(e)}")
+        raise Exception(f"获取URL分析任务状态失败: {str(e)}")
+
+
+def get_analysis_job_results(job_id: int) -> AnalysisJobResultResponse:
+    """
+    获取URL分析任务的笔记状态和已完成的分析结果，任务执行中也可以获取部分结果
+
+    Args:
+        job_id (int): 任务ID
+
+    Returns:
+        AnalysisJobResultResponse: 任务结果响应
+    """
+    try:
+        job = analysis_job_service.get_job(job_id)
+        if not job:
+            raise Exception(f"任务ID {job_id} 不存在")
+
+        notes: List[AnalysisJobNoteItem] = []
+        analyses: List[StyleAnalysisResult] = []
+        for note, style in analysis_job_service.get_job_results(job_id):
+            notes.append(AnalysisJobNoteItem(
+                note_index=note.note_index,
+                url=note.url,
+                status=note.status,
+                title=note.title,
+                content=note.content,
+                error=note.error
+            ))
+            if note.status == NOTE_COMPLETED and style is not None:
+                analyses.append(StyleAnalysisResult(
+                    style_name=style.style_name,
+                    feature_desc=style.feature_desc,
+                    category=style.category,
+                    note_index=note.note_index,
+                    id=style.id,
+                    cached=bool(note.cached)
+                ))
+
+        return AnalysisJobResultResponse(
+            success=True,
+            job_id=job.id,
+            status=job.status,
+            notes=notes,
+            analyses=analyses
+        )
+    except Exception as e:
+        error(f"获取URL分析任务结果失败: {str(e)}")
+        raise Exception(f"获取URL分析任务结果失败: {str(e)}")
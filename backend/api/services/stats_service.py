@@ -0,0 +1,77 @@
+"""
+统计服务模块
+提供LLM调用的费用、token用量和延迟分位数查询
+"""
+
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Optional
+
+from backend.db import llm_call_log_service
+from backend.utils.logger import error
+
+from ..models.stats_models import (
+    LLMCallItem,
+    LLMCallListResponse,
+    LLMCallSummaryItem,
+    LLMCallSummaryResponse,
+)
+
+
+def get_llm_call_summary(group_by: str, start_date: Optional[date] = None,
+                         end_date: Optional[date] = None) -> LLMCallSummaryResponse:
+    """
+    按风格、模型或日期汇总LLM调用的费用与延迟
+
+    Args:
+        group_by: 汇总维度，style、model或day
+        start_date: 起始日期（含）
+        end_date: 结束日期（含）
+
+    Returns:
+        LLMCallSummaryResponse: 汇总结果
+    """
+    try:
+        start = datetime.combine(start_date, dt_time.min) if start_date else None
+        end = datetime.combine(end_date + timedelta(days=1), dt_time.min) if end_date else None
+        items = [
+            LLMCallSummaryItem(**item)
+            for item in llm_call_log_service.aggregate_call_logs(group_by, start, end)
+        ]
+        return LLMCallSummaryResponse(
+            success=True,
+            group_by=group_by,
+            data=items,
+            total_calls=sum(item.calls for item in items),
+            total_cost=round(sum(item.cost for item in items), 6)
+        )
+    except Exception as e:
+        error(f"获取LLM调用统计失败: {str(e)}")
+        raise Exception(f"获取LLM调用统计失败: {str(e)}")
+
+
+def get_llm_calls_by_record(record_type: str, record_id: int) -> LLMCallListResponse:
+    """
+    获取产出某条风格分析或重写记录的全部LLM调用
+
+    Args:
+        record_type: 记录类型，style_analysis或rewrite
+        record_id: 记录ID
+
+    Returns:
+        LLMCallListResponse: 调用列表及合计费用
+    """
+    try:
+        calls = [
+            LLMCallItem(**call.to_dict(), share=share)
+            for call, share in llm_call_log_service.get_call_logs_by_record(record_type, record_id)
+        ]
+        # 批量调用只计入该记录分摊的部分
+        return LLMCallListResponse(
+            success=True,
+            data=calls,
+            total_cost=round(sum(call.cost * call.share for call in calls), 6),
+            total_tokens=round(sum((call.prompt_tokens + call.completion_tokens) * call.share for call in calls))
+        )
+    except Exception as e:
+        error(f"获取LLM调用记录失败: {str(e)}")
+        raise Exception(f"获取LLM调用记录失败: {str(e)}")
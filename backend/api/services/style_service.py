@@ -3,8 +3,9 @@
 提供风格分析和内容重写服务
 """
 
+import json
 import time
-from typing import List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 from sqlalchemy import func
 
 from backend.agent import get_copycat_agent
@@ -17,11 +18,13 @@ from ..models.style_models import (
     StyleAnalyzerResponse, 
     RewriteRequest,
     RewriteResponse,
+    RewriteVariant,
     UrlAnalyzerRequest,
     UrlAnalyzerResponse,
     NoteContent,
     StyleAnalysisResult,
-    RewriteRecordListResponse
+    RewriteRecordListResponse,
+    RewriteVariantListResponse
 )
 
 # 配置日志
@@ -32,16 +35,53 @@ from backend.rpa import extract_note_content
 
 # 导入分析代理
 from backend.agent import get_analyze_style_agent, save_analysis_result_async
+from backend.agent import (
+    get_batch_analyze_style_agent,
+    build_analysis_task,
+    build_batch_analysis_task,
+    split_notes_by_token_budget,
+    parse_batch_analysis_result,
+)
 
 # 导入copy_cat代理
 from backend.agent import get_copycat_agent
+from backend.agent import (
+    build_copycat_prompt,
+    extract_note_body,
+    count_note_words,
+    stream_copycat_arguments,
+    record_stream_ttft,
+    ToolArgumentStreamParser,
+)
+
+# 导入LLM异步执行器
+from backend.agent import get_agent_usage, llm_executor, llm_single_flight, run_routed_agent_async
+from backend.agent.analyze_style import agent_md as style_analyzer_md
+from backend.agent.copy_cat import agent_md as copycat_md
+from backend.agent.model_router import ROUTER_HEDGE_REWRITES
+from backend.agent.llm_scheduler import PRIORITY_INTERACTIVE, PRIORITY_BULK
+from backend.agent.llm_executor import LLM_CALL_TIMEOUT
+from backend.agent.call_log import LLMCallCollector
+from backend.agent.example_index import example_index, REWRITE_FEW_SHOT_ENABLED
+from backend.agent import parse_copycat_variants, score_variants
+from backend.agent import decode_tool_call, decode_tool_arguments, StyleAnalysisArguments, CopycatArguments
 
 # 导入数据库服务
-from backend.db import style_analysis_service, rewrite_record_service
+from backend.db import style_analysis_service, rewrite_record_service, rewrite_cache
+from backend.utils.content_hash import compute_content_hash
 import asyncio
+import os
 
+# 批量分析笔记时的最大并发数与单篇笔记超时时间（秒）
+ANALYZE_CONCURRENCY = int(os.getenv('ANALYZE_CONCURRENCY', '4'))
+ANALYZE_NOTE_TIMEOUT = float(os.getenv('ANALYZE_NOTE_TIMEOUT', '120'))
+# 单次LLM调用合并分析的最大笔记数、输入token预算与超时时间（秒），批量大小为1时不合并
+ANALYZE_BATCH_SIZE = int(os.getenv('ANALYZE_BATCH_SIZE', '8'))
+ANALYZE_BATCH_TOKEN_BUDGET = int(os.getenv('ANALYZE_BATCH_TOKEN_BUDGET', '6000'))
+ANALYZE_BATCH_TIMEOUT = float(os.getenv('ANALYZE_BATCH_TIMEOUT', '300'))
 
-def analyze_style(request: StyleAnalyzerRequest) -> StyleAnalyzerResponse:
+
+async def analyze_style(request: StyleAnalyzerRequest) -> StyleAnalyzerResponse:
     """
     分析小红书内容的写作风格
     
@@ -55,65 +95,200 @@ def analyze_style(request: StyleAnalyzerRequest) -> StyleAnalyzerResponse:
     logger_info("开始分析写作风格")
     
     try:
-        # 获取agent实例
-        agent = get_analyze_style_agent()
-        
-        task = f"""
-**文案标题**
-
-{request.title}
-
-**文案内容**
-
-{request.content}
-"""
+        # 相同内容已分析过时直接返回已有结果
+        content_hash = compute_content_hash(request.title, request.content)
+        if not request.force_refresh:
+            existing = style_analysis_service.get_style_analysis_by_content_hash(content_hash)
+            if existing:
+                execution_time = time.time() - start_time
+                info(f"命中风格分析缓存，ID: {existing.id}")
+                return StyleAnalyzerResponse(
+                    success=True,
+                    analysis=StyleAnalysisResult(
+                        style_name=existing.style_name,
+                        feature_desc=existing.feature_desc,
+                        category=existing.category,
+                        id=existing.id,
+                        cached=True
+                    ),
+                    execution_time=execution_time,
+                    id=existing.id,
+                    cached=True
+                )
         
-        # 调用分析代理
-        result = agent.run(task)
-        result = result.split("StyleAnalyzer: ")[1]
+        # 调用分析代理并保存到数据库，强制重新分析时更新已有记录
+        arguments_dict, style_id, shared = await _run_style_analysis(request.title, request.content, content_hash)
         
-        import ast
-        import json
+        execution_time = time.time() - start_time
+        info(f"风格分析完成，耗时: {execution_time:.2f}秒{'（复用进行中的相同请求）' if shared else ''}")
         
-        try:
-            # 解析结果
-            data = ast.literal_eval(result)
-            arguments_str = data[0]['function']['arguments']
-            arguments_dict = json.loads(arguments_str)
-            
-            # 保存到数据库
-            style_analysis = style_analysis_service.create_style_analysis(
+        return StyleAnalyzerResponse(
+            success=True,
+            analysis=StyleAnalysisResult(
                 style_name=arguments_dict['style_name'],
                 feature_desc=arguments_dict['feature_desc'],
                 category=arguments_dict['category'],
-                sample_title=request.title,
-                sample_content=task
-            )
-            
-            execution_time = time.time() - start_time
-            info(f"风格分析完成，耗时: {execution_time:.2f}秒")
-            
-            return StyleAnalyzerResponse(
-                success=True,
-                analysis=StyleAnalysisResult(
-                    style_name=arguments_dict['style_name'],
-                    feature_desc=arguments_dict['feature_desc'],
-                    category=arguments_dict['category']
-                ),
-                execution_time=execution_time,
-                id=style_analysis.id
-            )
-            
-        except Exception as e:
-            error(f"解析分析结果时出错: {str(e)}")
-            raise Exception(f"解析分析结果时出错: {str(e)}")
-            
+                id=style_id
+            ),
+            execution_time=execution_time,
+            id=style_id
+        )
+        
     except Exception as e:
         execution_time = time.time() - start_time
         error(f"风格分析失败: {str(e)}")
         raise Exception(f"风格分析失败: {str(e)}")
 
 
+async def _run_style_analysis(title: str, content: str, content_hash: str,
+                              timeout: float = LLM_CALL_TIMEOUT,
+                              priority: int = PRIORITY_INTERACTIVE) -> Tuple[dict, Optional[int], bool]:
+    """
+    调用StyleAnalyzer分析单篇笔记并保存结果
+    
+    相同内容的分析同时进行时只调用一次模型，所有请求共享同一个结果
+    
+    Args:
+        title: 文案标题
+        content: 文案内容
+        content_hash: 归一化内容的哈希
+        timeout: 模型调用超时时间（秒）
+        priority: 调度优先级，单篇分析为交互优先级，URL批量分析为批量优先级
+        
+    Returns:
+        Tuple[dict, Optional[int], bool]: 分析参数、风格ID，以及是否复用了进行中的相同请求
+    """
+    async def analyze():
+        task = build_analysis_task(title, content)
+        # 本次分析产生的全部模型调用（含回退）在结束时关联到保存的风格记录
+        calls = LLMCallCollector()
+        style_id = None
+        try:
+            # 每次调用使用独立的agent实例，避免并发时共享会话状态；
+            # 按模型路由选择候选模型，在专用线程池中运行，失败或超时时回退到下一个候选
+            with calls:
+                agent, result = await run_routed_agent_async(
+                    style_analyzer_md, get_analyze_style_agent, task, timeout=timeout, priority=priority
+                )
+            arguments_dict = decode_tool_call(result, StyleAnalysisArguments, 'analyze_style', agent=agent).model_dump()
+            style_analysis = await save_analysis_result_async(arguments_dict, title, task, content_hash)
+            example_index.add_style(style_analysis)
+            style_id = style_analysis.id if style_analysis else None
+            return arguments_dict, style_id
+        finally:
+            calls.save('style_analysis', style_id, style_id)
+    
+    (arguments_dict, style_id), shared = await llm_single_flight.do(f"analyze:{content_hash}", analyze)
+    return arguments_dict, style_id, shared
+
+
+def _build_style_info(request: RewriteRequest) -> dict:
+    """
+    从数据库读取风格分析结果并构造重写所需的风格信息
+    
+    Args:
+        request (RewriteRequest): 内容重写请求
+        
+    Returns:
+        dict: 风格信息
+    """
+    style_analysis = style_analysis_service.get_style_analysis_by_id(request.style_id)
+    if not style_analysis:
+        raise Exception(f"未找到ID为{request.style_id}的风格分析结果")
+        
+    # sample_content保存的是完整的分析任务描述，示例和字数都以其中的笔记正文为准
+    note_body = extract_note_body(style_analysis.sample_content)
+    return {
+        "style_id": style_analysis.id,
+        "style_name": style_analysis.style_name,
+        "feature_desc": style_analysis.feature_desc,
+        "category": style_analysis.category,
+        "word_count": request.word_count or str(count_note_words(note_body)),
+        "example_content": note_body,
+        # 风格分析被原地覆盖后版本变化，旧的重写缓存不再命中
+        "style_version": rewrite_cache.style_version(style_analysis)
+    }
+
+
+def _build_rewrite_prompt(style_info: dict, user_task: str, variants: int = 1) -> Tuple[str, str]:
+    """
+    在token预算内构造重写提示词并记录提示词token数
+    
+    从范文索引中检索与用户需求最相关的同风格或同分类范文作为few-shot示例，
+    所选风格自身的样本已在系统提示词中，检索时排除
+    
+    Args:
+        style_info (dict): 风格信息
+        user_task (str): 用户需求
+        variants (int): 候选数量
+        
+    Returns:
+        Tuple[str, str]: 带风格信息的系统提示词和任务描述
+    """
+    examples = []
+    if REWRITE_FEW_SHOT_ENABLED:
+        examples = example_index.search(
+            user_task, style_info.get('style_id'), style_info.get('category'),
+            exclude_keys=[f"style:{style_info.get('style_id')}"]
+        )
+    system_prompt, full_task, prompt_stats = build_copycat_prompt(style_info, user_task, variants=variants, examples=examples)
+    logger_info(
+        f"重写提示词token数: {prompt_stats['prompt_tokens']}，"
+        f"固定前缀token数: {prompt_stats['prefix_tokens']}，"
+        f"示例token数: {prompt_stats['example_tokens']}，"
+        f"示例已截断: {prompt_stats['example_truncated']}，"
+        f"参考范文: {prompt_stats['few_shot_count']}篇/{prompt_stats['few_shot_tokens']}token"
+    )
+    return system_prompt, full_task
+
+
+def _save_rewrite_variants(request: RewriteRequest, style_info: dict, arguments_dict: dict, usage: dict, start_time: float) -> RewriteResponse:
+    """
+    解析多候选结果，本地打分后保存为一条父记录及其候选
+    
+    Args:
+        request (RewriteRequest): 内容重写请求
+        style_info (dict): 风格信息
+        arguments_dict (dict): copy_cat_variants工具的参数
+        usage (dict): 本次调用的token用量
+        start_time (float): 请求开始时间
+        
+    Returns:
+        RewriteResponse: 得分最高的候选及全部候选
+    """
+    variants = parse_copycat_variants(arguments_dict, request.variants)
+    if not variants:
+        raise Exception("模型未返回可用的候选文案")
+    if len(variants) < request.variants:
+        logger_warning(f"请求{request.variants}篇候选，模型只返回了{len(variants)}篇有效候选")
+    
+    scored = score_variants(variants, style_info.get('example_content'), style_info.get('word_count'))
+    best = scored[0]
+    execution_time = time.time() - start_time
+    logger_info(f"多候选重写完成，{len(scored)}篇候选，最高得分: {best['score']}，耗时: {execution_time:.2f}秒")
+    
+    record = rewrite_record_service.create_rewrite_record_with_variants(
+        style_name=style_info.get('style_name'),
+        user_task=request.user_task,
+        word_count=style_info.get('word_count'),
+        variants=scored,
+        execution_time=str(execution_time),
+        prompt_tokens=usage['input_tokens'] or None,
+        cached_tokens=usage['cached_tokens'] if usage['input_tokens'] else None
+    )
+    example_index.add_rewrite(record.id, style_info, best['title'], best['content'])
+    
+    return RewriteResponse(
+        success=True,
+        title=best['title'],
+        content=best['content'],
+        tags=best['tags'],
+        execution_time=execution_time,
+        record_id=record.id,
+        variants=[RewriteVariant(**variant) for variant in scored]
+    )
+
+
 async def rewrite_content(request: RewriteRequest) -> RewriteResponse:
     """
     根据分析的风格重写内容
@@ -128,91 +303,437 @@ async def rewrite_content(request: RewriteRequest) -> RewriteResponse:
     info("开始重写内容")
     
     try:
-        # 获取数据库中的风格分析结果
-        style_analysis = style_analysis_service.get_style_analysis_by_id(request.style_id)
-        if not style_analysis:
-            raise Exception(f"未找到ID为{request.style_id}的风格分析结果")
-            
-        # 构造风格信息
-        style_info = {
-            "style_name": style_analysis.style_name,
-            "feature_desc": style_analysis.feature_desc,
-            "category": style_analysis.category,
-            "word_count": request.word_count or str(len(style_analysis.sample_content)),
-            "example_content": style_analysis.sample_content
-        }
+        # 获取数据库中的风格分析结果并构造风格信息
+        style_info = _build_style_info(request)
         
-        # 获取agent实例
-        agent = get_copycat_agent()
+        # 查询重写缓存，命中时仍记录执行记录以保证统计准确
+        cache_key = rewrite_cache.make_key(
+            request.style_id, request.user_task, style_info.get('word_count'), style_info.get('style_version')
+        )
+        # 多候选请求不经过重写缓存
+        if request.variants == 1 and (request.bypass_cache or request.refresh_cache):
+            rewrite_cache.record_bypass()
+        elif request.variants == 1:
+            cached = rewrite_cache.get(cache_key)
+            if cached:
+                execution_time = time.time() - start_time
+                logger_info(f"命中重写缓存，耗时: {execution_time:.2f}秒")
+                record = rewrite_record_service.create_rewrite_record(
+                    style_name=style_info.get('style_name'),
+                    user_task=request.user_task,
+                    word_count=style_info.get('word_count'),
+                    generated_title=cached['title'],
+                    generated_content=cached['content'],
+                    generated_tags=cached['tags'],
+                    execution_time=str(execution_time),
+                    cache_hit=True
+                )
+                return RewriteResponse(
+                    success=True,
+                    title=cached['title'],
+                    content=cached['content'],
+                    tags=cached['tags'],
+                    execution_time=execution_time,
+                    cached=True,
+                    record_id=record.id
+                )
         
-        # 构造任务描述
-        full_task = f"""
-参照这个文案书写风格，输出小红书爆款文案：
-# 风格信息
-
-风格名称：{style_info.get('style_name')}
-特征描述：{style_info.get('feature_desc')}
-字数：{style_info.get('word_count')}
+        # 在token预算内构造提示词，风格信息作为系统提示词的固定前缀
+        system_prompt, full_task = _build_rewrite_prompt(style_info, request.user_task, request.variants)
+        
+        # 本次请求实际发起的模型调用，保存执行记录后关联到该记录；复用他人结果时为空
+        calls = LLMCallCollector()
+        
+        async def generate():
+            # 按模型路由获取agent实例并运行，交互式重写可开启延迟对冲
+            hedge = ROUTER_HEDGE_REWRITES if request.hedge is None else request.hedge
+            with calls:
+                agent, result = await run_routed_agent_async(
+                    copycat_md,
+                    lambda model: get_copycat_agent(system_prompt, request.variants, model),
+                    full_task,
+                    hedge=hedge
+                )
+            # 解析结果
+            if request.variants > 1:
+                arguments = decode_tool_arguments(result, 'copy_cat_variants', agent=agent)
+            else:
+                arguments = decode_tool_call(result, CopycatArguments, 'copy_cat', agent=agent).model_dump()
+            return arguments, get_agent_usage(agent)
+        
+        # 相同的重写请求同时进行时只调用一次模型
+        flight_key = f"rewrite:{cache_key}:{request.variants}"
+        try:
+            (arguments_dict, usage), shared = await llm_single_flight.do(flight_key, generate)
+        except Exception:
+            calls.save('rewrite', None, request.style_id)
+            raise
+        if shared:
+            # 复用其他请求的调用结果，本次请求没有产生token消耗
+            usage = {'input_tokens': 0, 'cached_tokens': 0}
+            logger_info("复用进行中的相同重写请求")
+        else:
+            logger_info(f"重写输入token: {usage['input_tokens']}，缓存命中token: {usage['cached_tokens']}")
+        
+        if request.variants > 1:
+            response = _save_rewrite_variants(request, style_info, arguments_dict, usage, start_time)
+            calls.save('rewrite', response.record_id, request.style_id)
+            return response
+        
+        execution_time = time.time() - start_time
+        logger_info(f"内容重写完成，耗时: {execution_time:.2f}秒")
+        
+        # 保存执行记录到数据库
+        record = rewrite_record_service.create_rewrite_record(
+            style_name=style_info.get('style_name'),
+            user_task=request.user_task,
+            word_count=style_info.get('word_count'),
+            generated_title=arguments_dict['title'],
+            generated_content=arguments_dict['content'],
+            generated_tags=arguments_dict['tags'],
+            execution_time=str(execution_time),
+            prompt_tokens=usage['input_tokens'] or None,
+            cached_tokens=usage['cached_tokens'] if usage['input_tokens'] else None
+        )
+        calls.save('rewrite', record.id, request.style_id)
+        example_index.add_rewrite(record.id, style_info, arguments_dict['title'], arguments_dict['content'])
+        
+        # 写入重写缓存，bypass_cache时不写入
+        if not request.bypass_cache:
+            try:
+                rewrite_cache.set(cache_key, {
+                    'title': arguments_dict['title'],
+                    'content': arguments_dict['content'],
+                    'tags': arguments_dict['tags'],
+                })
+            except Exception as e:
+                logger_warning(f"写入重写缓存失败: {str(e)}")
+        
+        return RewriteResponse(
+            success=True,
+            title=arguments_dict['title'],
+            content=arguments_dict['content'],
+            tags=arguments_dict['tags'],
+            execution_time=execution_time,
+            record_id=record.id
+        )
+            
+    except Exception as e:
+        execution_time = time.time() - start_time
+        error(f"内容重写失败: {str(e)}")
+        raise Exception(f"内容重写失败: {str(e)}")
 
-## 风格示例文稿
 
-{style_info.get('example_content')}
+def _sse_event(event: str, data: dict) -> str:
+    """
+    构造一条SSE消息
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-# 其余要求：
 
-{request.user_task}
+async def rewrite_content_stream(request: RewriteRequest) -> AsyncIterator[str]:
+    """
+    以SSE流式返回重写内容
     
-请根据以上风格信息和用户其余需求，生成符合该风格的全新原创小红书种草文案。
-"""
+    模型生成工具调用参数的同时增量解析，依次推送title、content、tags的新增文本；
+    生成结束后保存执行记录并推送完整结果
+    
+    Args:
+        request (RewriteRequest): 内容重写请求
         
-        # 运行Agent
-        result = agent.run(full_task)
-        # 检查结果是否包含CopycatAgent标识
-        if "CopycatAgent: " in result:
-            result = result.split("CopycatAgent: ")[1]
+    Yields:
+        str: SSE消息，事件类型为delta、done或error
+    """
+    start_time = time.time()
+    info("开始流式重写内容")
+    ttft = None
+    calls = None
+    
+    try:
+        if request.variants > 1:
+            raise Exception("流式接口只支持单篇生成，多候选请使用 /style/rewrite")
+        style_info = _build_style_info(request)
+        
+        # 命中重写缓存时一次性推送完整内容
+        cache_key = rewrite_cache.make_key(
+            request.style_id, request.user_task, style_info.get('word_count'), style_info.get('style_version')
+        )
+        if request.bypass_cache or request.refresh_cache:
+            rewrite_cache.record_bypass()
         else:
-            # 如果没有找到标识，使用完整结果
-            result = result.strip()
+            cached = rewrite_cache.get(cache_key)
+            if cached:
+                execution_time = time.time() - start_time
+                for field in ('title', 'content', 'tags'):
+                    yield _sse_event('delta', {'field': field, 'text': cached[field]})
+                record = rewrite_record_service.create_rewrite_record(
+                    style_name=style_info.get('style_name'),
+                    user_task=request.user_task,
+                    word_count=style_info.get('word_count'),
+                    generated_title=cached['title'],
+                    generated_content=cached['content'],
+                    generated_tags=cached['tags'],
+                    execution_time=str(execution_time),
+                    cache_hit=True
+                )
+                yield _sse_event('done', {
+                    'title': cached['title'],
+                    'content': cached['content'],
+                    'tags': cached['tags'],
+                    'execution_time': execution_time,
+                    'record_id': record.id,
+                    'cached': True
+                })
+                return
         
-        import ast
-        import json
+        system_prompt, full_task = _build_rewrite_prompt(style_info, request.user_task)
+        parser = ToolArgumentStreamParser(['title', 'content', 'tags'])
+        arguments_str = ''
+        usage = {'input_tokens': 0, 'cached_tokens': 0}
+        calls = LLMCallCollector()
         
-        try:
+        async for fragment in stream_copycat_arguments(full_task, system_prompt, usage, calls):
+            if ttft is None:
+                ttft = time.time() - start_time
+                logger_info(f"流式重写首token耗时: {ttft:.2f}秒")
+            arguments_str += fragment
+            for field, text in parser.feed(fragment):
+                yield _sse_event('delta', {'field': field, 'text': text})
+        
+        llm_executor.record_usage('CopycatAgent', usage)
+        # 与非流式接口一样解析并校验完整参数，缺少字段或没有参数（如模型直接回复文本）时推送error，不保存结果
+        arguments_dict = decode_tool_call(arguments_str, CopycatArguments, 'copy_cat').model_dump()
+        if not (arguments_dict['title'].strip() or arguments_dict['content'].strip()):
+            raise Exception("模型未返回重写内容")
+        
+        execution_time = time.time() - start_time
+        logger_info(f"流式重写完成，耗时: {execution_time:.2f}秒")
+        record_stream_ttft(ttft)
+        
+        record = rewrite_record_service.create_rewrite_record(
+            style_name=style_info.get('style_name'),
+            user_task=request.user_task,
+            word_count=style_info.get('word_count'),
+            generated_title=arguments_dict['title'],
+            generated_content=arguments_dict['content'],
+            generated_tags=arguments_dict['tags'],
+            execution_time=str(execution_time),
+            prompt_tokens=usage['input_tokens'] or None,
+            cached_tokens=usage['cached_tokens'] if usage['input_tokens'] else None
+        )
+        calls.save('rewrite', record.id, request.style_id)
+        example_index.add_rewrite(record.id, style_info, arguments_dict['title'], arguments_dict['content'])
+        
+        if not request.bypass_cache:
+            try:
+                rewrite_cache.set(cache_key, {
+                    'title': arguments_dict['title'],
+                    'content': arguments_dict['content'],
+                    'tags': arguments_dict['tags'],
+                })
+            except Exception as e:
+                logger_warning(f"写入重写缓存失败: {str(e)}")
+        
+        yield _sse_event('done', {
+            'title': arguments_dict['title'],
+            'content': arguments_dict['content'],
+            'tags': arguments_dict['tags'],
+            'execution_time': execution_time,
+            'ttft': ttft,
+            'record_id': record.id,
+            'cached': False
+        })
+        
+    except Exception as e:
+        record_stream_ttft(None)
+        if calls is not None:
+            calls.save('rewrite', None, request.style_id)
+        error(f"流式重写失败: {str(e)}")
+        yield _sse_event('error', {'message': f"内容重写失败: {str(e)}"})
+
+
+async def _analyze_note(index: int, note: dict, semaphore: asyncio.Semaphore, timeout: float) -> StyleAnalysisResult:
+    """
+    在并发限制下分析单篇笔记的风格并保存结果
+
+    Args:
+        index: 笔记在输入中的序号
+        note: 笔记内容字典
+        semaphore: 控制并发数的信号量
+        timeout: 单篇笔记的超时时间（秒）
+
+    Returns:
+        StyleAnalysisResult: 带笔记序号的分析结果
+    """
+    async with semaphore:
+        info(f"开始分析第{index + 1}篇笔记: {note['title']}")
+
+        arguments_dict, style_id, _ = await _run_style_analysis(
+            note['title'], note['content'], compute_content_hash(note['title'], note['content']), timeout, PRIORITY_BULK
+        )
+
+        info(f"第{index + 1}篇笔记分析完成: {arguments_dict['style_name']}")
+        return StyleAnalysisResult(
+            style_name=arguments_dict['style_name'],
+            feature_desc=arguments_dict['feature_desc'],
+            category=arguments_dict['category'],
+            note_index=index,
+            id=style_id
+        )
+
+
+async def _analyze_batch(batch: List[Tuple[int, dict]], semaphore: asyncio.Semaphore, timeout: float) -> Dict[int, StyleAnalysisResult]:
+    """
+    在一次LLM调用中分析一批笔记的风格并保存结果
+
+    Args:
+        batch: (笔记编号, 笔记内容字典) 列表
+        semaphore: 控制并发数的信号量
+        timeout: 本批调用的超时时间（秒）
+
+    Returns:
+        Dict[int, StyleAnalysisResult]: 成功映射回笔记编号的分析结果，缺失的笔记不在其中
+    """
+    indices = [index for index, _ in batch]
+    # 一次调用产出多条风格记录，调用记录在保存结果后分摊到其中的每个风格
+    calls = LLMCallCollector()
+    analyses = {}
+    try:
+        async with semaphore:
+            info(f"开始批量分析笔记: {[index + 1 for index in indices]}")
+            task = build_batch_analysis_task(batch)
+            with calls:
+                agent, result = await run_routed_agent_async(
+                    style_analyzer_md, get_batch_analyze_style_agent, task, timeout=timeout, priority=PRIORITY_BULK
+                )
+
             # 解析结果
-            data = ast.literal_eval(result)
-            arguments_str = data[0]['function']['arguments']
-            arguments_dict = json.loads(arguments_str)
-            
-            execution_time = time.time() - start_time
-            logger_info(f"内容重写完成，耗时: {execution_time:.2f}秒")
-            
-            # 保存执行记录到数据库
-            rewrite_record_service.create_rewrite_record(
-                style_name=style_info.get('style_name'),
-                user_task=request.user_task,
-                word_count=style_info.get('word_count'),
-                generated_title=arguments_dict['title'],
-                generated_content=arguments_dict['content'],
-                generated_tags=arguments_dict['tags'],
-                execution_time=str(execution_time)
+            arguments_dict = decode_tool_arguments(result, 'analyze_styles', agent=agent)
+            parsed = parse_batch_analysis_result(arguments_dict, indices)
+
+        notes_by_index = dict(batch)
+        for index, arguments in parsed.items():
+            note = notes_by_index[index]
+            style_analysis = await save_analysis_result_async(
+                arguments, note['title'], build_analysis_task(note['title'], note['content']),
+                compute_content_hash(note['title'], note['content'])
             )
-            
-            return RewriteResponse(
-                success=True,
-                title=arguments_dict['title'],
-                content=arguments_dict['content'],
-                tags=arguments_dict['tags'],
-                execution_time=execution_time
+            example_index.add_style(style_analysis)
+            analyses[index] = StyleAnalysisResult(
+                style_name=arguments['style_name'],
+                feature_desc=arguments['feature_desc'],
+                category=arguments['category'],
+                note_index=index,
+                id=style_analysis.id if style_analysis else None
             )
-            
+    finally:
+        calls.save('style_analysis_batch',
+                   style_ids=[analysis.id for analysis in analyses.values() if analysis.id is not None])
+    info(f"批量分析完成 {len(analyses)}/{len(batch)} 篇笔记")
+    return analyses
+
+
+async def _analyze_notes(indexed_notes: List[Tuple[int, dict]], semaphore: asyncio.Semaphore,
+                         on_result: Optional[Callable[[int, Any], None]] = None) -> Dict[int, Any]:
+    """
+    按token预算分批分析笔记，批量结果中缺失的笔记回退为单篇分析；
+    内容哈希相同的笔记只分析第一篇，结果复制给其余重复笔记
+
+    Args:
+        indexed_notes: (笔记编号, 笔记内容字典) 列表
+        semaphore: 控制并发数的信号量
+        on_result: 每批分析结束后对其中每篇笔记调用的回调，参数为笔记编号和分析结果（或异常对象），
+            用于后台任务逐批保存进度
+
+    Returns:
+        Dict[int, Any]: 笔记编号到分析结果的映射，失败的笔记对应异常对象
+    """
+    unique_notes: List[Tuple[int, dict]] = []
+    first_index_by_hash: Dict[str, int] = {}
+    duplicates: Dict[int, List[int]] = {}
+    for index, note in indexed_notes:
+        content_hash = compute_content_hash(note['title'], note['content'])
+        if content_hash in first_index_by_hash:
+            duplicates.setdefault(first_index_by_hash[content_hash], []).append(index)
+        else:
+            first_index_by_hash[content_hash] = index
+            unique_notes.append((index, note))
+    if duplicates:
+        info(f"{len(indexed_notes) - len(unique_notes)}篇笔记与其他笔记内容重复，复用其分析结果")
+
+    batches = split_notes_by_token_budget(unique_notes, ANALYZE_BATCH_TOKEN_BUDGET, ANALYZE_BATCH_SIZE)
+
+    async def run_batch(batch: List[Tuple[int, dict]]) -> List[Tuple[int, Any]]:
+        results = await analyze_batch(batch)
+        for index, result in list(results):
+            for duplicate_index in duplicates.get(index, []):
+                if isinstance(result, StyleAnalysisResult):
+                    results.append((duplicate_index, result.model_copy(update={'note_index': duplicate_index})))
+                else:
+                    results.append((duplicate_index, result))
+        if on_result is not None:
+            for index, result in results:
+                on_result(index, result)
+        return results
+
+    async def analyze_batch(batch: List[Tuple[int, dict]]) -> List[Tuple[int, Any]]:
+        if len(batch) == 1:
+            index, note = batch[0]
+            try:
+                return [(index, await _analyze_note(index, note, semaphore, ANALYZE_NOTE_TIMEOUT))]
+            except Exception as e:
+                return [(index, e)]
+
+        try:
+            analyses = await _analyze_batch(batch, semaphore, ANALYZE_BATCH_TIMEOUT)
         except Exception as e:
-            error(f"解析重写结果时出错: {str(e)}")
-            raise Exception(f"解析重写结果时出错: {str(e)}")
-            
-    except Exception as e:
-        execution_time = time.time() - start_time
-        error(f"内容重写失败: {str(e)}")
-        raise Exception(f"内容重写失败: {str(e)}")
+            logger_warning(f"批量分析失败，全部回退为单篇分析: {str(e)}")
+            analyses = {}
+
+        # 仅对模型遗漏或合并的笔记单独重新分析
+        missing = [(index, note) for index, note in batch if index not in analyses]
+        if missing:
+            logger_warning(f"批量结果缺少笔记 {[index + 1 for index, _ in missing]}，回退为单篇分析")
+        fallback = await asyncio.gather(
+            *(_analyze_note(index, note, semaphore, ANALYZE_NOTE_TIMEOUT) for index, note in missing),
+            return_exceptions=True
+        )
+        results = list(analyses.items())
+        results.extend((index, result) for (index, _), result in zip(missing, fallback))
+        return results
+
+    batch_results = await asyncio.gather(*(run_batch(batch) for batch in batches))
+    results: Dict[int, Any] = {}
+    for batch_result in batch_results:
+        for index, result in batch_result:
+            results[index] = result
+    return results
+
+
+def _find_cached_analysis(index: int, note: dict) -> Optional[StyleAnalysisResult]:
+    """
+    查找笔记已有的风格分析结果
+
+    Args:
+        index: 笔记编号
+        note: 笔记内容字典
+
+    Returns:
+        Optional[StyleAnalysisResult]: 已有的分析结果，未分析过时返回None
+    """
+    existing = style_analysis_service.get_style_analysis_by_content_hash(
+        compute_content_hash(note['title'], note['content'])
+    )
+    if not existing:
+        return None
+    return StyleAnalysisResult(
+        style_name=existing.style_name,
+        feature_desc=existing.feature_desc,
+        category=existing.category,
+        note_index=index,
+        id=existing.id,
+        cached=True
+    )
 
 
 async def analyze_url_styles(request: UrlAnalyzerRequest) -> UrlAnalyzerResponse:
@@ -236,60 +757,32 @@ async def analyze_url_styles(request: UrlAnalyzerRequest) -> UrlAnalyzerResponse
             
         info(f"成功提取{len(notes)}篇笔记内容")
         
-        analyses: List[StyleAnalysisResult] = []
-        tasks = []
-        
-        # 获取agent实例
-        agent = get_analyze_style_agent()
-        
-        # 分析每篇笔记的风格
+        # 已分析过的笔记直接使用已有结果
+        results: Dict[int, Any] = {}
+        pending: List[Tuple[int, dict]] = []
         for i, note in enumerate(notes):
-            info(f"开始分析第{i+1}篇笔记: {note['title']}")
-            
-            task = f"""
-**文案标题**
-
-{note['title']}
-
-**文案内容**
-
-{note['content']}
-"""
-            
-            # 调用分析代理
-            result = agent.run(task)
-            result = result.split("StyleAnalyzer: ")[1]
-            
-            import ast
-            import json
-            
-            try:
-                # 解析结果
-                data = ast.literal_eval(result)
-                arguments_str = data[0]['function']['arguments']
-                arguments_dict = json.loads(arguments_str)
-                
-                # 创建分析结果对象
-                analysis_result = StyleAnalysisResult(
-                    style_name=arguments_dict['style_name'],
-                    feature_desc=arguments_dict['feature_desc'],
-                    category=arguments_dict['category']
-                )
-                
-                analyses.append(analysis_result)
-                info(f"第{i+1}篇笔记分析完成: {arguments_dict['style_name']}")
-                
-                # 异步保存到数据库
-                # 修复'dict' object has no attribute 'title'错误
-                tasks.append(save_analysis_result_async(arguments_dict, note['title'], task))
-                
-            except Exception as e:
-                logger_error(f"解析第{i+1}篇笔记分析结果时出错: {str(e)}")
-                continue
+            existing = None if request.force_refresh else _find_cached_analysis(i, note)
+            if existing:
+                results[i] = existing
+            else:
+                pending.append((i, note))
+        if results:
+            info(f"{len(results)}篇笔记命中风格分析缓存")
         
-        # 并发执行所有数据库保存操作
-        if tasks:
-            await asyncio.gather(*tasks)
+        # 分批并发分析其余笔记的风格，单篇失败或超时不影响其余笔记
+        if pending:
+            semaphore = asyncio.Semaphore(ANALYZE_CONCURRENCY)
+            results.update(await _analyze_notes(pending, semaphore))
+        
+        analyses: List[StyleAnalysisResult] = []
+        for i in range(len(notes)):
+            result = results[i]
+            if isinstance(result, asyncio.TimeoutError):
+                logger_error(f"第{i+1}篇笔记分析超时（{ANALYZE_NOTE_TIMEOUT}秒）")
+            elif isinstance(result, Exception):
+                logger_error(f"分析第{i+1}篇笔记时出错: {str(result)}")
+            else:
+                analyses.append(result)
         
         execution_time = time.time() - start_time
         info(f"URL分析完成，共分析{len(analyses)}篇笔记，耗时: {execution_time:.2f}秒")
@@ -307,6 +800,37 @@ async def analyze_url_styles(request: UrlAnalyzerRequest) -> UrlAnalyzerResponse
         raise Exception(f"URL分析失败: {str(e)}")
 
 
+def get_rewrite_variants(record_id: int) -> RewriteVariantListResponse:
+    """
+    获取多候选重写记录保存的全部候选文案
+    
+    Args:
+        record_id: 重写记录ID
+        
+    Returns:
+        RewriteVariantListResponse: 候选列表响应，按得分从高到低排列
+    """
+    try:
+        if not rewrite_record_service.get_rewrite_record_by_id(record_id):
+            raise Exception(f"未找到ID为{record_id}的重写记录")
+        variants = [
+            RewriteVariant(
+                index=variant.variant_index,
+                title=variant.generated_title,
+                content=variant.generated_content,
+                tags=variant.generated_tags or '',
+                score=variant.score or 0.0,
+                scores=json.loads(variant.score_detail) if variant.score_detail else {},
+                selected=bool(variant.selected)
+            )
+            for variant in rewrite_record_service.get_rewrite_variants(record_id)
+        ]
+        return RewriteVariantListResponse(success=True, record_id=record_id, data=variants)
+    except Exception as e:
+        error(f"获取候选文案失败: {str(e)}")
+        raise Exception(f"获取候选文案失败: {str(e)}")
+
+
 def get_rewrite_records(page: int = 1, page_size: int = 10) -> RewriteRecordListResponse:
     """
     获取重写记录列表（支持分页）
@@ -9,6 +9,7 @@ from datetime import datetime
 # 导入数据库服务
 from backend.db.style_service import style_analysis_service
 from backend.db.topic_service import topic_service
+from backend.db.style_cluster_service import style_cluster_service, STYLE_DEDUP_THRESHOLD
 
 # 导入数据模型
 from ..models.topic_models import (
@@ -20,7 +21,9 @@ from ..models.topic_models import (
     StyleListResponse,
     AssociatedStyleResponse,
     AssociateStyleRequest,
-    AssociateStyleResponse
+    AssociateStyleResponse,
+    StyleDedupRequest,
+    StyleDedupResponse
 )
 
 # 配置日志
@@ -247,18 +250,24 @@ def get_topic_hierarchy(parent_id: Optional[int] = None) -> TopicHierarchyRespon
         logger_error(f"获取选题层级结构时出错: {str(e)}")
         raise Exception(f"获取选题层级结构失败: {str(e)}")
 
-def get_style_list() -> StyleListResponse:
+def get_style_list(canonical: bool = False) -> StyleListResponse:
     """
     获取所有风格列表
     
+    Args:
+        canonical (bool): 是否只返回去重后的规范风格，只读取已有的聚类映射，尚未聚类的风格视为自身的规范风格
+        
     Returns:
         StyleListResponse: 风格列表响应
     """
     try:
         logger_info("关联写作风格")
         
-        styles = style_analysis_service.get_all_style_analyses()
-        style_list = [style.to_dict() for style in styles]
+        if canonical:
+            style_list = style_cluster_service.get_canonical_styles()
+        else:
+            styles = style_analysis_service.get_all_style_analyses()
+            style_list = [style.to_dict() for style in styles]
         
         return StyleListResponse(
             success=True,
@@ -270,12 +279,13 @@ def get_style_list() -> StyleListResponse:
         logger_error(f"关联写作风格时出错: {str(e)}")
         raise Exception(f"获取风格列表失败: {str(e)}")
 
-def get_associated_styles(topic_id: int) -> AssociatedStyleResponse:
+def get_associated_styles(topic_id: int, canonical: bool = False) -> AssociatedStyleResponse:
     """
     获取某选题关联的风格列表
     
     Args:
         topic_id (int): 选题ID
+        canonical (bool): 是否按规范风格去重返回
         
     Returns:
         AssociatedStyleResponse: 关联风格列表响应
@@ -288,7 +298,10 @@ def get_associated_styles(topic_id: int) -> AssociatedStyleResponse:
             raise Exception(f"选题ID {topic_id} 不存在")
             
         styles = topic_service.get_associated_styles(topic_id)
-        style_list = [style.to_dict() for style in styles]
+        if canonical:
+            style_list = style_cluster_service.get_canonical_styles([style.id for style in styles])
+        else:
+            style_list = [style.to_dict() for style in styles]
         
         return AssociatedStyleResponse(
             success=True,
@@ -321,8 +334,11 @@ def associate_style(request: AssociateStyleRequest) -> AssociateStyleResponse:
         if not style:
             raise Exception(f"风格ID {request.style_id} 不存在")
             
-        # 关联选题和风格
-        topic_service.associate_style_with_topic(request.topic_id, request.style_id)
+        # 关联选题和风格，需要时改为关联规范风格
+        style_id = request.style_id
+        if request.canonical:
+            style_id = style_cluster_service.get_canonical_style_id(style_id)
+        topic_service.associate_style_with_topic(request.topic_id, style_id)
         
         return AssociateStyleResponse(
             success=True,
@@ -332,3 +348,65 @@ def associate_style(request: AssociateStyleRequest) -> AssociateStyleResponse:
     except Exception as e:
         logger_error(f"关联选题和风格时出错: {str(e)}")
         raise Exception(f"关联选题和风格失败: {str(e)}")
+
+def cluster_new_styles_in_background():
+    """
+    对新增风格做增量聚类，由列表和关联接口在返回响应后作为后台任务调用，失败时只记录日志
+    """
+    try:
+        style_cluster_service.cluster_new_styles()
+    except Exception as e:
+        logger_error(f"后台风格去重时出错: {str(e)}")
+
+def dedup_styles(request: StyleDedupRequest) -> StyleDedupResponse:
+    """
+    对风格做去重聚类，默认只处理尚未聚类的新风格
+    
+    Args:
+        request (StyleDedupRequest): 去重请求
+        
+    Returns:
+        StyleDedupResponse: 聚类统计响应
+    """
+    try:
+        threshold = request.threshold if request.threshold is not None else STYLE_DEDUP_THRESHOLD
+        if request.rebuild:
+            logger_info(f"重建风格聚类，阈值 {threshold}")
+            stats = style_cluster_service.rebuild(threshold)
+        else:
+            stats = style_cluster_service.cluster_new_styles(threshold)
+        
+        return StyleDedupResponse(
+            success=True,
+            data=stats,
+            message="风格去重完成"
+        )
+        
+    except Exception as e:
+        logger_error(f"风格去重时出错: {str(e)}")
+        raise Exception(f"风格去重失败: {str(e)}")
+
+def get_style_cluster_members(style_id: int) -> StyleListResponse:
+    """
+    获取风格所在聚类的全部风格
+    
+    Args:
+        style_id (int): 风格ID，可以是聚类中的任意风格
+        
+    Returns:
+        StyleListResponse: 聚类成员列表响应
+    """
+    try:
+        canonical_style_id = style_cluster_service.get_canonical_style_id(style_id)
+        styles = style_cluster_service.get_cluster_members(canonical_style_id)
+        style_list = [style.to_dict() for style in styles]
+        
+        return StyleListResponse(
+            success=True,
+            data=style_list,
+            message="获取聚类风格列表成功"
+        )
+        
+    except Exception as e:
+        logger_error(f"获取聚类风格列表时出错: {str(e)}")
+        raise Exception(f"获取聚类风格列表失败: {str(e)}")
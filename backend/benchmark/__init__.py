@@ -0,0 +1 @@
+# Benchmark scripts for the xhs-ai-note-styler backend
@@ -0,0 +1,110 @@
+"""
+数据库连接池基准测试脚本
+对比每次调用新建引擎（旧实现）与进程级共享连接池（新实现）的每秒操作数
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from backend.db.db_models import (
+    StyleAnalysis,
+    init_database,
+    create_db_engine,
+    create_db_async_engine,
+    get_session,
+    get_async_session,
+    dispose_database,
+)
+
+
+def _query(session):
+    return session.query(StyleAnalysis).filter(StyleAnalysis.id == 1).first()
+
+
+def bench_sync_per_call_engine(iterations: int) -> float:
+    """旧实现：每次操作都新建引擎和会话工厂"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        engine = create_db_engine()
+        session = sessionmaker(bind=engine)()
+        try:
+            _query(session)
+        finally:
+            session.close()
+            engine.dispose()
+    return iterations / (time.perf_counter() - start)
+
+
+def bench_sync_pooled(iterations: int) -> float:
+    """新实现：复用进程级引擎与连接池"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        session = get_session()
+        try:
+            _query(session)
+        finally:
+            session.close()
+    return iterations / (time.perf_counter() - start)
+
+
+async def bench_async_per_call_engine(iterations: int, concurrency: int) -> float:
+    """旧实现：每次异步操作都新建aiosqlite引擎"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            engine = create_db_async_engine()
+            factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+            async with factory() as session:
+                await session.execute(select(StyleAnalysis).where(StyleAnalysis.id == 1))
+            await engine.dispose()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(iterations)))
+    return iterations / (time.perf_counter() - start)
+
+
+async def bench_async_pooled(iterations: int, concurrency: int) -> float:
+    """新实现：复用进程级异步引擎与连接池"""
+    semaphore = asyncio.Semaphore(concurrency)
+    factory = get_async_session()
+
+    async def one():
+        async with semaphore:
+            async with factory() as session:
+                await session.execute(select(StyleAnalysis).where(StyleAnalysis.id == 1))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(iterations)))
+    return iterations / (time.perf_counter() - start)
+
+
+async def main(iterations: int, concurrency: int):
+    init_database()
+
+    print(f"同步  每次新建引擎: {bench_sync_per_call_engine(iterations):10.1f} ops/sec")
+    print(f"同步  共享连接池:   {bench_sync_pooled(iterations):10.1f} ops/sec")
+    print(f"异步  每次新建引擎: {await bench_async_per_call_engine(iterations, concurrency):10.1f} ops/sec")
+    print(f"异步  共享连接池:   {await bench_async_pooled(iterations, concurrency):10.1f} ops/sec")
+
+    await dispose_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据库连接池基准测试")
+    parser.add_argument("--iterations", type=int, default=500, help="每组测试的操作次数")
+    parser.add_argument("--concurrency", type=int, default=5, help="异步测试的并发数")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.concurrency))
@@ -0,0 +1,135 @@
+"""
+完整服务压测脚本
+使用模拟模型后端（LLM_BACKEND=fake）压测风格分析、重写和流式重写接口，不消耗真实token，不需要网络
+
+模拟后端的延迟分布、错误率和输出长度通过FAKE_LLM_*环境变量配置，
+数据写入临时数据库，不影响output目录下的数据
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_root not in sys.path:
+    sys.path.append(backend_root)
+
+# 使用临时数据库和模拟后端，需在导入应用之前设置
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "fake_llm_load_test.db"))
+os.environ["LLM_BACKEND"] = "fake"
+
+import httpx
+import litellm
+
+from backend.main import app
+
+litellm.suppress_debug_info = True
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def analyze(client, i):
+    response = await client.post(
+        "/api/v1/style/style/analyze",
+        json={"title": f"压测笔记{i}", "content": f"压测内容{i}，分享一个好用的小物件。"},
+        timeout=None,
+    )
+    response.raise_for_status()
+
+
+async def rewrite(client, style_id, i, variants=1):
+    response = await client.post(
+        "/api/v1/rewrite/style/rewrite",
+        json={"style_id": style_id, "user_task": f"压测任务{i}", "variants": variants, "bypass_cache": True},
+        timeout=None,
+    )
+    response.raise_for_status()
+
+
+async def rewrite_stream(client, style_id, i):
+    async with client.stream(
+        "POST", "/api/v1/rewrite/style/rewrite/stream",
+        json={"style_id": style_id, "user_task": f"压测流式任务{i}", "bypass_cache": True},
+        timeout=None,
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: error"):
+                raise RuntimeError("流式重写返回error事件")
+
+
+async def main(requests: int, concurrency: int, mix: dict):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            response = await client.post(
+                "/api/v1/style/style/analyze",
+                json={"title": "压测风格", "content": "压测风格示例内容"},
+                timeout=None,
+            )
+            style_id = response.json()["id"]
+
+            kinds = random.choices(list(mix), weights=list(mix.values()), k=requests)
+            latencies = defaultdict(list)
+            errors = defaultdict(int)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(i, kind):
+                async with semaphore:
+                    started_at = time.perf_counter()
+                    try:
+                        if kind == "analyze":
+                            await analyze(client, i)
+                        elif kind == "rewrite":
+                            await rewrite(client, style_id, i)
+                        elif kind == "variants":
+                            await rewrite(client, style_id, i, variants=3)
+                        else:
+                            await rewrite_stream(client, style_id, i)
+                        latencies[kind].append(time.perf_counter() - started_at)
+                    except Exception:
+                        errors[kind] += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i, kind) for i, kind in enumerate(kinds)))
+            elapsed = time.perf_counter() - start
+            metrics = (await client.get("/metrics")).json()
+
+    print(f"请求数: {requests}，并发: {concurrency}，总耗时: {elapsed:.2f}秒，吞吐: {requests / elapsed:.1f} req/s")
+    for kind in mix:
+        values = latencies[kind]
+        if values:
+            print(f"{kind:<9} 成功: {len(values):>4}  失败: {errors[kind]:>3}  "
+                  f"p50: {percentile(values, 50):.2f}s  p95: {percentile(values, 95):.2f}s  p99: {percentile(values, 99):.2f}s")
+        elif errors[kind]:
+            print(f"{kind:<9} 成功:    0  失败: {errors[kind]:>3}")
+    print(json.dumps({
+        "llm_executor": {key: metrics["llm_executor"][key] for key in ("completed", "failed", "timeouts", "total_wait_seconds")},
+        "llm_scheduler": metrics["llm_scheduler"],
+        "fake_llm": metrics.get("fake_llm"),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="使用模拟模型后端压测完整服务")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发请求数")
+    parser.add_argument("--mix", default="analyze=1,rewrite=2,variants=1,stream=1",
+                        help="各类请求的权重，可选analyze、rewrite、variants、stream")
+    args = parser.parse_args()
+    mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    asyncio.run(main(args.requests, args.concurrency, mix))
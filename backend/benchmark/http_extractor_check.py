@@ -0,0 +1,106 @@
+"""
+笔记HTTP快速提取验证脚本
+在本地启动HTTP服务返回fixtures目录中的笔记页面，验证HttpNoteExtractor对内嵌状态、短链接重定向、
+缺少状态和非200响应的处理，任一检查失败时以非零状态退出
+
+运行: python -m backend.benchmark.http_extractor_check
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.rpa.http_extractor import HttpNoteExtractor
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# 路径 -> (状态码, 页面文件, 重定向地址)
+ROUTES = {
+    "/explore/state": (200, "xhs_note_state.html", None),
+    "/explore/empty": (200, "xhs_note_empty_state.html", None),
+    "/explore/no-state": (200, "xhs_note_no_state.html", None),
+    "/explore/not-found": (404, "xhs_note_no_state.html", None),
+    "/explore/error": (500, "xhs_note_state.html", None),
+    "/short": (302, None, "/explore/state"),
+}
+
+EXPECTED_NOTE = {
+    "title": "秋日穿搭 undefined 不踩雷",
+    "content": "今天分享三套通勤穿搭\n第一套：燕麦色针织开衫 + 直筒牛仔裤 #穿搭[话题]# #秋日穿搭[话题]#",
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, filename, location = ROUTES.get(self.path, (404, None, None))
+        body = b""
+        if filename:
+            with open(os.path.join(FIXTURES_DIR, filename), "rb") as f:
+                body = f.read()
+        self.send_response(status)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    """
+    在随机端口启动返回笔记页面的本地服务
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_checks(base_url: str) -> bool:
+    """
+    逐个请求本地页面并核对提取结果
+
+    Args:
+        base_url: 本地服务地址
+
+    Returns:
+        bool: 是否全部通过
+    """
+    cases = [
+        ("内嵌状态（含undefined）", "/explore/state", EXPECTED_NOTE),
+        ("短链接重定向", "/short", EXPECTED_NOTE),
+        ("状态中没有笔记", "/explore/empty", None),
+        ("页面缺少状态", "/explore/no-state", None),
+        ("404响应", "/explore/not-found", None),
+        ("500响应", "/explore/error", None),
+    ]
+    extractor = HttpNoteExtractor(timeout=5)
+    passed = True
+    try:
+        for name, path, expected in cases:
+            note, downloaded = await extractor.extract(base_url + path)
+            ok = note == expected
+            passed = passed and ok
+            print(f"{'通过' if ok else '失败'} {name}: {note}，下载{downloaded}字节")
+    finally:
+        await extractor.close()
+    return passed
+
+
+if __name__ == "__main__":
+    server = start_server()
+    try:
+        result = asyncio.run(run_checks(f"http://127.0.0.1:{server.server_address[1]}"))
+    finally:
+        server.shutdown()
+    print(f"HTTP提取验证{'通过' if result else '失败'}")
+    sys.exit(0 if result else 1)
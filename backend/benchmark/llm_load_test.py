@@ -0,0 +1,113 @@
+"""
+LLM异步执行压测脚本
+在重写请求占用LLM的同时压测选题列表接口，验证LLM调用不会阻塞事件循环
+
+使用桩Agent模拟耗时的模型调用，不消耗真实token；
+数据写入临时数据库，不影响output目录下的数据
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_root not in sys.path:
+    sys.path.append(backend_root)
+
+# 使用临时数据库，需在导入应用之前设置
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "load_test.db"))
+
+import httpx
+
+from backend.main import app
+from backend.db import style_analysis_service
+# main.py以顶层包的方式导入api模块，这里需要修改同一个模块对象
+import api.services.style_service as style_service_module
+
+
+class StubCopycatAgent:
+    """
+    模拟CopycatAgent，同步阻塞指定时长后返回工具调用结果
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def run(self, task: str) -> str:
+        time.sleep(self.latency)
+        arguments = json.dumps({"title": "标题", "content": "内容", "tags": "#标签"}, ensure_ascii=False)
+        return "CopycatAgent: " + repr([{"function": {"name": "copy_cat", "arguments": arguments}}])
+
+
+async def blocking_run_routed_agent(file_path, build_agent, task, timeout=None, hedge=False):
+    """旧实现：直接在事件循环上调用同步的agent.run"""
+    agent = build_agent(None)
+    return agent, agent.run(task)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def main(rewrites: int, latency: float, probes: int, blocking: bool):
+    style_service_module.get_copycat_agent = lambda system_prompt=None, variants=1, model=None: StubCopycatAgent(latency)
+    if blocking:
+        style_service_module.run_routed_agent_async = blocking_run_routed_agent
+
+    async with app.router.lifespan_context(app):
+        style = style_analysis_service.create_style_analysis(
+            style_name="压测风格", feature_desc="压测", category="压测", sample_content="压测示例"
+        )
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            start = time.perf_counter()
+            rewrite_tasks = [
+                asyncio.create_task(client.post(
+                    "/api/v1/rewrite/style/rewrite",
+                    json={"style_id": style.id, "user_task": f"任务{i}"},
+                    timeout=None,
+                ))
+                for i in range(rewrites)
+            ]
+
+            # 按固定间隔探测选题列表接口，延迟从计划发出时间算起，事件循环被阻塞的时间也会计入
+            interval = latency / probes
+            latencies = []
+            for i in range(probes):
+                scheduled_at = start + (i + 1) * interval
+                await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+                response = await client.get("/api/v1/topic/list")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - scheduled_at)
+
+            responses = await asyncio.gather(*rewrite_tasks)
+            total_seconds = time.perf_counter() - start
+            succeeded = sum(1 for response in responses if response.status_code == 200)
+
+    mode = "阻塞事件循环（旧实现）" if blocking else "专用线程池（新实现）"
+    print(f"模式: {mode}")
+    print(f"并发重写数: {rewrites}，单次模型耗时: {latency:.2f}秒")
+    print(f"选题列表接口 p50: {statistics.median(latencies) * 1000:.1f}ms  "
+          f"p95: {percentile(latencies, 95) * 1000:.1f}ms  max: {max(latencies) * 1000:.1f}ms")
+    print(f"重写成功: {succeeded}/{rewrites}，总耗时: {total_seconds:.2f}秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM异步执行压测")
+    parser.add_argument("--rewrites", type=int, default=8, help="同时进行的重写请求数")
+    parser.add_argument("--latency", type=float, default=1.0, help="模拟的单次模型调用耗时（秒）")
+    parser.add_argument("--probes", type=int, default=20, help="选题列表接口的探测次数")
+    parser.add_argument("--blocking", action="store_true", help="模拟旧实现，在事件循环上直接调用agent")
+    args = parser.parse_args()
+    asyncio.run(main(args.rewrites, args.latency, args.probes, args.blocking))
@@ -0,0 +1,181 @@
+"""
+模型路由桩服务验证脚本
+在本地启动多个OpenAI兼容的桩服务，模拟不同的延迟与错误率，验证路由选择、超时回退和延迟对冲
+
+使用 --check-hedge-failover 运行首选模型提前失败时对冲立即改用备选模型的断言检查
+
+候选模型通过临时提示词文件的front matter声明，api_base指向本地桩服务，不消耗真实token
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.agent import agent_factory, model_router, run_routed_agent_async
+from backend.agent.analyze_style import tools
+
+os.environ.setdefault("STUB_LLM_API_KEY", "stub-key")
+
+
+def make_handler(name: str, latency: float, jitter: float, error_rate: float):
+    """
+    构造桩服务的请求处理类，按给定延迟和错误率返回analyze_style工具调用
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(max(0.0, random.gauss(latency, jitter)))
+            if random.random() < error_rate:
+                self.send_response(500)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": {"message": f"{name} 模拟错误"}}).encode())
+                return
+            arguments = json.dumps({"style_name": name, "feature_desc": "桩服务", "category": "测试"}, ensure_ascii=False)
+            payload = {
+                "id": f"stub-{name}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", name),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "tool_calls",
+                    "message": {
+                        "role": "assistant",
+                        "content": None,
+                        "tool_calls": [{
+                            "id": "call_stub",
+                            "type": "function",
+                            "function": {"name": "analyze_style", "arguments": arguments},
+                        }],
+                    },
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+            }
+            data = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(name: str, latency: float, jitter: float, error_rate: float) -> str:
+    """
+    在后台线程启动桩服务，返回api_base
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(name, latency, jitter, error_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def write_prompt(stubs) -> str:
+    """
+    写入声明了桩服务候选模型的临时提示词文件
+    """
+    models = "\n".join(
+        f"  - model_name: openai/{name}\n    api_base: {api_base}\n    api_key_env: STUB_LLM_API_KEY"
+        for name, api_base in stubs
+    )
+    content = f"""---
+name: StubAnalyzer
+description: 模型路由验证
+model_name: openai/{stubs[0][0]}
+models:
+{models}
+temperature: 0
+max_loops: 1
+---
+
+调用analyze_style工具返回分析结果。
+"""
+    path = os.path.join(tempfile.mkdtemp(), "stub_analyzer.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+async def main(calls: int, hedge: bool):
+    # 按声明顺序：慢且不稳定的模型排在首位，路由应在积累样本后转向更快的候选
+    stubs = [
+        ("slow", start_stub("slow", latency=1.5, jitter=0.2, error_rate=0.2)),
+        ("fast", start_stub("fast", latency=0.2, jitter=0.05, error_rate=0.0)),
+        ("down", start_stub("down", latency=0.1, jitter=0.0, error_rate=1.0)),
+    ]
+    prompt_path = write_prompt(stubs)
+    build_agent = lambda model: agent_factory.create_agent(prompt_path, tools=tools, model=model, print_on=False)
+
+    winners = Counter()
+    latencies = []
+    failures = 0
+    for i in range(calls):
+        started_at = time.perf_counter()
+        try:
+            agent, _ = await run_routed_agent_async(prompt_path, build_agent, f"任务{i}", timeout=30, hedge=hedge)
+            winners[agent.model_name] += 1
+        except Exception as e:
+            failures += 1
+            print(f"第{i + 1}次调用失败: {e}")
+        latencies.append(time.perf_counter() - started_at)
+
+    print(f"调用次数: {calls}，失败: {failures}，对冲: {'开启' if hedge else '关闭'}")
+    print(f"完成调用的模型: {dict(winners)}")
+    print(f"平均耗时: {sum(latencies) / len(latencies):.2f}s，最后10次平均: {sum(latencies[-10:]) / len(latencies[-10:]):.2f}s")
+    print(json.dumps(model_router.get_stats(), ensure_ascii=False, indent=2))
+
+
+async def check_hedge_failover() -> bool:
+    """
+    开启对冲时首选模型在对冲等待时间内直接报错，应立即改用备选模型并成功返回
+    """
+    stubs = [
+        ("broken", start_stub("broken", latency=0.0, jitter=0.0, error_rate=1.0)),
+        ("backup", start_stub("backup", latency=0.1, jitter=0.0, error_rate=0.0)),
+    ]
+    prompt_path = write_prompt(stubs)
+    tried = []
+
+    def build_agent(model):
+        tried.append(model["model_name"])
+        return agent_factory.create_agent(prompt_path, tools=tools, model=model, print_on=False)
+
+    try:
+        agent, _ = await run_routed_agent_async(prompt_path, build_agent, "对冲回退验证", timeout=30, hedge=True)
+    except Exception as e:
+        print(f"对冲回退验证失败: 尝试的模型 {tried}，错误: {e}")
+        return False
+    passed = tried == ["openai/broken", "openai/backup"] and agent.model_name == "openai/backup"
+    print(f"对冲回退验证{'通过' if passed else '失败'}: 尝试的模型 {tried}，完成调用的模型 {agent.model_name}")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="使用本地桩服务验证模型路由")
+    parser.add_argument("--calls", type=int, default=20, help="调用次数")
+    parser.add_argument("--hedge", action="store_true", help="开启延迟对冲")
+    parser.add_argument("--check-hedge-failover", action="store_true",
+                        help="验证首选模型提前失败时对冲立即改用备选模型，失败时以非零状态退出")
+    args = parser.parse_args()
+    if args.check_hedge_failover:
+        sys.exit(0 if asyncio.run(check_hedge_failover()) else 1)
+    asyncio.run(main(args.calls, args.hedge))
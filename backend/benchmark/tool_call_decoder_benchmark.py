@@ -0,0 +1,79 @@
+"""
+工具调用解析基准测试
+对比旧的 split + ast.literal_eval + json.loads 解析方式与tool_call_decoder在不同输出长度下的耗时
+"""
+
+import argparse
+import ast
+import json
+import os
+import sys
+import timeit
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.agent.tool_call_decoder import decode_tool_arguments
+
+
+class StubMemory:
+    """
+    模拟swarms Agent的short_memory
+    """
+
+    def __init__(self, content):
+        self.conversation_history = [
+            {"role": "System", "content": "system prompt"},
+            {"role": "User", "content": "task"},
+            {"role": "CopycatAgent", "content": content},
+        ]
+
+
+class StubAgent:
+    def __init__(self, content):
+        self.short_memory = StubMemory(content)
+
+
+def build_tool_calls(content_length: int):
+    """
+    构造与CopycatAgent输出结构相同的工具调用
+    """
+    content = ("这是一段用于测试解析性能的正文内容，包含标点和换行。\n" * (content_length // 27 + 1))[:content_length]
+    arguments = json.dumps({"title": "测试标题", "content": content, "tags": "#测试 #基准"}, ensure_ascii=False)
+    return [{"id": "call_0", "type": "function", "function": {"name": "copy_cat", "arguments": arguments}}]
+
+
+def legacy_parse(result: str) -> dict:
+    """
+    旧实现的解析路径
+    """
+    result = result.split("CopycatAgent: ")[1]
+    data = ast.literal_eval(result)
+    return json.loads(data[0]['function']['arguments'])
+
+
+def main(sizes, number: int):
+    print(f"{'正文长度':>10} {'旧实现(ms)':>12} {'解码文本(ms)':>14} {'读取会话(ms)':>14}")
+    for size in sizes:
+        tool_calls = build_tool_calls(size)
+        text = "CopycatAgent: " + repr(tool_calls)
+        agent = StubAgent(tool_calls)
+
+        expected = legacy_parse(text)
+        assert decode_tool_arguments(text, 'copy_cat') == expected
+        assert decode_tool_arguments(text, 'copy_cat', agent=agent) == expected
+
+        legacy = timeit.timeit(lambda: legacy_parse(text), number=number) / number
+        decoded_text = timeit.timeit(lambda: decode_tool_arguments(text, 'copy_cat'), number=number) / number
+        decoded_agent = timeit.timeit(lambda: decode_tool_arguments(text, 'copy_cat', agent=agent), number=number) / number
+        print(f"{size:>10} {legacy * 1000:>12.3f} {decoded_text * 1000:>14.3f} {decoded_agent * 1000:>14.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="工具调用解析基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 500000], help="正文长度（字符）")
+    parser.add_argument("--number", type=int, default=50, help="每种长度的重复次数")
+    args = parser.parse_args()
+    main(args.sizes, args.number)
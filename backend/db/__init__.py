@@ -1,4 +1,9 @@
 from .style_service import style_analysis_service, rewrite_record_service
 from .topic_service import topic_service
+from .rewrite_cache import rewrite_cache
+from .call_log_service import llm_call_log_service
+from .style_cluster_service import style_cluster_service
+from .analysis_job_service import analysis_job_service
 
-__all__ = ['style_analysis_service', 'rewrite_record_service', 'topic_service']
\ No newline at end of file
+__all__ = ['style_analysis_service', 'rewrite_record_service', 'topic_service', 'rewrite_cache', 'llm_call_log_service',
+           'style_cluster_service', 'analysis_job_service']
\ No newline at end of file
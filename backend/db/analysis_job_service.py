@@ -0,0 +1,212 @@
+"""
+URL风格分析后台任务数据库服务
+提供任务与笔记状态的创建、查询和更新
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .db_models import AnalysisJob, AnalysisJobNote, StyleAnalysis, get_session
+
+# 任务状态
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+# 笔记状态
+NOTE_PENDING = 'pending'
+NOTE_EXTRACTED = 'extracted'
+NOTE_COMPLETED = 'completed'
+NOTE_FAILED = 'failed'
+
+
+class AnalysisJobService:
+    """
+    URL风格分析后台任务数据库服务类
+    """
+
+    @staticmethod
+    def create_job(urls: List[str], force_refresh: bool = False) -> AnalysisJob:
+        """
+        创建任务，每个URL对应一篇待提取的笔记
+
+        Args:
+            urls: 笔记URL列表
+            force_refresh: 是否忽略已有分析结果
+
+        Returns:
+            AnalysisJob: 创建的任务
+        """
+        session = get_session()
+        try:
+            job = AnalysisJob(status=JOB_PENDING, force_refresh=force_refresh, total_notes=len(urls))
+            session.add(job)
+            session.flush()
+            session.add_all([
+                AnalysisJobNote(job_id=job.id, note_index=index, url=url, status=NOTE_PENDING)
+                for index, url in enumerate(urls)
+            ])
+            session.commit()
+            session.refresh(job)
+            return job
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_job(job_id: int) -> Optional[AnalysisJob]:
+        """
+        根据ID获取任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[AnalysisJob]: 任务，不存在时返回None
+        """
+        session = get_session()
+        try:
+            return session.get(AnalysisJob, job_id)
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_unfinished_job_ids() -> List[int]:
+        """
+        获取尚未结束的任务ID，服务重启后按提交顺序继续执行
+
+        Returns:
+            List[int]: 待执行或执行中的任务ID
+        """
+        session = get_session()
+        try:
+            rows = session.query(AnalysisJob.id).filter(
+                AnalysisJob.status.in_([JOB_PENDING, JOB_RUNNING])
+            ).order_by(AnalysisJob.id).all()
+            return [row.id for row in rows]
+        finally:
+            session.close()
+
+    @staticmethod
+    def update_job(job_id: int, **kwargs) -> bool:
+        """
+        更新任务字段
+
+        Args:
+            job_id: 任务ID
+            **kwargs: 要更新的字段
+
+        Returns:
+            bool: 任务是否存在
+        """
+        session = get_session()
+        try:
+            updated = session.query(AnalysisJob).filter(AnalysisJob.id == job_id).update(
+                kwargs, synchronize_session=False
+            )
+            session.commit()
+            return bool(updated)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_job_notes(job_id: int, statuses: Optional[List[str]] = None) -> List[AnalysisJobNote]:
+        """
+        获取任务中的笔记
+
+        Args:
+            job_id: 任务ID
+            statuses: 只返回这些状态的笔记，None表示全部
+
+        Returns:
+            List[AnalysisJobNote]: 按序号排列的笔记
+        """
+        session = get_session()
+        try:
+            query = session.query(AnalysisJobNote).filter(AnalysisJobNote.job_id == job_id)
+            if statuses is not None:
+                query = query.filter(AnalysisJobNote.status.in_(statuses))
+            return query.order_by(AnalysisJobNote.note_index).all()
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_note_counts(job_id: int) -> Dict[str, int]:
+        """
+        统计任务中各状态的笔记数
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Dict[str, int]: 笔记状态到数量的映射
+        """
+        session = get_session()
+        try:
+            rows = session.query(AnalysisJobNote.status).filter(AnalysisJobNote.job_id == job_id).all()
+            counts = Counter(row.status for row in rows)
+            return {status: counts.get(status, 0) for status in (NOTE_PENDING, NOTE_EXTRACTED, NOTE_COMPLETED, NOTE_FAILED)}
+        finally:
+            session.close()
+
+    @staticmethod
+    def update_notes(job_id: int, note_indexes: List[int], **kwargs) -> int:
+        """
+        批量更新任务中笔记的字段
+
+        Args:
+            job_id: 任务ID
+            note_indexes: 笔记序号列表
+            **kwargs: 要更新的字段
+
+        Returns:
+            int: 更新的笔记数
+        """
+        if not note_indexes:
+            return 0
+        kwargs.setdefault('updated_at', datetime.now())
+        session = get_session()
+        try:
+            updated = session.query(AnalysisJobNote).filter(
+                AnalysisJobNote.job_id == job_id,
+                AnalysisJobNote.note_index.in_(note_indexes)
+            ).update(kwargs, synchronize_session=False)
+            session.commit()
+            return updated
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_job_results(job_id: int) -> List[Tuple[AnalysisJobNote, Optional[StyleAnalysis]]]:
+        """
+        获取任务中的笔记及已完成笔记的风格分析结果
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            List[Tuple[AnalysisJobNote, Optional[StyleAnalysis]]]: 按序号排列的笔记及其风格分析结果
+        """
+        session = get_session()
+        try:
+            return session.query(AnalysisJobNote, StyleAnalysis).outerjoin(
+                StyleAnalysis, StyleAnalysis.id == AnalysisJobNote.style_id
+            ).filter(
+                AnalysisJobNote.job_id == job_id
+            ).order_by(AnalysisJobNote.note_index).all()
+        finally:
+            session.close()
+
+
+# 创建全局服务实例
+analysis_job_service = AnalysisJobService()
@@ -0,0 +1,205 @@
+"""
+LLM调用记录数据库服务
+提供调用记录的批量写入、按记录查询，以及按风格、模型、日期的费用与延迟汇总；
+批量分析的调用通过关联表分摊到产出的每个风格
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db_models import LLMCallLog, LLMCallStyleLink, StyleAnalysis, get_session
+
+# 支持的汇总维度
+GROUP_BY_FIELDS = ('style', 'model', 'day')
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class LLMCallLogService:
+    """
+    LLM调用记录数据库服务类
+    """
+
+    @staticmethod
+    def create_call_logs(calls: List[Dict[str, Any]], style_ids: Optional[List[int]] = None) -> int:
+        """
+        批量创建调用记录，写入后在每个调用字典中回填记录id
+
+        Args:
+            calls: 调用记录字典列表，键与LLMCallLog的列名一致
+            style_ids: 一次调用产出的多个风格ID，每条调用按风格数平均分摊到这些风格
+
+        Returns:
+            int: 写入的记录数
+        """
+        if not calls:
+            return 0
+        session = get_session()
+        try:
+            call_logs = [LLMCallLog(**call) for call in calls]
+            session.add_all(call_logs)
+            session.flush()
+            style_ids = sorted(set(style_ids or []))
+            if style_ids:
+                share = 1.0 / len(style_ids)
+                session.add_all([
+                    LLMCallStyleLink(call_log_id=call_log.id, style_id=style_id, share=share)
+                    for call_log in call_logs for style_id in style_ids
+                ])
+            session.commit()
+            for call, call_log in zip(calls, call_logs):
+                call['id'] = call_log.id
+            return len(calls)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def update_call_usage(call_log_id: int, usage_fields: Dict[str, Any]) -> bool:
+        """
+        更新已写入的调用记录的token用量与费用
+
+        Args:
+            call_log_id: 调用记录ID
+            usage_fields: prompt_tokens、completion_tokens、cached_tokens和cost
+
+        Returns:
+            bool: 是否找到并更新了记录
+        """
+        session = get_session()
+        try:
+            updated = session.query(LLMCallLog).filter(LLMCallLog.id == call_log_id).update(usage_fields)
+            session.commit()
+            return bool(updated)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_call_logs_by_record(record_type: str, record_id: int) -> List[Tuple[LLMCallLog, float]]:
+        """
+        获取产出某条记录的全部调用，风格分析记录包括与其他风格共同产出它的批量调用
+
+        Args:
+            record_type: 记录类型，style_analysis或rewrite
+            record_id: 记录ID
+
+        Returns:
+            List[Tuple[LLMCallLog, float]]: 按时间排列的调用记录及该记录分摊的比例，非批量调用的比例为1
+        """
+        session = get_session()
+        try:
+            calls = session.query(LLMCallLog).filter(
+                LLMCallLog.record_type == record_type,
+                LLMCallLog.record_id == record_id
+            ).all()
+            result = [(call, 1.0) for call in calls]
+            if record_type == 'style_analysis':
+                result.extend(session.query(LLMCallLog, LLMCallStyleLink.share).join(
+                    LLMCallStyleLink, LLMCallStyleLink.call_log_id == LLMCallLog.id
+                ).filter(LLMCallStyleLink.style_id == record_id).all())
+            result.sort(key=lambda item: (item[0].created_at, item[0].id))
+            return result
+        finally:
+            session.close()
+
+    @staticmethod
+    def aggregate_call_logs(group_by: str, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        按维度汇总调用次数、token用量、费用和延迟分位数
+
+        延迟分位数只统计成功的调用；按风格汇总时批量调用计入其产出的每个风格，
+        token用量与费用按分摊比例计算，不含未产出风格的调用
+
+        Args:
+            group_by: 汇总维度，style、model或day
+            start: 起始时间（含）
+            end: 结束时间（不含）
+
+        Returns:
+            List[Dict[str, Any]]: 每个分组一项，按费用从高到低排列，按日期汇总时按日期排列
+        """
+        if group_by not in GROUP_BY_FIELDS:
+            raise ValueError(f"不支持的汇总维度: {group_by}，可选 {', '.join(GROUP_BY_FIELDS)}")
+
+        session = get_session()
+        try:
+            query = session.query(
+                LLMCallLog.model, LLMCallLog.style_id, LLMCallLog.created_at,
+                LLMCallLog.prompt_tokens, LLMCallLog.completion_tokens, LLMCallLog.cached_tokens,
+                LLMCallLog.latency_seconds, LLMCallLog.queue_seconds, LLMCallLog.cost, LLMCallLog.success
+            )
+            if start is not None:
+                query = query.filter(LLMCallLog.created_at >= start)
+            if end is not None:
+                query = query.filter(LLMCallLog.created_at < end)
+            if group_by == 'style':
+                rows = [(row.style_id, 1.0, row) for row in query.filter(LLMCallLog.style_id.isnot(None)).all()]
+                linked_rows = query.add_columns(
+                    LLMCallStyleLink.style_id.label('linked_style_id'), LLMCallStyleLink.share
+                ).join(LLMCallStyleLink, LLMCallStyleLink.call_log_id == LLMCallLog.id).all()
+                rows.extend((row.linked_style_id, row.share, row) for row in linked_rows)
+            else:
+                rows = [(None, 1.0, row) for row in query.all()]
+
+            style_names = {}
+            if group_by == 'style':
+                style_ids = {style_id for style_id, _, _ in rows}
+                if style_ids:
+                    style_names = dict(session.query(StyleAnalysis.id, StyleAnalysis.style_name).filter(
+                        StyleAnalysis.id.in_(style_ids)
+                    ).all())
+        finally:
+            session.close()
+
+        groups: Dict[Any, List[Any]] = defaultdict(list)
+        for style_id, share, row in rows:
+            if group_by == 'style':
+                key = style_id
+            elif group_by == 'model':
+                key = row.model
+            else:
+                key = row.created_at.date().isoformat()
+            groups[key].append((share, row))
+
+        results = []
+        for key, group_items in groups.items():
+            group_rows = [row for _, row in group_items]
+            latencies = [row.latency_seconds for row in group_rows if row.success and row.latency_seconds is not None]
+            queue_times = [row.queue_seconds for row in group_rows if row.queue_seconds is not None]
+            results.append({
+                'key': str(key),
+                'label': style_names.get(key) if group_by == 'style' else str(key),
+                'calls': len(group_rows),
+                'failed_calls': sum(1 for row in group_rows if not row.success),
+                'prompt_tokens': round(sum((row.prompt_tokens or 0) * share for share, row in group_items)),
+                'completion_tokens': round(sum((row.completion_tokens or 0) * share for share, row in group_items)),
+                'cached_tokens': round(sum((row.cached_tokens or 0) * share for share, row in group_items)),
+                'cost': round(sum((row.cost or 0.0) * share for share, row in group_items), 6),
+                'latency_p50_seconds': _percentile(latencies, 50),
+                'latency_p95_seconds': _percentile(latencies, 95),
+                'latency_p99_seconds': _percentile(latencies, 99),
+                'avg_queue_seconds': sum(queue_times) / len(queue_times) if queue_times else None,
+            })
+
+        if group_by == 'day':
+            results.sort(key=lambda item: item['key'])
+        else:
+            results.sort(key=lambda item: item['cost'], reverse=True)
+        return results
+
+
+# 创建全局服务实例
+llm_call_log_service = LLMCallLogService()
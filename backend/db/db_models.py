@@ -3,10 +3,11 @@
 定义风格分析结果的数据结构
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import os
+import threading
 # 异步支持相关
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, relationship
@@ -24,6 +25,8 @@ class StyleAnalysis(Base):
     category = Column(String(255), nullable=False)
     sample_title = Column(String(255), nullable=True)
     sample_content = Column(Text, nullable=False)
+    # 归一化后样本内容的哈希，用于跳过重复笔记的分析
+    content_hash = Column(String(64), nullable=True, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.now)
     
     def __repr__(self):
@@ -40,6 +43,7 @@ class StyleAnalysis(Base):
             'category': self.category,
             'sample_title': self.sample_title,
             'sample_content': self.sample_content,
+            'content_hash': self.content_hash,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -131,6 +135,13 @@ class RewriteRecord(Base):
     generated_tags = Column(Text, nullable=True)
     # 执行时间（秒）
     execution_time = Column(String(20), nullable=True)
+    # 是否由重写缓存直接返回
+    cache_hit = Column(Boolean, default=False)
+    # 模型返回的输入token数及其中命中服务商提示词缓存的token数
+    prompt_tokens = Column(Integer, nullable=True)
+    cached_tokens = Column(Integer, nullable=True)
+    # 本次生成的候选文案数量，大于1时候选保存在rewrite_variants中
+    variant_count = Column(Integer, default=1)
     created_at = Column(DateTime, default=datetime.now)
     
     def __repr__(self):
@@ -149,14 +160,253 @@ class RewriteRecord(Base):
             'generated_content': self.generated_content,
             'generated_tags': self.generated_tags,
             'execution_time': self.execution_time,
+            'cache_hit': bool(self.cache_hit),
+            'prompt_tokens': self.prompt_tokens,
+            'cached_tokens': self.cached_tokens,
+            'variant_count': self.variant_count or 1,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
+class RewriteVariantRecord(Base):
+    """
+    多候选重写中的单个候选文案，归属于一条文稿二创执行记录
+    """
+    __tablename__ = 'rewrite_variants'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    record_id = Column(Integer, ForeignKey('rewrite_records.id'), nullable=False, index=True)
+    # 候选在模型输出中的序号
+    variant_index = Column(Integer, nullable=False)
+    generated_title = Column(String(255), nullable=False)
+    generated_content = Column(Text, nullable=False)
+    generated_tags = Column(Text, nullable=True)
+    # 综合得分与各项得分（JSON）
+    score = Column(Float, nullable=True)
+    score_detail = Column(Text, nullable=True)
+    # 是否被选为最佳候选
+    selected = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<RewriteVariantRecord(record_id={self.record_id}, variant_index={self.variant_index})>"
+        
+    def to_dict(self):
+        """
+        将对象转换为字典格式
+        """
+        return {
+            'id': self.id,
+            'record_id': self.record_id,
+            'variant_index': self.variant_index,
+            'generated_title': self.generated_title,
+            'generated_content': self.generated_content,
+            'generated_tags': self.generated_tags,
+            'score': self.score,
+            'score_detail': self.score_detail,
+            'selected': bool(self.selected),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class RewriteCacheEntry(Base):
+    """
+    重写结果缓存模型，作为内存缓存的持久化层
+    """
+    __tablename__ = 'rewrite_cache'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # 由风格ID、用户任务和字数计算的缓存键
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)
+    generated_title = Column(String(255), nullable=False)
+    generated_content = Column(Text, nullable=False)
+    generated_tags = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<RewriteCacheEntry(cache_key='{self.cache_key}')>"
+
+
+class StyleCanonicalMapping(Base):
+    """
+    风格去重映射模型，将每条风格分析记录映射到其所在聚类的规范风格
+    """
+    __tablename__ = 'style_canonical_map'
+
+    # 每条风格只映射一次，规范风格映射到自身
+    style_id = Column(Integer, ForeignKey('style_analysis.id'), primary_key=True)
+    canonical_style_id = Column(Integer, ForeignKey('style_analysis.id'), nullable=False, index=True)
+    # 与规范风格的余弦相似度
+    similarity = Column(Float, nullable=False, default=1.0)
+    created_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<StyleCanonicalMapping(style_id={self.style_id}, canonical_style_id={self.canonical_style_id})>"
+
+    def to_dict(self):
+        """
+        将对象转换为字典格式
+        """
+        return {
+            'style_id': self.style_id,
+            'canonical_style_id': self.canonical_style_id,
+            'similarity': self.similarity,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class LLMCallLog(Base):
+    """
+    单次LLM调用记录，保存token用量、延迟与估算费用，并关联到产出的风格分析或重写记录
+    """
+    __tablename__ = 'llm_call_logs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    agent_name = Column(String(100), nullable=True)
+    model = Column(String(255), nullable=False, index=True)
+    provider = Column(String(100), nullable=True)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)
+    # 服务商调用耗时与调度排队耗时（秒）
+    latency_seconds = Column(Float, nullable=True)
+    queue_seconds = Column(Float, nullable=True)
+    # 估算费用（美元）
+    cost = Column(Float, default=0.0)
+    success = Column(Boolean, default=True)
+    error = Column(Text, nullable=True)
+    # 关联的记录：style_analysis、style_analysis_batch或rewrite，调用失败时记录ID为空
+    record_type = Column(String(50), nullable=True)
+    record_id = Column(Integer, nullable=True)
+    style_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+    def __repr__(self):
+        return f"<LLMCallLog(model='{self.model}', record_type='{self.record_type}', record_id={self.record_id})>"
+
+    def to_dict(self):
+        """
+        将对象转换为字典格式
+        """
+        return {
+            'id': self.id,
+            'agent_name': self.agent_name,
+            'model': self.model,
+            'provider': self.provider,
+            'prompt_tokens': self.prompt_tokens or 0,
+            'completion_tokens': self.completion_tokens or 0,
+            'cached_tokens': self.cached_tokens or 0,
+            'latency_seconds': self.latency_seconds,
+            'queue_seconds': self.queue_seconds,
+            'cost': self.cost or 0.0,
+            'success': bool(self.success),
+            'error': self.error,
+            'record_type': self.record_type,
+            'record_id': self.record_id,
+            'style_id': self.style_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class LLMCallStyleLink(Base):
+    """
+    批量调用与其产出的风格的关联，一次调用分析多篇笔记时按风格数平均分摊用量与费用
+    """
+    __tablename__ = 'llm_call_style_links'
+
+    call_log_id = Column(Integer, ForeignKey('llm_call_logs.id'), primary_key=True)
+    style_id = Column(Integer, ForeignKey('style_analysis.id'), primary_key=True, index=True)
+    # 该风格分摊的比例
+    share = Column(Float, nullable=False, default=1.0)
+
+    def __repr__(self):
+        return f"<LLMCallStyleLink(call_log_id={self.call_log_id}, style_id={self.style_id}, share={self.share})>"
+
+
+class AnalysisJob(Base):
+    """
+    URL风格分析后台任务模型，每个任务包含多篇笔记，任务状态与进度持久化以便重启后继续执行
+    """
+    __tablename__ = 'analysis_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # 任务状态：pending、running、completed、failed
+    status = Column(String(20), nullable=False, default='pending', index=True)
+    force_refresh = Column(Boolean, default=False)
+    total_notes = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<AnalysisJob(id={self.id}, status='{self.status}')>"
+
+    def to_dict(self):
+        """
+        将对象转换为字典格式
+        """
+        return {
+            'id': self.id,
+            'status': self.status,
+            'force_refresh': bool(self.force_refresh),
+            'total_notes': self.total_notes or 0,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class AnalysisJobNote(Base):
+    """
+    后台任务中单篇笔记的处理状态，提取的内容和分析结果逐篇保存
+    """
+    __tablename__ = 'analysis_job_notes'
+    __table_args__ = (UniqueConstraint('job_id', 'note_index', name='uq_analysis_job_notes_job_index'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey('analysis_jobs.id'), nullable=False, index=True)
+    # 笔记URL在提交时的序号
+    note_index = Column(Integer, nullable=False)
+    url = Column(Text, nullable=False)
+    # 笔记状态：pending（待提取）、extracted（待分析）、completed、failed
+    status = Column(String(20), nullable=False, default='pending')
+    title = Column(String(255), nullable=True)
+    content = Column(Text, nullable=True)
+    style_id = Column(Integer, ForeignKey('style_analysis.id'), nullable=True)
+    # 是否直接使用了已有的风格分析结果
+    cached = Column(Boolean, default=False)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<AnalysisJobNote(job_id={self.job_id}, note_index={self.note_index}, status='{self.status}')>"
+
+    def to_dict(self):
+        """
+        将对象转换为字典格式
+        """
+        return {
+            'note_index': self.note_index,
+            'url': self.url,
+            'status': self.status,
+            'title': self.title,
+            'content': self.content,
+            'style_id': self.style_id,
+            'cached': bool(self.cached),
+            'error': self.error,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 def get_database_path():
     """
     获取数据库文件路径
     """
+    # 允许通过环境变量指定数据库文件（如压测时使用临时数据库）
+    env_db_path = os.getenv('DB_PATH')
+    if env_db_path:
+        return env_db_path
     # 获取项目根目录
     project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     # 确保output目录存在
@@ -168,54 +418,167 @@ def get_database_path():
     return db_path
 
 
-def get_engine():
+def get_pool_settings():
+    """
+    读取数据库连接池配置
+
+    通过环境变量配置连接池大小、溢出连接数、回收时间和获取连接的超时时间
+
+    Returns:
+        dict: 可直接传给create_engine的连接池参数
+    """
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_pre_ping': True,
+    }
+
+
+# 进程级的引擎与会话工厂，首次使用时创建，应用关闭时通过dispose_database释放
+_engine = None
+_session_factory = None
+_async_engine = None
+_async_session_factory = None
+_engine_lock = threading.RLock()
+
+
+def create_db_engine():
     """
-    创建数据库引擎
+    创建一个新的数据库引擎（不做缓存）
     """
     db_path = get_database_path()
-    engine = create_engine(f'sqlite:///{db_path}', echo=False)
+    engine = create_engine(f'sqlite:///{db_path}', echo=False, **get_pool_settings())
     return engine
 
 
+def get_engine():
+    """
+    获取进程级共享的数据库引擎
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine()
+    return _engine
+
+
+# 已有数据库需要补充的列：(表名, 列名, 列定义)
+MIGRATION_COLUMNS = [
+    ('style_analysis', 'content_hash', 'VARCHAR(64)'),
+    ('rewrite_records', 'cache_hit', 'BOOLEAN DEFAULT 0'),
+    ('rewrite_records', 'prompt_tokens', 'INTEGER'),
+    ('rewrite_records', 'cached_tokens', 'INTEGER'),
+    ('rewrite_records', 'variant_count', 'INTEGER DEFAULT 1'),
+]
+
+# 已有数据库需要补充的索引
+MIGRATION_INDEXES = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS ix_style_analysis_content_hash ON style_analysis (content_hash)',
+    'CREATE INDEX IF NOT EXISTS ix_llm_call_logs_record ON llm_call_logs (record_type, record_id)',
+]
+
+
+def migrate_database(engine):
+    """
+    为已有数据库补充新增的列和索引
+
+    create_all只会创建缺失的表，已存在的表需要在这里手动补齐新增的列
+    """
+    inspector = inspect(engine)
+    table_names = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table_name, column_name, column_ddl in MIGRATION_COLUMNS:
+            if table_name not in table_names:
+                continue
+            columns = {column['name'] for column in inspector.get_columns(table_name)}
+            if column_name not in columns:
+                connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_ddl}'))
+        for index_ddl in MIGRATION_INDEXES:
+            connection.execute(text(index_ddl))
+
+
 def init_database():
     """
     初始化数据库
     """
     engine = get_engine()
     Base.metadata.create_all(engine)
+    migrate_database(engine)
     return engine
 
 
+def get_session_factory():
+    """
+    获取绑定到共享引擎的会话工厂
+    """
+    global _session_factory
+    if _session_factory is None:
+        with _engine_lock:
+            if _session_factory is None:
+                _session_factory = sessionmaker(bind=get_engine())
+    return _session_factory
+
+
 def get_session():
     """
     获取数据库会话
     """
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
+    Session = get_session_factory()
     session = Session()
     return session
 
 
-
-
-def get_async_engine():
+def create_db_async_engine():
     """
-    创建异步数据库引擎
+    创建一个新的异步数据库引擎（不做缓存）
     """
     db_path = get_database_path()
     # 使用aiosqlite驱动
-    async_engine = create_async_engine(f'sqlite+aiosqlite:///{db_path}', echo=False)
+    async_engine = create_async_engine(f'sqlite+aiosqlite:///{db_path}', echo=False, **get_pool_settings())
     return async_engine
 
 
+def get_async_engine():
+    """
+    获取进程级共享的异步数据库引擎
+    """
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = create_db_async_engine()
+    return _async_engine
+
+
 def get_async_session():
     """
-    获取异步数据库会话
+    获取异步数据库会话工厂
+    """
+    global _async_session_factory
+    if _async_session_factory is None:
+        with _engine_lock:
+            if _async_session_factory is None:
+                _async_session_factory = sessionmaker(
+                    bind=get_async_engine(),
+                    class_=AsyncSession,
+                    expire_on_commit=False
+                )
+    return _async_session_factory
+
+
+async def dispose_database():
+    """
+    释放共享的数据库引擎及其连接池，在应用关闭时调用
     """
-    async_engine = get_async_engine()
-    AsyncSessionLocal = sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False
-    )
-    return AsyncSessionLocal
\ No newline at end of file
+    global _engine, _session_factory, _async_engine, _async_session_factory
+    with _engine_lock:
+        engine, async_engine = _engine, _async_engine
+        _engine = _session_factory = None
+        _async_engine = _async_session_factory = None
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
@@ -0,0 +1,243 @@
+"""
+重写结果缓存模块
+按 (风格ID, 风格分析版本, 用户任务, 字数) 缓存CopycatAgent的生成结果，风格分析被原地覆盖后旧结果不再命中，
+内存层按LRU和TTL淘汰，SQLite层在重启后继续生效
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from .db_models import RewriteCacheEntry, get_session
+from backend.utils.logger import warning
+
+load_dotenv()
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class RewriteCache:
+    """
+    两级重写结果缓存
+    """
+
+    def __init__(self, enabled: bool, max_size: int, ttl: float, persist: bool, db_max_size: int):
+        """
+        初始化重写缓存
+
+        Args:
+            enabled: 是否启用缓存
+            max_size: 内存层最多缓存的条数
+            ttl: 缓存有效期（秒）
+            persist: 是否启用SQLite持久化层
+            db_max_size: SQLite层最多保留的条数
+        """
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist = persist
+        self.db_max_size = db_max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "bypasses": 0,
+            "evictions": 0,
+            "db_errors": 0,
+        }
+
+    @staticmethod
+    def style_version(style_analysis) -> str:
+        """
+        计算风格分析的版本，取决于重写提示词用到的风格字段和样本
+
+        Args:
+            style_analysis: 风格分析记录
+
+        Returns:
+            str: 版本哈希
+        """
+        raw = "\n".join(str(getattr(style_analysis, field, None) or '') for field in (
+            'style_name', 'feature_desc', 'category', 'sample_content'
+        ))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def make_key(style_id: int, user_task: str, word_count: str, style_version: Optional[str] = None) -> str:
+        """
+        计算缓存键
+
+        Args:
+            style_id: 风格ID
+            user_task: 用户任务描述
+            word_count: 字数要求
+            style_version: 风格分析版本，风格分析更新后键随之变化
+
+        Returns:
+            str: 缓存键
+        """
+        raw = f"{style_id}\n{style_version or ''}\n{(word_count or '').strip()}\n{(user_task or '').strip()}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def record_bypass(self):
+        """
+        记录一次绕过缓存的请求
+        """
+        with self._lock:
+            self._stats["bypasses"] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存，先查内存层，未命中再查SQLite层并回填内存层；SQLite层读取出错时记为未命中
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[Dict[str, Any]]: 包含title, content, tags的字典，未命中返回None
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+
+        value = None
+        if self.persist:
+            try:
+                value = self._db_get(key)
+            except Exception as e:
+                warning(f"读取重写缓存失败，按未命中处理: {str(e)}")
+                with self._lock:
+                    self._stats["db_errors"] += 1
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["db_hits"] += 1
+            stored_at, value = value
+            self._memory_set(key, value, stored_at)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 包含title, content, tags的字典
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._memory_set(key, value, time.time())
+        if self.persist:
+            self._db_set(key, value)
+
+    def _memory_set(self, key: str, value: Dict[str, Any], stored_at: float):
+        """
+        写入内存层，超出容量时淘汰最久未使用的条目（调用方需持有锁）
+        """
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _db_get(self, key: str) -> Optional[tuple]:
+        """
+        从SQLite层读取未过期的缓存
+        """
+        session = get_session()
+        try:
+            entry = session.query(RewriteCacheEntry).filter(RewriteCacheEntry.cache_key == key).first()
+            if not entry:
+                return None
+            if entry.created_at < datetime.now() - timedelta(seconds=self.ttl):
+                session.delete(entry)
+                session.commit()
+                return None
+            value = {
+                "title": entry.generated_title,
+                "content": entry.generated_content,
+                "tags": entry.generated_tags,
+            }
+            return entry.created_at.timestamp(), value
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def _db_set(self, key: str, value: Dict[str, Any]):
+        """
+        写入SQLite层，并清理过期和超出容量的条目
+        """
+        session = get_session()
+        try:
+            entry = session.query(RewriteCacheEntry).filter(RewriteCacheEntry.cache_key == key).first()
+            if entry is None:
+                entry = RewriteCacheEntry(cache_key=key)
+                session.add(entry)
+            entry.generated_title = value["title"]
+            entry.generated_content = value["content"]
+            entry.generated_tags = value.get("tags")
+            entry.created_at = datetime.now()
+            session.flush()
+
+            # 淘汰过期条目和超出容量的最旧条目
+            expire_before = datetime.now() - timedelta(seconds=self.ttl)
+            session.query(RewriteCacheEntry).filter(RewriteCacheEntry.created_at < expire_before).delete()
+            stale_ids = [
+                row.id for row in session.query(RewriteCacheEntry.id)
+                .order_by(RewriteCacheEntry.created_at.desc())
+                .offset(self.db_max_size)
+                .all()
+            ]
+            if stale_ids:
+                session.query(RewriteCacheEntry).filter(RewriteCacheEntry.id.in_(stale_ids)).delete()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._entries)
+        stats["enabled"] = self.enabled
+        stats["hits"] = stats["memory_hits"] + stats["db_hits"]
+        return stats
+
+
+# 创建全局重写缓存实例，默认关闭，通过环境变量开启
+rewrite_cache = RewriteCache(
+    enabled=_env_flag('REWRITE_CACHE_ENABLED', 'false'),
+    max_size=int(os.getenv('REWRITE_CACHE_MAX_SIZE', '256')),
+    ttl=float(os.getenv('REWRITE_CACHE_TTL', '3600')),
+    persist=_env_flag('REWRITE_CACHE_PERSIST', 'true'),
+    db_max_size=int(os.getenv('REWRITE_CACHE_DB_MAX_SIZE', '5000')),
+)
@@ -0,0 +1,345 @@
+"""
+风格去重聚类服务
+将风格名称和特征描述向量化后做增量聚类，维护风格到规范风格的映射表，
+列表与关联接口可以按规范风格去重
+"""
+
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, or_, select
+
+from .db_models import StyleAnalysis, StyleCanonicalMapping, get_session
+from backend.utils.text_vector import embed_text, DEFAULT_VECTOR_DIM
+from backend.utils.logger import info
+
+load_dotenv()
+
+# 与规范风格的相似度不低于该值时归入同一聚类
+STYLE_DEDUP_THRESHOLD = float(os.getenv('STYLE_DEDUP_THRESHOLD', '0.7'))
+# 是否只在同一分类内合并风格
+STYLE_DEDUP_SAME_CATEGORY = os.getenv('STYLE_DEDUP_SAME_CATEGORY', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# 每批处理的新风格数与向量维度
+STYLE_DEDUP_BATCH_SIZE = int(os.getenv('STYLE_DEDUP_BATCH_SIZE', '500'))
+STYLE_DEDUP_DIM = int(os.getenv('STYLE_DEDUP_DIM', str(DEFAULT_VECTOR_DIM)))
+
+
+# 参与聚类的风格字段，任一字段变化后风格需要重新聚类
+CLUSTER_FIELDS = ('style_name', 'feature_desc', 'category')
+
+
+def cluster_fields_changed(style: StyleAnalysis, fields: Dict[str, Any]) -> bool:
+    """
+    判断更新是否会改变参与聚类的风格字段
+
+    Args:
+        style: 更新前的风格分析记录
+        fields: 要更新的字段
+
+    Returns:
+        bool: 是否有参与聚类的字段发生变化
+    """
+    return any(key in fields and fields[key] != getattr(style, key) for key in CLUSTER_FIELDS)
+
+
+def invalidate_mapping_statement(style_id: int):
+    """
+    构造删除风格映射的语句，用于风格内容被原地更新时，同步与异步会话都可以执行
+
+    同时删除以该风格为规范风格的聚类成员的映射，下次增量聚类时这些风格重新归类
+
+    Args:
+        style_id: 被更新的风格ID
+
+    Returns:
+        Delete: 删除语句
+    """
+    return delete(StyleCanonicalMapping).where(or_(
+        StyleCanonicalMapping.style_id == style_id,
+        StyleCanonicalMapping.canonical_style_id == style_id
+    ))
+
+
+def style_text(style_name: str, feature_desc: str) -> str:
+    """
+    拼接用于聚类的风格文本，风格名称重复一次以提高其权重
+    """
+    return f"{style_name}\n{style_name}\n{feature_desc}"
+
+
+class StyleClusterService:
+    """
+    风格去重聚类服务类
+
+    采用单遍领袖聚类：按ID顺序处理尚未映射的风格，与已有规范风格的相似度达到阈值时归入最相似的聚类，
+    否则成为新的规范风格。每次只读取新风格和规范风格，已映射的普通风格不再参与计算；
+    风格内容被更新时删除其映射（是规范风格时连同聚类成员的映射），使其在下次增量聚类时重新归类
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def cluster_new_styles(self, threshold: float = STYLE_DEDUP_THRESHOLD,
+                           batch_size: int = STYLE_DEDUP_BATCH_SIZE) -> Dict[str, int]:
+        """
+        对尚未映射的风格做增量聚类并写入映射表
+
+        规范风格或风格本身已被删除的映射会先被清除，相关风格重新参与聚类
+
+        Args:
+            threshold: 归入已有聚类的最低余弦相似度
+            batch_size: 每批处理的新风格数
+
+        Returns:
+            Dict[str, int]: processed、merged、new_canonical、canonical_styles统计
+        """
+        with self._lock:
+            session = get_session()
+            try:
+                self._remove_orphaned_mappings(session)
+
+                canonical_rows = session.query(
+                    StyleAnalysis.id, StyleAnalysis.style_name, StyleAnalysis.feature_desc, StyleAnalysis.category
+                ).join(
+                    StyleCanonicalMapping, StyleCanonicalMapping.style_id == StyleAnalysis.id
+                ).filter(
+                    StyleCanonicalMapping.canonical_style_id == StyleCanonicalMapping.style_id
+                ).all()
+                canonical_ids = [row.id for row in canonical_rows]
+                canonical_categories = [row.category for row in canonical_rows]
+                canonical_vectors = np.array(
+                    [embed_text(style_text(row.style_name, row.feature_desc), STYLE_DEDUP_DIM) for row in canonical_rows],
+                    dtype=np.float32
+                ).reshape(len(canonical_rows), STYLE_DEDUP_DIM)
+
+                stats = {"processed": 0, "merged": 0, "new_canonical": 0}
+                while True:
+                    new_rows = session.query(
+                        StyleAnalysis.id, StyleAnalysis.style_name, StyleAnalysis.feature_desc, StyleAnalysis.category
+                    ).outerjoin(
+                        StyleCanonicalMapping, StyleCanonicalMapping.style_id == StyleAnalysis.id
+                    ).filter(
+                        StyleCanonicalMapping.style_id.is_(None)
+                    ).order_by(StyleAnalysis.id).limit(batch_size).all()
+                    if not new_rows:
+                        break
+
+                    mappings, canonical_vectors = self._cluster_batch(
+                        new_rows, canonical_ids, canonical_categories, canonical_vectors, threshold
+                    )
+                    session.add_all(mappings)
+                    session.commit()
+                    for mapping in mappings:
+                        if mapping.style_id == mapping.canonical_style_id:
+                            stats["new_canonical"] += 1
+                        else:
+                            stats["merged"] += 1
+                    stats["processed"] += len(new_rows)
+                stats["canonical_styles"] = len(canonical_ids)
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
+
+        if stats["processed"]:
+            info(f"风格去重完成，新处理{stats['processed']}条，合并{stats['merged']}条，"
+                 f"新增规范风格{stats['new_canonical']}个，共{stats['canonical_styles']}个规范风格")
+        return stats
+
+    @staticmethod
+    def _cluster_batch(rows, canonical_ids: List[int], canonical_categories: List[Optional[str]],
+                       canonical_vectors: np.ndarray, threshold: float):
+        """
+        对一批新风格聚类，先用矩阵乘法一次算出与已有规范风格的相似度，
+        再按顺序与本批中新产生的规范风格比较
+
+        Returns:
+            Tuple[List[StyleCanonicalMapping], np.ndarray]: 映射记录及追加了新规范风格后的向量矩阵
+        """
+        vectors = np.array(
+            [embed_text(style_text(row.style_name, row.feature_desc), STYLE_DEDUP_DIM) for row in rows],
+            dtype=np.float32
+        )
+        existing_count = len(canonical_ids)
+        similarities = vectors @ canonical_vectors.T if existing_count else np.zeros((len(rows), 0), dtype=np.float32)
+        if STYLE_DEDUP_SAME_CATEGORY and existing_count:
+            categories = np.array(canonical_categories, dtype=object)
+            for i, row in enumerate(rows):
+                similarities[i, categories != row.category] = -1.0
+
+        mappings = []
+        new_positions: List[int] = []
+        for i, row in enumerate(rows):
+            best_id, best_similarity = None, -1.0
+            if existing_count:
+                j = int(np.argmax(similarities[i]))
+                best_id, best_similarity = canonical_ids[j], float(similarities[i, j])
+            for position in new_positions:
+                if STYLE_DEDUP_SAME_CATEGORY and rows[position].category != row.category:
+                    continue
+                similarity = float(vectors[i] @ vectors[position])
+                if similarity > best_similarity:
+                    best_id, best_similarity = rows[position].id, similarity
+
+            if best_id is not None and best_similarity >= threshold:
+                mappings.append(StyleCanonicalMapping(
+                    style_id=row.id, canonical_style_id=best_id, similarity=round(best_similarity, 4)
+                ))
+            else:
+                new_positions.append(i)
+                mappings.append(StyleCanonicalMapping(style_id=row.id, canonical_style_id=row.id, similarity=1.0))
+
+        if new_positions:
+            canonical_ids.extend(rows[position].id for position in new_positions)
+            canonical_categories.extend(rows[position].category for position in new_positions)
+            canonical_vectors = np.vstack([canonical_vectors, vectors[new_positions]])
+        return mappings, canonical_vectors
+
+    @staticmethod
+    def _remove_orphaned_mappings(session):
+        """
+        清除风格或其规范风格已被删除的映射
+        """
+        existing_ids = select(StyleAnalysis.id)
+        removed = session.query(StyleCanonicalMapping).filter(
+            StyleCanonicalMapping.style_id.notin_(existing_ids)
+            | StyleCanonicalMapping.canonical_style_id.notin_(existing_ids)
+        ).delete(synchronize_session=False)
+        if removed:
+            session.commit()
+            info(f"清除{removed}条失效的风格映射")
+
+    def rebuild(self, threshold: float = STYLE_DEDUP_THRESHOLD) -> Dict[str, int]:
+        """
+        清空映射表并对全部风格重新聚类，调整阈值后使用
+
+        Args:
+            threshold: 归入已有聚类的最低余弦相似度
+
+        Returns:
+            Dict[str, int]: 聚类统计
+        """
+        with self._lock:
+            session = get_session()
+            try:
+                session.query(StyleCanonicalMapping).delete(synchronize_session=False)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
+            return self.cluster_new_styles(threshold)
+
+    @staticmethod
+    def get_canonical_style_id(style_id: int) -> int:
+        """
+        获取风格对应的规范风格ID，尚未聚类的风格返回自身
+
+        Args:
+            style_id: 风格ID
+
+        Returns:
+            int: 规范风格ID
+        """
+        session = get_session()
+        try:
+            mapping = session.get(StyleCanonicalMapping, style_id)
+            return mapping.canonical_style_id if mapping else style_id
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_canonical_styles(style_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """
+        获取规范风格列表，不含样本文案，附带聚类中的风格数量
+
+        只读取已有的映射，尚未聚类的风格视为自身的规范风格
+
+        Args:
+            style_ids: 只返回这些风格所属的规范风格，None表示全部
+
+        Returns:
+            List[Dict[str, Any]]: 规范风格列表，按聚类大小从大到小排列
+        """
+        session = get_session()
+        try:
+            if style_ids is None:
+                counts = dict(session.query(
+                    StyleCanonicalMapping.canonical_style_id, func.count(StyleCanonicalMapping.style_id)
+                ).group_by(StyleCanonicalMapping.canonical_style_id).all())
+                unmapped = session.query(StyleAnalysis.id).outerjoin(
+                    StyleCanonicalMapping, StyleCanonicalMapping.style_id == StyleAnalysis.id
+                ).filter(StyleCanonicalMapping.style_id.is_(None)).all()
+                counts.update((row.id, 1) for row in unmapped)
+            else:
+                mapped = dict(session.query(
+                    StyleCanonicalMapping.style_id, StyleCanonicalMapping.canonical_style_id
+                ).filter(StyleCanonicalMapping.style_id.in_(style_ids)).all()) if style_ids else {}
+                # 尚未聚类的风格视为自身的规范风格，只统计传入风格在各聚类中的数量
+                counts = Counter(mapped.get(style_id, style_id) for style_id in style_ids)
+            if not counts:
+                return []
+
+            styles = session.query(
+                StyleAnalysis.id, StyleAnalysis.style_name, StyleAnalysis.feature_desc,
+                StyleAnalysis.category, StyleAnalysis.created_at
+            ).filter(StyleAnalysis.id.in_(list(counts))).all()
+            result = [{
+                'id': style.id,
+                'style_name': style.style_name,
+                'feature_desc': style.feature_desc,
+                'category': style.category,
+                'member_count': counts.get(style.id, 1),
+                'created_at': style.created_at.isoformat() if style.created_at else None
+            } for style in styles]
+            result.sort(key=lambda item: (-item['member_count'], item['id']))
+            return result
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_cluster_members(canonical_style_id: int) -> List[StyleAnalysis]:
+        """
+        获取规范风格所在聚类的全部风格
+
+        Args:
+            canonical_style_id: 规范风格ID
+
+        Returns:
+            List[StyleAnalysis]: 聚类中的风格，按ID排列
+        """
+        session = get_session()
+        try:
+            return session.query(StyleAnalysis).join(
+                StyleCanonicalMapping, StyleCanonicalMapping.style_id == StyleAnalysis.id
+            ).filter(
+                StyleCanonicalMapping.canonical_style_id == canonical_style_id
+            ).order_by(StyleAnalysis.id).all()
+        finally:
+            session.close()
+
+
+# 创建全局服务实例
+style_cluster_service = StyleClusterService()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="增量聚类风格分析记录，维护规范风格映射表")
+    parser.add_argument("--rebuild", action="store_true", help="清空映射表后对全部风格重新聚类")
+    parser.add_argument("--threshold", type=float, default=STYLE_DEDUP_THRESHOLD, help="归入已有聚类的最低余弦相似度")
+    args = parser.parse_args()
+
+    from .db_models import init_database
+    init_database()
+    if args.rebuild:
+        print(style_cluster_service.rebuild(args.threshold))
+    else:
+        print(style_cluster_service.cluster_new_styles(args.threshold))
@@ -3,9 +3,12 @@
 提供对风格分析结果的增删改查操作
 """
 
-from .db_models import StyleAnalysis, RewriteRecord, get_session, get_async_session
-from typing import List, Optional
+from .db_models import StyleAnalysis, RewriteRecord, RewriteVariantRecord, get_session, get_async_session
+from .style_cluster_service import cluster_fields_changed, invalidate_mapping_statement
+from typing import Any, Dict, List, Optional
+import json
 from sqlalchemy.future import select
+from sqlalchemy.exc import IntegrityError
 
 
 class StyleAnalysisService:
@@ -15,7 +18,8 @@ class StyleAnalysisService:
     
     @staticmethod
     def create_style_analysis(style_name: str, feature_desc: str, category: str, 
-                            sample_title: str = None, sample_content: str = None) -> StyleAnalysis:
+                            sample_title: str = None, sample_content: str = None,
+                            content_hash: str = None) -> StyleAnalysis:
         """
         创建新的风格分析记录
         
@@ -25,6 +29,7 @@ class StyleAnalysisService:
             category: 分类
             sample_title: 样本文案标题
             sample_content: 样本文案内容
+            content_hash: 归一化样本内容的哈希
             
         Returns:
             StyleAnalysis: 创建的风格分析对象
@@ -36,7 +41,8 @@ class StyleAnalysisService:
                 feature_desc=feature_desc,
                 category=category,
                 sample_title=sample_title,
-                sample_content=sample_content
+                sample_content=sample_content,
+                content_hash=content_hash
             )
             session.add(style_analysis)
             session.commit()
@@ -50,7 +56,8 @@ class StyleAnalysisService:
     
     @staticmethod
     async def create_style_analysis_async(style_name: str, feature_desc: str, category: str, 
-                                        sample_title: str = None, sample_content: str = None) -> StyleAnalysis:
+                                        sample_title: str = None, sample_content: str = None,
+                                        content_hash: str = None) -> StyleAnalysis:
         """
         异步创建新的风格分析记录
         
@@ -60,6 +67,7 @@ class StyleAnalysisService:
             category: 分类
             sample_title: 样本文案标题
             sample_content: 样本文案内容
+            content_hash: 归一化样本内容的哈希
             
         Returns:
             StyleAnalysis: 创建的风格分析对象
@@ -72,7 +80,8 @@ class StyleAnalysisService:
                     feature_desc=feature_desc,
                     category=category,
                     sample_title=sample_title,
-                    sample_content=sample_content
+                    sample_content=sample_content,
+                    content_hash=content_hash
                 )
                 session.add(style_analysis)
                 await session.commit()
@@ -119,6 +128,99 @@ class StyleAnalysisService:
             except Exception as e:
                 raise e
     
+    @staticmethod
+    def get_style_analysis_by_content_hash(content_hash: str) -> Optional[StyleAnalysis]:
+        """
+        根据归一化内容哈希获取风格分析记录
+        
+        Args:
+            content_hash: 归一化样本内容的哈希
+            
+        Returns:
+            StyleAnalysis: 风格分析对象，如果未找到则返回None
+        """
+        session = get_session()
+        try:
+            return session.query(StyleAnalysis).filter(StyleAnalysis.content_hash == content_hash).first()
+        finally:
+            session.close()
+    
+    @staticmethod
+    async def get_style_analysis_by_content_hash_async(content_hash: str) -> Optional[StyleAnalysis]:
+        """
+        异步根据归一化内容哈希获取风格分析记录
+        
+        Args:
+            content_hash: 归一化样本内容的哈希
+            
+        Returns:
+            StyleAnalysis: 风格分析对象，如果未找到则返回None
+        """
+        async_session = get_async_session()
+        async with async_session() as session:
+            try:
+                stmt = select(StyleAnalysis).where(StyleAnalysis.content_hash == content_hash)
+                result = await session.execute(stmt)
+                return result.scalar_one_or_none()
+            except Exception as e:
+                raise e
+    
+    @staticmethod
+    def save_style_analysis_by_content_hash(content_hash: str, style_name: str, feature_desc: str, category: str,
+                                            sample_title: str = None, sample_content: str = None) -> StyleAnalysis:
+        """
+        按归一化内容哈希保存风格分析记录，已存在相同哈希的记录时更新分析结果，
+        分析结果变化时删除其风格去重映射以便重新聚类
+        
+        Args:
+            content_hash: 归一化样本内容的哈希
+            style_name: 风格名称
+            feature_desc: 风格特征描述
+            category: 分类
+            sample_title: 样本文案标题
+            sample_content: 样本文案内容
+            
+        Returns:
+            StyleAnalysis: 创建或更新后的风格分析对象
+        """
+        fields = {
+            'style_name': style_name,
+            'feature_desc': feature_desc,
+            'category': category,
+            'sample_title': sample_title,
+            'sample_content': sample_content,
+        }
+        session = get_session()
+        try:
+            style_analysis = session.query(StyleAnalysis).filter(StyleAnalysis.content_hash == content_hash).first()
+            if style_analysis:
+                if cluster_fields_changed(style_analysis, fields):
+                    session.execute(invalidate_mapping_statement(style_analysis.id))
+                for key, value in fields.items():
+                    setattr(style_analysis, key, value)
+            else:
+                style_analysis = StyleAnalysis(content_hash=content_hash, **fields)
+                session.add(style_analysis)
+            session.commit()
+            session.refresh(style_analysis)
+            return style_analysis
+        except IntegrityError:
+            # 并发写入了相同哈希的记录，改为更新该记录
+            session.rollback()
+            style_analysis = session.query(StyleAnalysis).filter(StyleAnalysis.content_hash == content_hash).first()
+            if cluster_fields_changed(style_analysis, fields):
+                session.execute(invalidate_mapping_statement(style_analysis.id))
+            for key, value in fields.items():
+                setattr(style_analysis, key, value)
+            session.commit()
+            session.refresh(style_analysis)
+            return style_analysis
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
     @staticmethod
     def get_all_style_analyses() -> List[StyleAnalysis]:
         """
@@ -203,6 +305,8 @@ class StyleAnalysisService:
         try:
             style_analysis = session.query(StyleAnalysis).filter(StyleAnalysis.id == analysis_id).first()
             if style_analysis:
+                if cluster_fields_changed(style_analysis, kwargs):
+                    session.execute(invalidate_mapping_statement(analysis_id))
                 for key, value in kwargs.items():
                     if hasattr(style_analysis, key):
                         setattr(style_analysis, key, value)
@@ -235,6 +339,8 @@ class StyleAnalysisService:
                 style_analysis = result.scalar_one_or_none()
                 
                 if style_analysis:
+                    if cluster_fields_changed(style_analysis, kwargs):
+                        await session.execute(invalidate_mapping_statement(analysis_id))
                     for key, value in kwargs.items():
                         if hasattr(style_analysis, key):
                             setattr(style_analysis, key, value)
@@ -306,7 +412,9 @@ class RewriteRecordService:
     @staticmethod
     def create_rewrite_record(style_name: str, user_task: str, word_count: str,
                             generated_title: str, generated_content: str, 
-                            generated_tags: str = None, execution_time: str = None) -> RewriteRecord:
+                            generated_tags: str = None, execution_time: str = None,
+                            cache_hit: bool = False, prompt_tokens: int = None,
+                            cached_tokens: int = None) -> RewriteRecord:
         """
         创建新的文稿二创执行记录
         
@@ -318,6 +426,9 @@ class RewriteRecordService:
             generated_content: 生成的内容
             generated_tags: 生成的标签
             execution_time: 执行时间（秒）
+            cache_hit: 是否由重写缓存直接返回
+            prompt_tokens: 模型返回的输入token数
+            cached_tokens: 输入中命中提示词缓存的token数
             
         Returns:
             RewriteRecord: 创建的文稿二创执行记录对象
@@ -331,7 +442,10 @@ class RewriteRecordService:
                 generated_title=generated_title,
                 generated_content=generated_content,
                 generated_tags=generated_tags,
-                execution_time=execution_time
+                execution_time=execution_time,
+                cache_hit=cache_hit,
+                prompt_tokens=prompt_tokens,
+                cached_tokens=cached_tokens
             )
             session.add(rewrite_record)
             session.commit()
@@ -346,7 +460,9 @@ class RewriteRecordService:
     @staticmethod
     async def create_rewrite_record_async(style_name: str, user_task: str, word_count: str,
                                         generated_title: str, generated_content: str,
-                                        generated_tags: str = None, execution_time: str = None) -> RewriteRecord:
+                                        generated_tags: str = None, execution_time: str = None,
+                                        cache_hit: bool = False, prompt_tokens: int = None,
+                                        cached_tokens: int = None) -> RewriteRecord:
         """
         异步创建新的文稿二创执行记录
         
@@ -358,6 +474,9 @@ class RewriteRecordService:
             generated_content: 生成的内容
             generated_tags: 生成的标签
             execution_time: 执行时间（秒）
+            cache_hit: 是否由重写缓存直接返回
+            prompt_tokens: 模型返回的输入token数
+            cached_tokens: 输入中命中提示词缓存的token数
             
         Returns:
             RewriteRecord: 创建的文稿二创执行记录对象
@@ -372,7 +491,10 @@ class RewriteRecordService:
                     generated_title=generated_title,
                     generated_content=generated_content,
                     generated_tags=generated_tags,
-                    execution_time=execution_time
+                    execution_time=execution_time,
+                    cache_hit=cache_hit,
+                    prompt_tokens=prompt_tokens,
+                    cached_tokens=cached_tokens
                 )
                 session.add(rewrite_record)
                 await session.commit()
@@ -382,6 +504,86 @@ class RewriteRecordService:
                 await session.rollback()
                 raise e
     
+    @staticmethod
+    def create_rewrite_record_with_variants(style_name: str, user_task: str, word_count: str,
+                                            variants: List[Dict[str, Any]], execution_time: str = None,
+                                            prompt_tokens: int = None, cached_tokens: int = None) -> RewriteRecord:
+        """
+        在一个事务中创建多候选重写的父记录和全部候选
+        
+        父记录保存被选中的候选内容，保持与单候选记录相同的字段含义
+        
+        Args:
+            style_name: 风格名称
+            user_task: 用户任务描述
+            word_count: 字数要求
+            variants: 候选列表，每项包含index, title, content, tags, score, scores, selected
+            execution_time: 执行时间（秒）
+            prompt_tokens: 模型返回的输入token数
+            cached_tokens: 输入中命中提示词缓存的token数
+            
+        Returns:
+            RewriteRecord: 创建的父记录
+        """
+        selected = next((variant for variant in variants if variant.get('selected')), variants[0])
+        session = get_session()
+        try:
+            rewrite_record = RewriteRecord(
+                style_name=style_name,
+                user_task=user_task,
+                word_count=word_count,
+                generated_title=selected['title'],
+                generated_content=selected['content'],
+                generated_tags=selected.get('tags'),
+                execution_time=execution_time,
+                prompt_tokens=prompt_tokens,
+                cached_tokens=cached_tokens,
+                variant_count=len(variants)
+            )
+            session.add(rewrite_record)
+            session.flush()
+            for variant in variants:
+                session.add(RewriteVariantRecord(
+                    record_id=rewrite_record.id,
+                    variant_index=variant['index'],
+                    generated_title=variant['title'],
+                    generated_content=variant['content'],
+                    generated_tags=variant.get('tags'),
+                    score=variant.get('score'),
+                    score_detail=json.dumps(variant.get('scores') or {}, ensure_ascii=False),
+                    selected=bool(variant.get('selected'))
+                ))
+            session.commit()
+            session.refresh(rewrite_record)
+            return rewrite_record
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    @staticmethod
+    def get_rewrite_variants(record_id: int) -> List[RewriteVariantRecord]:
+        """
+        获取执行记录下的全部候选文案
+        
+        Args:
+            record_id: 父记录ID
+            
+        Returns:
+            List[RewriteVariantRecord]: 候选列表，按得分从高到低排列
+        """
+        session = get_session()
+        try:
+            return (
+                session.query(RewriteVariantRecord)
+                .filter(RewriteVariantRecord.record_id == record_id)
+                .order_by(RewriteVariantRecord.score.desc())
+                .all()
+            )
+        finally:
+            session.close()
+    
     @staticmethod
     def get_rewrite_record_by_id(record_id: int) -> Optional[RewriteRecord]:
         """
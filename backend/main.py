@@ -18,9 +18,17 @@ if project_root not in sys.path:
 from utils import info, error
 
 # 导入API路由
-from api.routes import  style_router,rewrite_router,topic_router
-# 导入数据库初始化函数
-from db.db_models import init_database
+from api.routes import  style_router,rewrite_router,topic_router,stats_router
+from api.services.analysis_job_service import analysis_job_queue
+# 导入数据库初始化函数（与服务层共用同一模块，保证连接池为进程级单例）
+from backend.db.db_models import init_database, get_async_engine, dispose_database
+# 导入重写缓存
+from backend.db import rewrite_cache
+# 导入Agent工厂
+from backend.agent import agent_factory, warm_up_agents, llm_executor, get_stream_stats, llm_single_flight, model_router, llm_scheduler
+from backend.agent import example_index, load_example_index
+from backend.agent.fake_llm import fake_llm_backend
+from backend.rpa import browser_pool, extraction_stats, resource_filter, http_note_extractor
 
 
 @asynccontextmanager
@@ -29,12 +37,32 @@ async def lifespan(app: FastAPI):
     info("正在初始化数据库...")
     try:
         init_database()
+        # 预先创建异步引擎，同步与异步服务共用进程级连接池
+        get_async_engine()
         info("数据库初始化成功!")
     except Exception as e:
         error(f"数据库初始化失败: {e}")
         raise e
+    # 预热Agent提示词模板
+    warm_up_agents()
+    # 加载范文向量索引，补充索引中缺失的记录
+    load_example_index()
+    # 预先启动浏览器池，提取笔记时复用浏览器和已登录的上下文
+    await browser_pool.start()
+    # 启动URL分析后台任务队列，继续执行上次未完成的任务
+    await analysis_job_queue.start()
     yield
-    # 应用关闭时的清理工作（如果需要）
+    # 应用关闭时停止后台任务、浏览器池和HTTP提取客户端，释放LLM线程池和数据库连接池，并将范文索引写入快照
+    await analysis_job_queue.stop()
+    await browser_pool.stop()
+    await http_note_extractor.close()
+    llm_executor.shutdown()
+    try:
+        example_index.save()
+    except OSError as e:
+        error(f"保存范文索引失败: {e}")
+    await dispose_database()
+    info("数据库连接池已释放")
 
 
 # 创建FastAPI应用实例，使用lifespan替代on_event
@@ -58,6 +86,7 @@ app.add_middleware(
 app.include_router(style_router)
 app.include_router(rewrite_router)
 app.include_router(topic_router)  # 添加选题管理路由
+app.include_router(stats_router)  # LLM调用统计路由
 
 @app.get("/")
 async def root():
@@ -67,6 +96,24 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "agents": agent_factory.get_stats(),
+        "llm_executor": llm_executor.get_stats(),
+        "rewrite_cache": rewrite_cache.get_stats(),
+        "rewrite_stream": get_stream_stats(),
+        "single_flight": llm_single_flight.get_stats(),
+        "model_router": model_router.get_stats(),
+        "llm_scheduler": llm_scheduler.get_stats(),
+        "fake_llm": fake_llm_backend.get_stats(),
+        "example_index": example_index.get_stats(),
+        "analysis_jobs": analysis_job_queue.get_stats(),
+        "browser_pool": browser_pool.get_stats(),
+        "note_extraction": extraction_stats.get_stats(),
+        "resource_filter": resource_filter.get_stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,3 +1,6 @@
-from .note_content import extract_note_content
+from .note_content import extract_note_content, extraction_stats
+from .browser_pool import browser_pool
+from .resource_filter import resource_filter
+from .http_extractor import http_note_extractor
 
-__all__ = ['extract_note_content']
\ No newline at end of file
+__all__ = ['extract_note_content', 'extraction_stats', 'browser_pool', 'resource_filter', 'http_note_extractor']
\ No newline at end of file
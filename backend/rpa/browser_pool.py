@@ -0,0 +1,431 @@
+"""
+Chromium浏览器池
+应用启动时预先启动浏览器并创建已设置User-Agent和Cookie的上下文，每次提取笔记时租用一个上下文，用完归还；
+上下文打开的页面数或浏览器进程内存超过上限时重建上下文，浏览器崩溃时自动重启
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import psutil
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.rpa.config import read_setting
+from backend.rpa.resource_filter import resource_filter
+from backend.utils.logger import info, warning, error
+
+load_dotenv()
+
+# 是否在应用启动时创建浏览器池，关闭时每次提取临时启动浏览器
+BROWSER_POOL_ENABLED = os.getenv('BROWSER_POOL_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# 浏览器数量与每个浏览器的上下文数量，上下文总数即可同时执行的提取请求数
+BROWSER_POOL_BROWSERS = int(os.getenv('BROWSER_POOL_BROWSERS', '1'))
+BROWSER_POOL_CONTEXTS = int(os.getenv('BROWSER_POOL_CONTEXTS', '2'))
+# 上下文累计打开的页面数达到该值后重建
+BROWSER_POOL_MAX_PAGES = int(os.getenv('BROWSER_POOL_MAX_PAGES', '50'))
+# 浏览器进程树的常驻内存（MB）超过该值时归还的上下文会被重建，0表示不限制
+BROWSER_POOL_MAX_RSS_MB = float(os.getenv('BROWSER_POOL_MAX_RSS_MB', '1024'))
+# 等待空闲上下文的超时时间（秒）
+BROWSER_POOL_ACQUIRE_TIMEOUT = float(os.getenv('BROWSER_POOL_ACQUIRE_TIMEOUT', '60'))
+
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                      "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+
+# 保留的最近等待耗时样本数
+_WAIT_SAMPLES = 1000
+
+
+def build_cookies(cookie_str: str, domain: str = ".xiaohongshu.com") -> List[Dict[str, str]]:
+    """
+    将Cookie字符串解析为Playwright的cookie对象列表
+
+    Args:
+        cookie_str: 形如 "a=1; b=2" 的Cookie字符串
+        domain: Cookie所属域名
+
+    Returns:
+        List[Dict[str, str]]: cookie对象列表
+    """
+    cookies_dict = {}
+    for cookie in cookie_str.split('; '):
+        if '=' in cookie:
+            key, value = cookie.split('=', 1)
+            cookies_dict[key] = value
+    return [
+        {"name": name, "value": value, "domain": domain, "path": "/"}
+        for name, value in cookies_dict.items()
+    ]
+
+
+def _settings_key(settings: Dict[str, Any]) -> Tuple[str, str]:
+    return settings.get("cookie", ""), settings.get("user_agent", "") or DEFAULT_USER_AGENT
+
+
+async def new_note_context(browser, settings: Optional[Dict[str, Any]] = None):
+    """
+    创建设置了User-Agent和Cookie的浏览器上下文，并注册无关资源拦截
+
+    Args:
+        browser: Playwright浏览器
+        settings: 包含cookie和user_agent的设置，默认读取rpa配置
+
+    Returns:
+        BrowserContext: 浏览器上下文
+    """
+    cookie_str, user_agent = _settings_key(settings if settings is not None else read_setting())
+    # 拦截请求时阻止Service Worker，避免其发出的请求绕过路由
+    context = await browser.new_context(service_workers="block" if resource_filter.enabled else "allow")
+    await resource_filter.install(context)
+    # 设置用户代理，模拟真实浏览器
+    await context.set_extra_http_headers({"User-Agent": user_agent})
+    if cookie_str:
+        await context.add_cookies(build_cookies(cookie_str))
+    return context
+
+
+def _is_chromium(process: Optional[psutil.Process]) -> bool:
+    if process is None:
+        return False
+    name = process.name().lower()
+    return 'chrom' in name or 'headless_shell' in name
+
+
+def _chromium_root_pids() -> Set[int]:
+    """
+    获取本进程启动的全部浏览器主进程PID（渲染等子进程的父进程）
+    """
+    pids = set()
+    try:
+        processes = psutil.Process().children(recursive=True)
+    except psutil.Error:
+        return pids
+    for process in processes:
+        try:
+            if _is_chromium(process) and not _is_chromium(process.parent()):
+                pids.add(process.pid)
+        except psutil.Error:
+            continue
+    return pids
+
+
+def _process_tree_rss_mb(pid: Optional[int]) -> Optional[float]:
+    """
+    统计进程及其全部子进程的常驻内存（MB），进程不存在时返回None
+    """
+    if pid is None:
+        return None
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+
+class _BrowserSlot:
+    """池中的一个浏览器及其主进程PID，浏览器每次重启后代数加一"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.pid: Optional[int] = None
+        self.generation = 0
+
+
+class _PooledContext:
+    """池中的一个上下文，记录累计打开的页面数与待重建原因"""
+
+    def __init__(self, slot: _BrowserSlot):
+        self.slot = slot
+        self.context = None
+        # 创建上下文时浏览器的代数，与浏览器当前代数不同说明上下文已随浏览器失效
+        self.generation = 0
+        self.settings_key: Optional[Tuple[str, str]] = None
+        self.pages = 0
+        self.recycle_reason: Optional[str] = None
+
+
+class BrowserPool:
+    """
+    Chromium浏览器池
+
+    上下文放在空闲队列中按先进先出租用；归还时只判断是否需要重建，重建和清理在下次租用时进行，
+    因此请求被取消时上下文也总能回到队列。未启动时租用会临时启动一个浏览器，行为与不使用池时一致
+    """
+
+    def __init__(self, browsers: int = BROWSER_POOL_BROWSERS, contexts_per_browser: int = BROWSER_POOL_CONTEXTS,
+                 max_pages: int = BROWSER_POOL_MAX_PAGES, max_rss_mb: float = BROWSER_POOL_MAX_RSS_MB,
+                 acquire_timeout: float = BROWSER_POOL_ACQUIRE_TIMEOUT):
+        self.browsers = max(1, browsers)
+        self.contexts_per_browser = max(1, contexts_per_browser)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.acquire_timeout = acquire_timeout
+        self._playwright = None
+        self._slots: List[_BrowserSlot] = []
+        self._entries: List[_PooledContext] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._in_use = 0
+        self._peak_in_use = 0
+        # 累计租用时长与启动时间，用于计算平均利用率
+        self._busy_seconds = 0.0
+        self._started_at: Optional[float] = None
+        self._waits: deque = deque(maxlen=_WAIT_SAMPLES)
+        self._stats = {
+            "leases": 0,
+            "acquire_timeouts": 0,
+            "temporary_launches": 0,
+            "browser_restarts": 0,
+            "recycled_pages": 0,
+            "recycled_rss": 0,
+            "recycled_settings": 0,
+            "recycled_error": 0,
+        }
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    async def start(self):
+        """
+        启动浏览器并创建上下文；未安装playwright或浏览器启动失败时不启用浏览器池
+        """
+        if self.started or not BROWSER_POOL_ENABLED:
+            return
+        try:
+            from playwright.async_api import async_playwright
+        except ImportError:
+            warning("未安装playwright库，不启用浏览器池")
+            return
+
+        self._launch_lock = asyncio.Lock()
+        try:
+            self._playwright = await async_playwright().start()
+            settings = read_setting()
+            for index in range(self.browsers):
+                slot = _BrowserSlot(index)
+                async with self._launch_lock:
+                    await self._launch(slot)
+                self._slots.append(slot)
+                for _ in range(self.contexts_per_browser):
+                    entry = _PooledContext(slot)
+                    await self._open_context(entry, settings)
+                    self._entries.append(entry)
+        except Exception as e:
+            error(f"浏览器池启动失败，提取笔记时将临时启动浏览器: {str(e)}")
+            await self._close_all()
+            return
+
+        self._idle = asyncio.Queue()
+        for entry in self._entries:
+            self._idle.put_nowait(entry)
+        self._started_at = time.monotonic()
+        info(f"浏览器池已启动：{len(self._slots)}个浏览器，{len(self._entries)}个上下文")
+
+    async def stop(self):
+        """
+        关闭全部上下文和浏览器
+        """
+        if not self.started:
+            return
+        self._idle = None
+        await self._close_all()
+        info("浏览器池已关闭")
+
+    async def _close_all(self):
+        for entry in self._entries:
+            await self._close_context(entry)
+        for slot in self._slots:
+            if slot.browser is not None:
+                try:
+                    await slot.browser.close()
+                except Exception:
+                    pass
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+        self._entries = []
+        self._slots = []
+        self._playwright = None
+
+    async def _launch(self, slot: _BrowserSlot):
+        """
+        启动浏览器，并通过启动前后的进程差异找到浏览器主进程以便统计内存，调用方需持有启动锁
+        """
+        before = _chromium_root_pids()
+        slot.browser = await self._playwright.chromium.launch(headless=True)
+        new_pids = _chromium_root_pids() - before
+        slot.pid = new_pids.pop() if len(new_pids) == 1 else None
+        slot.generation += 1
+
+    async def _ensure_browser(self, slot: _BrowserSlot):
+        """
+        浏览器已断开（如崩溃）时重新启动，该浏览器上的全部上下文在下次租用时重建
+        """
+        async with self._launch_lock:
+            if slot.browser is not None and slot.browser.is_connected():
+                return
+            warning(f"浏览器{slot.index}已断开，重新启动")
+            self._stats["browser_restarts"] += 1
+            if slot.browser is not None:
+                try:
+                    await slot.browser.close()
+                except Exception:
+                    pass
+            await self._launch(slot)
+
+    async def _open_context(self, entry: _PooledContext, settings: Dict[str, Any]):
+        entry.context = await new_note_context(entry.slot.browser, settings)
+        entry.generation = entry.slot.generation
+        entry.settings_key = _settings_key(settings)
+        entry.pages = 0
+        entry.recycle_reason = None
+
+        def on_page(_page):
+            entry.pages += 1
+
+        entry.context.on("page", on_page)
+
+    @staticmethod
+    async def _close_context(entry: _PooledContext):
+        if entry.context is not None:
+            try:
+                await entry.context.close()
+            except Exception:
+                pass
+            entry.context = None
+
+    async def _prepare(self, entry: _PooledContext):
+        """
+        租出前检查上下文：浏览器已断开时重启，需要重建或配置变化时重建，否则关闭上次遗留的页面
+        """
+        settings = read_setting()
+        await self._ensure_browser(entry.slot)
+        if entry.recycle_reason is None and entry.context is not None:
+            if entry.generation != entry.slot.generation:
+                entry.recycle_reason = "error"
+            elif entry.settings_key != _settings_key(settings):
+                entry.recycle_reason = "settings"
+
+        if entry.context is None or entry.recycle_reason is not None:
+            if entry.recycle_reason is not None:
+                self._stats[f"recycled_{entry.recycle_reason}"] += 1
+            await self._close_context(entry)
+            await self._open_context(entry, settings)
+            return
+
+        for page in list(entry.context.pages):
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    def _check_release(self, entry: _PooledContext):
+        """
+        归还时判断上下文是否需要在下次租用前重建
+        """
+        if entry.recycle_reason is not None:
+            return
+        if self.max_pages and entry.pages >= self.max_pages:
+            entry.recycle_reason = "pages"
+        elif self.max_rss_mb:
+            rss = _process_tree_rss_mb(entry.slot.pid)
+            if rss is not None and rss >= self.max_rss_mb:
+                entry.recycle_reason = "rss"
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[Any]:
+        """
+        租用一个浏览器上下文，with块结束后自动归还
+
+        Yields:
+            BrowserContext: 已设置User-Agent和Cookie的浏览器上下文
+        """
+        if not self.started:
+            async with self._temporary_context() as context:
+                yield context
+            return
+
+        wait_start = time.monotonic()
+        try:
+            entry = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._stats["acquire_timeouts"] += 1
+            raise TimeoutError(f"等待空闲浏览器上下文超时（{self.acquire_timeout}秒）")
+        self._waits.append(time.monotonic() - wait_start)
+
+        idle = self._idle
+        leased_at = time.monotonic()
+        self._in_use += 1
+        self._peak_in_use = max(self._peak_in_use, self._in_use)
+        self._stats["leases"] += 1
+        try:
+            try:
+                await self._prepare(entry)
+            except Exception:
+                # 重建失败的上下文下次租用时再次重建
+                entry.recycle_reason = entry.recycle_reason or "error"
+                raise
+            yield entry.context
+        finally:
+            self._in_use -= 1
+            self._busy_seconds += time.monotonic() - leased_at
+            self._check_release(entry)
+            # 浏览器池已关闭或重启时不再放回旧队列
+            if idle is self._idle:
+                idle.put_nowait(entry)
+
+    @asynccontextmanager
+    async def _temporary_context(self) -> AsyncIterator[Any]:
+        from playwright.async_api import async_playwright
+
+        self._stats["temporary_launches"] += 1
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                yield await new_note_context(browser)
+            finally:
+                await browser.close()
+
+    def get_stats(self) -> dict:
+        waits = sorted(self._waits)
+        total = len(self._entries)
+        elapsed = time.monotonic() - self._started_at if self._started_at is not None else 0.0
+        rss = [_process_tree_rss_mb(slot.pid) for slot in self._slots]
+        return {
+            "enabled": self.started,
+            "browsers": len(self._slots),
+            "contexts": total,
+            "in_use": self._in_use,
+            "peak_in_use": self._peak_in_use,
+            "utilization": round(self._in_use / total, 3) if total else 0.0,
+            "avg_utilization": round(self._busy_seconds / (elapsed * total), 3) if total and elapsed else 0.0,
+            "wait_avg_seconds": round(sum(waits) / len(waits), 4) if waits else None,
+            "wait_p95_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else None,
+            "wait_max_seconds": round(waits[-1], 4) if waits else None,
+            "browser_rss_mb": [round(value, 1) if value is not None else None for value in rss],
+            **self._stats,
+        }
+
+
+# 创建全局浏览器池实例
+browser_pool = BrowserPool()
@@ -0,0 +1,160 @@
+"""
+笔记HTTP快速提取
+笔记页面的服务端渲染HTML中通常已内嵌window.__INITIAL_STATE__，直接用HTTP客户端请求页面并解析其中的笔记，
+无需启动浏览器；解析不到笔记时由调用方回退到浏览器提取
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.rpa.config import read_setting
+from backend.rpa.browser_pool import build_cookies, _settings_key
+from backend.utils.logger import info, warning
+
+load_dotenv()
+
+# 是否先尝试不启动浏览器的HTTP提取
+EXTRACT_HTTP_FAST_PATH = os.getenv('EXTRACT_HTTP_FAST_PATH', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# HTTP请求超时时间（秒）
+EXTRACT_HTTP_TIMEOUT = float(os.getenv('EXTRACT_HTTP_TIMEOUT', '10'))
+
+_INITIAL_STATE_PATTERN = re.compile(r'window\.__INITIAL_STATE__\s*=\s*(.+?)\s*;?\s*</script>', re.S)
+# 匹配JSON字符串或字符串之外的undefined，只替换后者
+_UNDEFINED_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|\bundefined\b')
+
+
+def parse_initial_state(html: str) -> Optional[Dict[str, Any]]:
+    """
+    从页面HTML中解析window.__INITIAL_STATE__
+
+    页面中的对象字面量会包含JSON不支持的undefined，解析前替换为null
+
+    Args:
+        html: 页面HTML
+
+    Returns:
+        Optional[Dict[str, Any]]: 解析出的状态对象，页面中没有或无法解析时返回None
+    """
+    match = _INITIAL_STATE_PATTERN.search(html)
+    if not match:
+        return None
+    text = _UNDEFINED_PATTERN.sub(lambda m: m.group(0) if m.group(0).startswith('"') else 'null', match.group(1))
+    try:
+        state = json.loads(text)
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def note_from_state(state: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """
+    从__INITIAL_STATE__中读取第一篇笔记的标题和正文，与浏览器中执行的INITIAL_STATE_SCRIPT一致
+
+    Args:
+        state: 页面状态对象
+
+    Returns:
+        Optional[Dict[str, str]]: 包含title和content的字典，没有笔记时返回None
+    """
+    note_state = state.get('note')
+    note_detail_map = note_state.get('noteDetailMap') if isinstance(note_state, dict) else None
+    if not isinstance(note_detail_map, dict):
+        return None
+    for detail in note_detail_map.values():
+        if isinstance(detail, dict) and detail.get('note'):
+            note_detail = detail['note']
+            return {
+                'title': note_detail.get('title') or '',
+                'content': note_detail.get('desc') or ''
+            }
+    return None
+
+
+class HttpNoteExtractor:
+    """
+    笔记HTTP提取器，复用同一个HTTP客户端的连接，使用rpa配置中的Cookie和User-Agent
+
+    Cookie与浏览器上下文一样限定在小红书域名下，放在客户端的Cookie容器中，短链接重定向后仍会携带
+    """
+
+    def __init__(self, timeout: float = EXTRACT_HTTP_TIMEOUT):
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cookie_str: Optional[str] = None
+
+    def _get_client(self, cookie_str: str) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(follow_redirects=True, timeout=self.timeout)
+            self._cookie_str = None
+        if cookie_str != self._cookie_str:
+            # Cookie设置变更后替换客户端中的Cookie
+            self._client.cookies.clear()
+            for cookie in build_cookies(cookie_str):
+                self._client.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
+            self._cookie_str = cookie_str
+        return self._client
+
+    async def close(self):
+        """
+        关闭HTTP客户端
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def extract(self, url: str) -> Tuple[Optional[Dict[str, str]], int]:
+        """
+        请求笔记页面并从HTML中提取标题和正文
+
+        Args:
+            url: 笔记链接
+
+        Returns:
+            Tuple[Optional[Dict[str, str]], int]: 包含title和content的字典（无法提取时为None）及下载的字节数
+        """
+        cookie_str, user_agent = _settings_key(read_setting())
+        headers = {
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        }
+        response = await self._get_client(cookie_str).get(url, headers=headers)
+        downloaded = len(response.content)
+        if response.status_code != 200:
+            warning(f"HTTP提取笔记失败，状态码{response.status_code}: {url}")
+            return None, downloaded
+
+        state = parse_initial_state(response.text)
+        note = note_from_state(state) if state else None
+        if not note or not (note['title'] or note['content']):
+            return None, downloaded
+        return note, downloaded
+
+
+# 创建全局HTTP提取器实例
+http_note_extractor = HttpNoteExtractor()
+
+
+if __name__ == "__main__":
+    # 示例用法：python -m backend.rpa.http_extractor <笔记链接> ...
+    async def main(urls):
+        for url in urls:
+            started_at = time.monotonic()
+            note, downloaded = await http_note_extractor.extract(url)
+            info(f"{url}: {note}，下载{downloaded}字节，耗时{time.monotonic() - started_at:.2f}秒")
+        await http_note_extractor.close()
+
+
+    asyncio.run(main(sys.argv[1:]))
@@ -1,7 +1,13 @@
 import asyncio
+import importlib.util
 import re
 import sys
 import os
+import time
+from collections import Counter, deque
+from typing import List, Optional
+
+from dotenv import load_dotenv
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -9,139 +15,310 @@ if project_root not in sys.path:
     sys.path.append(project_root)
 
 from backend.rpa.config import read_setting
+from backend.rpa.browser_pool import browser_pool
+from backend.rpa.resource_filter import PageTraffic
+from backend.rpa.http_extractor import http_note_extractor, EXTRACT_HTTP_FAST_PATH
 from backend.utils.logger import info, error, warning
 
+load_dotenv()
+
+
+# 同时打开的页面数与单个URL的超时时间（秒）
+EXTRACT_CONCURRENCY = int(os.getenv('EXTRACT_CONCURRENCY', '4'))
+EXTRACT_URL_TIMEOUT = float(os.getenv('EXTRACT_URL_TIMEOUT', '45'))
+# 页面加载后等待笔记数据就绪的最长时间（秒），超时后仍尝试提取
+EXTRACT_READY_TIMEOUT = float(os.getenv('EXTRACT_READY_TIMEOUT', '10'))
+
+# 笔记数据就绪判断：__INITIAL_STATE__中已有笔记详情返回state，标题或正文元素已渲染返回dom
+READY_SCRIPT = '''() => {
+    const state = window.__INITIAL_STATE__;
+    const noteDetailMap = state && state.note && state.note.noteDetailMap;
+    if (noteDetailMap && Object.keys(noteDetailMap).some(key => noteDetailMap[key] && noteDetailMap[key].note)) {
+        return 'state';
+    }
+    if (document.querySelector('h1.title') || document.querySelector('div.desc')) {
+        return 'dom';
+    }
+    return false;
+}'''
+
+# 从页面的__INITIAL_STATE__中读取第一篇笔记的标题和正文
+INITIAL_STATE_SCRIPT = '''() => {
+    try {
+        // 尝试从页面中获取笔记数据
+        const initialState = window.__INITIAL_STATE__;
+        if (!initialState || !initialState.note || !initialState.note.noteDetailMap) {
+            return null;
+        }
+
+        // 获取noteDetailMap中的第一个笔记对象
+        const noteDetailMap = initialState.note.noteDetailMap;
+        let noteDetail = null;
+
+        // 遍历noteDetailMap获取第一个笔记详情
+        for (const key in noteDetailMap) {
+            if (noteDetailMap.hasOwnProperty(key) && noteDetailMap[key].note) {
+                noteDetail = noteDetailMap[key].note;
+                break;
+            }
+        }
+
+        if (!noteDetail) {
+            return null;
+        }
+
+        return {
+            title: noteDetail.title || '',
+            content: noteDetail.desc || ''
+        };
+    } catch (error) {
+        console.error('解析笔记数据时出错:', error);
+        return null;
+    }
+}'''
+
+
+class ExtractionStats:
+    """
+    记录每个链接从开始加载到笔记数据就绪的耗时、下载的字节数及使用的提取方式
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self._samples: deque = deque(maxlen=max_samples)
+        # HTTP提取失败后回退到浏览器的链接数
+        self._http_fallbacks = 0
+
+    def record(self, url: str, signal: str, load_seconds: float, ready_seconds: float, total_seconds: float,
+               traffic: Optional[dict] = None, path: str = 'browser'):
+        """
+        记录一个链接的提取耗时
+
+        Args:
+            url: 笔记链接
+            signal: 就绪信号，state、dom或timeout
+            load_seconds: 页面加载到DOMContentLoaded的耗时
+            ready_seconds: DOMContentLoaded到笔记数据就绪的耗时
+            total_seconds: 从开始加载到提取完成的耗时
+            traffic: 页面的请求数、失败请求数与下载字节数
+            path: 提取方式，http或browser
+        """
+        traffic = traffic or {}
+        self._samples.append({
+            'url': url,
+            'path': path,
+            'signal': signal,
+            'load_seconds': round(load_seconds, 3),
+            'ready_seconds': round(ready_seconds, 3),
+            'total_seconds': round(total_seconds, 3),
+            'requests': traffic.get('requests', 0),
+            'failed_requests': traffic.get('failed', 0),
+            'bytes': traffic.get('bytes', 0),
+        })
+
+    def record_fallback(self):
+        """
+        记录一次HTTP提取失败后回退到浏览器
+        """
+        self._http_fallbacks += 1
+
+    @staticmethod
+    def _percentile(values, pct: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+    def get_stats(self) -> dict:
+        samples = list(self._samples)
+        stats = {
+            "samples": len(samples),
+            "paths": dict(Counter(sample['path'] for sample in samples)),
+            "http_fallbacks": self._http_fallbacks,
+            "signals": dict(Counter(sample['signal'] for sample in samples)),
+        }
+        for key in ('load_seconds', 'ready_seconds', 'total_seconds'):
+            values = [sample[key] for sample in samples]
+            stats[key.replace('_seconds', '_p50_seconds')] = self._percentile(values, 50)
+            stats[key.replace('_seconds', '_p95_seconds')] = self._percentile(values, 95)
+        downloaded = [sample['bytes'] for sample in samples]
+        stats["bytes_p50"] = self._percentile(downloaded, 50)
+        stats["bytes_p95"] = self._percentile(downloaded, 95)
+        stats["bytes_total"] = sum(downloaded)
+        stats["recent"] = samples[-10:]
+        return stats
+
+
+# 创建全局提取耗时统计实例
+extraction_stats = ExtractionStats()
+
+
+async def _wait_until_ready(page) -> str:
+    """
+    等待笔记数据就绪，__INITIAL_STATE__或标题、正文元素任一出现即返回
+
+    Args:
+        page: 已开始加载笔记的页面
+
+    Returns:
+        str: 就绪信号，state、dom，超过EXTRACT_READY_TIMEOUT时为timeout
+    """
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    try:
+        handle = await page.wait_for_function(READY_SCRIPT, polling='raf', timeout=EXTRACT_READY_TIMEOUT * 1000)
+        return await handle.json_value()
+    except PlaywrightTimeoutError:
+        return 'timeout'
+
+
+async def _extract_via_http(url: str) -> Optional[dict]:
+    """
+    不启动浏览器，直接请求笔记页面并解析HTML中的__INITIAL_STATE__
+
+    Args:
+        url (str): 笔记链接
+
+    Returns:
+        Optional[dict]: 包含url、title和content的字典，无法提取时返回None
+    """
+    started_at = time.monotonic()
+    try:
+        note_data, downloaded = await asyncio.wait_for(http_note_extractor.extract(url), timeout=EXTRACT_URL_TIMEOUT)
+    except Exception as e:
+        warning(f"HTTP提取笔记出错: {url}, 错误: {str(e) or type(e).__name__}")
+        return None
+    if note_data is None:
+        return None
+
+    total = time.monotonic() - started_at
+    extraction_stats.record(url, 'state', total, 0.0, total, {'requests': 1, 'bytes': downloaded}, path='http')
+    info(f"通过HTTP提取笔记，共{total:.2f}秒，下载{downloaded / 1024:.1f}KB: {note_data['title']}")
+    return {
+        'url': url,
+        'title': note_data['title'],
+        'content': note_data['content']
+    }
+
+
+async def _extract_single_note(context, url: str) -> Optional[dict]:
+    """
+    在新页面中打开笔记链接并提取标题和内容，结束后关闭页面
+
+    Args:
+        context: 浏览器上下文
+        url (str): 笔记链接
+
+    Returns:
+        Optional[dict]: 包含url、title和content的字典，无法提取时返回None
+    """
+    page = await context.new_page()
+    traffic = PageTraffic(page)
+    try:
+        # 访问笔记页面，笔记数据内嵌在HTML中，无需等待图片等资源加载完成
+        started_at = time.monotonic()
+        await page.goto(url, timeout=30000, wait_until='domcontentloaded')
+        loaded_at = time.monotonic()
+        signal = await _wait_until_ready(page)
+        ready_at = time.monotonic()
+        if signal == 'timeout':
+            warning(f"等待笔记数据超时（{EXTRACT_READY_TIMEOUT}秒），仍尝试提取: {url}")
+
+        # 提取笔记数据
+        note_data = await page.evaluate(INITIAL_STATE_SCRIPT)
+        info(f"提取到的笔记数据: {note_data}")
+
+        # 如果通过JS无法获取数据，则尝试直接从页面元素提取
+        if not note_data:
+            # 尝试从页面元素中提取标题
+            title_element = await page.query_selector('h1.title')
+            title = await title_element.inner_text() if title_element else ''
+
+            # 尝试从页面元素中提取内容
+            content_element = await page.query_selector('div.desc')
+            content = await content_element.inner_text() if content_element else ''
+
+            if title or content:
+                cleaned_content = re.sub(r'\[话题]', '', content)
+                note_data = {
+                    'title': title,
+                    'content': cleaned_content
+                }
+
+        total = time.monotonic() - started_at
+        page_traffic = await traffic.summary()
+        extraction_stats.record(url, signal, loaded_at - started_at, ready_at - loaded_at, total, page_traffic)
+        info(f"笔记页面加载{loaded_at - started_at:.2f}秒，数据就绪{ready_at - loaded_at:.2f}秒（{signal}），"
+             f"共{total:.2f}秒，下载{page_traffic['bytes'] / 1024:.1f}KB: {url}")
+
+        if note_data and (note_data.get('title') or note_data.get('content')):
+            info(f"成功提取笔记: {note_data['title']}")
+            return {
+                'url': url,
+                'title': note_data['title'],
+                'content': note_data['content']
+            }
+        warning(f"无法提取笔记内容: {url}")
+        return None
+    finally:
+        await page.close()
+
 
 async def extract_note_content(note_urls: str):
     """
     从小红书笔记链接中提取标题和内容
+
+    开启EXTRACT_HTTP_FAST_PATH时先直接请求页面HTML解析笔记，只有解析失败的链接才使用浏览器；
+    浏览器提取时多个链接在同一个浏览器上下文中最多同时打开EXTRACT_CONCURRENCY个页面，
+    单个链接出错或超过EXTRACT_URL_TIMEOUT秒时跳过，不影响其余链接
     
     Args:
         note_urls (str): 小红书笔记链接，多个链接用空格分隔
     
     Returns:
-        list: 包含每个笔记标题和内容的字典列表
+        list: 包含每个笔记标题和内容的字典列表，按输入链接的顺序排列
     """
-    try:
-        from playwright.async_api import async_playwright
-    except ImportError:
-        error("未安装playwright库，请运行 'pip install playwright' 安装")
-        return []
+    urls = [url for url in note_urls.split(' ') if url]
+    semaphore = asyncio.Semaphore(max(1, EXTRACT_CONCURRENCY))
 
-    urls = note_urls.split(' ')
-    notes_data = []
+    results: List[Optional[dict]] = [None] * len(urls)
+    if EXTRACT_HTTP_FAST_PATH:
 
-    async with async_playwright() as p:
-        # 启动浏览器
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context()
+        async def extract_via_http(url: str) -> Optional[dict]:
+            async with semaphore:
+                return await _extract_via_http(url)
 
-        # 读取设置中的User-Agent
-        settings = read_setting()
-        user_agent = settings.get("user_agent",
-                                  "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+        results = list(await asyncio.gather(*(extract_via_http(url) for url in urls)))
 
-        # 设置用户代理，模拟真实浏览器
-        await context.set_extra_http_headers({
-            "User-Agent": user_agent
-        })
+    browser_indexes = [index for index, note in enumerate(results) if note is None]
+    if not browser_indexes:
+        return results
+    if EXTRACT_HTTP_FAST_PATH:
+        for index in browser_indexes:
+            extraction_stats.record_fallback()
+            info(f"HTTP提取失败，回退到浏览器提取: {urls[index]}")
+
+    if importlib.util.find_spec("playwright") is None:
+        error("未安装playwright库，请运行 'pip install playwright' 安装")
+        return [note for note in results if note]
+
+    # 从浏览器池租用已设置User-Agent和Cookie的上下文，浏览器池未启动时临时启动浏览器
+    async with browser_pool.lease() as context:
+
+        async def extract(url: str) -> Optional[dict]:
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(_extract_single_note(context, url), timeout=EXTRACT_URL_TIMEOUT)
+                except asyncio.TimeoutError:
+                    error(f"处理页面超时（{EXTRACT_URL_TIMEOUT}秒）: {url}")
+                except Exception as e:
+                    error(f"处理页面时出错: {url}, 错误: {str(e)}")
+                return None
+
+        browser_results = await asyncio.gather(*(extract(urls[index]) for index in browser_indexes))
+        for index, note in zip(browser_indexes, browser_results):
+            results[index] = note
 
-        # 添加Cookie
-        cookie_str = settings.get("cookie", "")
-        if cookie_str:
-            # 解析 cookie 字符串为字典
-            cookies_dict = {}
-            for cookie in cookie_str.split('; '):
-                if '=' in cookie:
-                    key, value = cookie.split('=', 1)
-                    cookies_dict[key] = value
-
-            # 转换为 cookie 对象数组
-            cookies = [
-                {"name": name, "value": value, "domain": ".xiaohongshu.com", "path": "/"}
-                for name, value in cookies_dict.items()
-            ]
-            await context.add_cookies(cookies)
-
-        page = await context.new_page()
-
-        for url in urls:
-            try:
-                # 访问笔记页面
-                await page.goto(url, timeout=30000)
-                await page.wait_for_timeout(5000)  # 等待页面加载
-
-                # 提取笔记数据
-                note_data = await page.evaluate('''() => {
-                    try {
-                        // 尝试从页面中获取笔记数据
-                        const initialState = window.__INITIAL_STATE__;
-                        if (!initialState || !initialState.note || !initialState.note.noteDetailMap) {
-                            return null;
-                        }
-                       
-                        // 获取noteDetailMap中的第一个笔记对象
-                        const noteDetailMap = initialState.note.noteDetailMap;
-                        let noteDetail = null;
-        
-                        // 遍历noteDetailMap获取第一个笔记详情
-                        for (const key in noteDetailMap) {
-                            if (noteDetailMap.hasOwnProperty(key) && noteDetailMap[key].note) {
-                                noteDetail = noteDetailMap[key].note;
-                                break;
-                            }
-                        }
-                        
-                        if (!noteDetail) {
-                            return null;
-                        }
-                        
-                        return {
-                            title: noteDetail.title || '',
-                            content: noteDetail.desc || ''
-                        };
-                    } catch (error) {
-                        console.error('解析笔记数据时出错:', error);
-                        return null;
-                    }
-                }''')
-                info(f"提取到的笔记数据: {note_data}")
-
-                # 如果通过JS无法获取数据，则尝试直接从页面元素提取
-                if not note_data:
-                    # 尝试从页面元素中提取标题
-                    title_element = await page.query_selector('h1.title')
-                    title = await title_element.inner_text() if title_element else ''
-
-                    # 尝试从页面元素中提取内容
-                    content_element = await page.query_selector('div.desc')
-                    content = await content_element.inner_text() if content_element else ''
-
-                    if title or content:
-                        import re
-                        cleaned_content = re.sub(r'\[话题]', '', content)
-                        note_data = {
-                            'title': title,
-                            'content': cleaned_content
-                        }
-
-                if note_data and (note_data.get('title') or note_data.get('content')):
-                    notes_data.append({
-                        'url': url,
-                        'title': note_data['title'],
-                        'content': note_data['content']
-                    })
-                    info(f"成功提取笔记: {note_data['title']}")
-                else:
-                    warning(f"无法提取笔记内容: {url}")
-
-            except Exception as e:
-                error(f"处理页面时出错: {url}, 错误: {str(e)}")
-                continue
-
-        await browser.close()
-
-    return notes_data
+    return [note for note in results if note]
 
 
 def read_setting():
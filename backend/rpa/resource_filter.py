@@ -0,0 +1,156 @@
+"""
+笔记页面资源过滤
+提取笔记只读取页面HTML中的__INITIAL_STATE__和标题、正文元素，在浏览器上下文上拦截请求，
+中止图片、视频、字体等无关资源类型以及非小红书域名的请求，并统计每个页面实际下载的字节数
+"""
+
+import asyncio
+import os
+import sys
+from collections import Counter
+from typing import Any, List, Set
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.utils.logger import warning
+
+load_dotenv()
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [item.strip().lower() for item in os.getenv(name, default).split(',') if item.strip()]
+
+
+# 是否拦截无关资源，关闭时页面按原样加载全部资源
+EXTRACT_BLOCK_RESOURCES = os.getenv('EXTRACT_BLOCK_RESOURCES', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# 中止的资源类型（Playwright的resource_type）
+EXTRACT_BLOCKED_RESOURCE_TYPES = _env_list('EXTRACT_BLOCKED_RESOURCE_TYPES', 'image,media,font,stylesheet')
+# 允许请求的域名（含子域名），为空表示不限制域名
+EXTRACT_ALLOWED_DOMAINS = _env_list('EXTRACT_ALLOWED_DOMAINS', 'xiaohongshu.com,xhscdn.com,xhslink.com')
+# 即使在允许列表中也要中止的域名（含子域名），如埋点与监控上报
+EXTRACT_BLOCKED_DOMAINS = _env_list('EXTRACT_BLOCKED_DOMAINS', '')
+
+
+def _match_domain(host: str, domains: List[str]) -> bool:
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class ResourceFilter:
+    """
+    浏览器上下文请求过滤器，记录放行与各原因中止的请求数
+    """
+
+    def __init__(self, enabled: bool = EXTRACT_BLOCK_RESOURCES,
+                 blocked_types: List[str] = EXTRACT_BLOCKED_RESOURCE_TYPES,
+                 allowed_domains: List[str] = EXTRACT_ALLOWED_DOMAINS,
+                 blocked_domains: List[str] = EXTRACT_BLOCKED_DOMAINS):
+        self.enabled = enabled
+        self.blocked_types: Set[str] = set(blocked_types)
+        self.allowed_domains = list(allowed_domains)
+        self.blocked_domains = list(blocked_domains)
+        self._counts: Counter = Counter()
+
+    def block_reason(self, resource_type: str, url: str) -> str:
+        """
+        判断请求是否需要中止
+
+        Args:
+            resource_type: 请求的资源类型
+            url: 请求地址
+
+        Returns:
+            str: 中止原因，resource_type、blocked_domain或third_party；放行时为空字符串
+        """
+        if resource_type in self.blocked_types:
+            return 'resource_type'
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            return ''
+        host = (parts.hostname or '').lower()
+        if _match_domain(host, self.blocked_domains):
+            return 'blocked_domain'
+        if self.allowed_domains and not _match_domain(host, self.allowed_domains):
+            return 'third_party'
+        return ''
+
+    async def install(self, context):
+        """
+        在浏览器上下文上注册请求拦截，过滤关闭时不做处理
+
+        Args:
+            context: Playwright浏览器上下文
+        """
+        if self.enabled:
+            await context.route("**/*", self._handle_route)
+
+    async def _handle_route(self, route):
+        request = route.request
+        reason = self.block_reason(request.resource_type, request.url)
+        self._counts[reason or 'allowed'] += 1
+        try:
+            if reason:
+                await route.abort()
+            else:
+                await route.continue_()
+        except Exception as e:
+            # 页面已关闭时路由无法再处理，忽略即可
+            warning(f"处理请求拦截失败: {request.url}, {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "allowed": self._counts.get('allowed', 0),
+            "blocked": {
+                reason: self._counts.get(reason, 0)
+                for reason in ('resource_type', 'blocked_domain', 'third_party')
+            },
+        }
+
+
+class PageTraffic:
+    """
+    统计单个页面完成的请求数、失败（含被中止）的请求数与下载字节数（响应头加编码后的响应体）
+    """
+
+    def __init__(self, page):
+        self.requests = 0
+        self.failed = 0
+        self._sizes: List[asyncio.Task] = []
+        page.on("requestfinished", self._on_finished)
+        page.on("requestfailed", self._on_failed)
+
+    def _on_finished(self, request: Any):
+        self.requests += 1
+        self._sizes.append(asyncio.ensure_future(self._response_bytes(request)))
+
+    @staticmethod
+    async def _response_bytes(request: Any) -> int:
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            # 页面关闭后无法再获取大小
+            return 0
+        return sizes.get('responseHeadersSize', 0) + sizes.get('responseBodySize', 0)
+
+    def _on_failed(self, request: Any):
+        self.failed += 1
+
+    async def summary(self) -> dict:
+        """
+        汇总页面流量，需在关闭页面前调用
+
+        Returns:
+            dict: requests、failed与bytes
+        """
+        total = sum(await asyncio.gather(*self._sizes))
+        return {"requests": self.requests, "failed": self.failed, "bytes": total}
+
+
+# 创建全局资源过滤器实例
+resource_filter = ResourceFilter()
@@ -1,3 +1,4 @@
 from .logger import logger_manager, debug, info, warning, error, critical
+from .content_hash import normalize_note_text, compute_content_hash
 
-__all__ = ['logger_manager', 'debug', 'info', 'warning', 'error', 'critical']
\ No newline at end of file
+__all__ = ['logger_manager', 'debug', 'info', 'warning', 'error', 'critical', 'normalize_note_text', 'compute_content_hash']
\ No newline at end of file
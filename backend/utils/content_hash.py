@@ -0,0 +1,50 @@
+"""
+内容哈希模块
+对笔记文本做归一化后计算哈希，用于识别重复或仅格式不同的笔记
+"""
+
+import hashlib
+import re
+import unicodedata
+
+# 小红书话题标记，如 "#护肤[话题]#"
+_TOPIC_MARKER_PATTERN = re.compile(r'\[话题\]')
+# emoji变体选择符、零宽字符和肤色修饰符，不影响文字内容
+_EMOJI_VARIANT_PATTERN = re.compile('[\ufe0e\ufe0f\u200b\u200d\U0001F3FB-\U0001F3FF]')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_note_text(text: str) -> str:
+    """
+    归一化笔记文本
+
+    统一全半角字符，去除话题标记、emoji变体和所有空白字符
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        str: 归一化后的文本
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text)
+    text = _TOPIC_MARKER_PATTERN.sub('', text)
+    text = _EMOJI_VARIANT_PATTERN.sub('', text)
+    text = _WHITESPACE_PATTERN.sub('', text)
+    return text
+
+
+def compute_content_hash(title: str, content: str) -> str:
+    """
+    计算笔记标题和内容归一化后的SHA-256哈希
+
+    Args:
+        title: 笔记标题
+        content: 笔记内容
+
+    Returns:
+        str: 十六进制哈希字符串
+    """
+    normalized = f"{normalize_note_text(title)}\n{normalize_note_text(content)}"
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
@@ -0,0 +1,47 @@
+"""
+文本向量模块
+将归一化文本的字符n-gram经特征哈希转换为定长NumPy向量，用于范文检索和风格去重，不依赖外部服务
+"""
+
+import math
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from .content_hash import normalize_note_text
+
+# 默认向量维度
+DEFAULT_VECTOR_DIM = 1024
+_NGRAM_SIZES = (2, 3)
+
+
+def embed_text(text: str, dim: int = DEFAULT_VECTOR_DIM) -> np.ndarray:
+    """
+    计算文本的特征哈希向量
+
+    对归一化文本的字符二元组和三元组按1+log(词频)加权，哈希到dim维并做L2归一化
+
+    Args:
+        text: 文本
+        dim: 向量维度
+
+    Returns:
+        np.ndarray: 单位向量，文本为空时为零向量
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    normalized = normalize_note_text(text)
+    grams = Counter(
+        normalized[i:i + n]
+        for n in _NGRAM_SIZES
+        for i in range(len(normalized) - n + 1)
+    )
+    if not grams:
+        return vector
+    for gram, count in grams.items():
+        hashed = zlib.crc32(gram.encode('utf-8'))
+        # 用哈希的最高位决定符号，抵消哈希冲突带来的偏差
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        vector[hashed % dim] += sign * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector